@@ -1,5 +1,5 @@
 # ARSC/__init__.py
-from .core import process_faa, compute_ARSC_extended_counts
+from .core import process_faa, compute_ARSC_extended_counts, compute_batch, compute_windows, SequenceTable, WindowTable
 
 __version__ = "0.5.1"
 __author__ = "Satoshi Nishino"
\ No newline at end of file
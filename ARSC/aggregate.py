@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to summarize per-genome ARSC results by taxonomic rank (phylum to genus) after joining
+them with a genome-to-taxonomy table such as the GTDB metadata.
+
+Usage:
+    arsc aggregate genomes.tsv --taxonomy bac120_taxonomy_r226.tsv -o ranks.tsv
+    arsc genomes/ -t 8 | arsc aggregate - --taxonomy bac120_metadata_r226.tsv.gz --ranks genus
+"""
+
+
+import re
+import sys
+import argparse
+from itertools import chain
+import numpy as np
+from ARSC.merge import open_text_input, iter_blocks, write_columns
+from ARSC.stats import METRIC_NAMES, GroupedStats
+from ARSC.output import OUTPUT_FORMATS, infer_output_format, resolve_output_format
+
+RANKS = ("domain", "phylum", "class", "order", "family", "genus", "species")
+STATISTICS = ("mean", "stdev", "min", "q1", "median", "q3", "max")
+WEIGHTED_STATISTICS = ("weighted_mean", "weighted_stdev", "weighted_q1", "weighted_median", "weighted_q3")
+
+_ACCESSION = re.compile(r"GC[AF]_\d+\.\d+")
+
+
+def genome_key(name):
+    """Join key of a genome: its GenBank/RefSeq accession when the name contains one
+    (RS_GCF_000005845.2, GCF_000005845.2_ASM584v2_genomic), otherwise the name without
+    a GTDB RS_/GB_ prefix."""
+    match = _ACCESSION.search(name)
+    if match:
+        return match.group(0)
+    return name[3:] if name.startswith(("RS_", "GB_")) else name
+
+
+class Taxonomy:
+    """Genome -> lineage table for the join (build side of the hash join).
+
+    Read from a two-column TSV (genome, 'd__...;p__...;...;s__...') or from a table with a
+    header such as the GTDB metadata (accession and gtdb_taxonomy columns). Lineages are
+    interned, so each genome costs one dictionary entry; taxon_ids() maps lineages to
+    taxa of a rank, keyed by the lineage up to that rank (homonyms stay apart).
+    """
+
+    def __init__(self, path, column="gtdb_taxonomy", id_column="accession"):
+        self.genomes = {}
+        self.lineages = []
+        lineage_index = {}
+        with open_text_input(path) as fh:
+            rows = (line.rstrip("\n").split("\t") for line in fh)
+            first = next(rows, [""])
+            if column in first:
+                if id_column not in first:
+                    raise ValueError(f"{path}: no {id_column!r} column next to {column!r}")
+                id_at, lineage_at = first.index(id_column), first.index(column)
+            else:
+                id_at, lineage_at = 0, 1
+                rows = chain([first], rows)
+            for fields in rows:
+                if not fields[0] or fields[0].startswith("#"):
+                    continue
+                if len(fields) <= max(id_at, lineage_at):
+                    raise ValueError(f"{path}: expected 'genome<TAB>lineage' lines, got {fields[0]!r} without a lineage")
+                lineage = fields[lineage_at]
+                index = lineage_index.get(lineage)
+                if index is None:
+                    index = lineage_index[lineage] = len(self.lineages)
+                    self.lineages.append(tuple(name.strip() for name in lineage.split(";")))
+                self.genomes[genome_key(fields[id_at])] = index
+
+    def lookup(self, queries):
+        """Lineage index of every query (-1 when the genome is not in the table)."""
+        genomes = self.genomes
+        return np.fromiter((genomes.get(genome_key(str(q)), -1) for q in queries), dtype=np.intp, count=len(queries))
+
+    def taxon_ids(self, rank):
+        """(taxon index of every lineage, taxon names, lineages up to rank) for one rank; -1 where the lineage is shorter."""
+        depth = RANKS.index(rank) + 1
+        taxa = {}
+        ids = np.full(len(self.lineages), -1, dtype=np.intp)
+        for i, lineage in enumerate(self.lineages):
+            if len(lineage) >= depth:
+                ids[i] = taxa.setdefault(";".join(lineage[:depth]), len(taxa))
+        prefixes = list(taxa)
+        return ids, [prefix.rsplit(";", 1)[-1] for prefix in prefixes], prefixes
+
+
+class TaxonAggregator:
+    """Streaming per-rank summaries: one GroupedStats per rank over the taxa of that rank.
+
+    add() takes a block of arsc output rows, joins queries to lineages, and updates all
+    ranks with vectorized per-taxon updates; only per-taxon state is kept. Rows without
+    residues (TotalLength 0) and genomes missing from the taxonomy are counted and skipped.
+    """
+
+    def __init__(self, taxonomy, ranks, weight_column="TotalLength", relative_accuracy=0.001):
+        self.taxonomy = taxonomy
+        self.ranks = list(ranks)
+        self.weight_column = weight_column
+        self.taxa = {rank: taxonomy.taxon_ids(rank) for rank in self.ranks}
+        self.stats = {rank: GroupedStats(METRIC_NAMES, relative_accuracy) for rank in self.ranks}
+        self.rows = 0
+        self.unmapped = 0
+        self.empty = 0
+
+    def add(self, block):
+        missing = [name for name in ("query", self.weight_column, *METRIC_NAMES) if name not in block]
+        if missing:
+            raise ValueError(f"input has no {', '.join(missing)} column; aggregate per-genome arsc output")
+        values = np.column_stack([np.asarray(block[name], dtype=np.float64) for name in METRIC_NAMES])
+        weights = np.asarray(block[self.weight_column], dtype=np.float64)
+        lineages = self.taxonomy.lookup(block["query"])
+        self.rows += len(values)
+        mapped = lineages >= 0
+        keep = mapped & (weights > 0) & ~np.isnan(values).any(axis=1)
+        self.unmapped += int((~mapped).sum())
+        self.empty += int((mapped & ~keep).sum())
+        values, weights, lineages = values[keep], weights[keep], lineages[keep]
+        for rank in self.ranks:
+            taxa = self.taxa[rank][0][lineages]
+            ranked = taxa >= 0
+            self.stats[rank].update(taxa[ranked], values[ranked], weights[ranked])
+
+    def header(self):
+        return ["rank", "taxon", "lineage", "count", "residues"] + \
+               [f"{name}_{s}" for name in METRIC_NAMES for s in STATISTICS + WEIGHTED_STATISTICS]
+
+    def columns(self):
+        """Output columns (header order): one row per taxon with at least one genome, ranks in order."""
+        parts = []
+        for rank in self.ranks:
+            stats = self.stats[rank]
+            _, names, lineages = self.taxa[rank]
+            present = np.flatnonzero(stats.count > 0)
+            order = present[np.argsort(np.array(lineages, dtype=object)[present], kind="stable")] if len(present) else present
+            summary = {
+                "mean": stats.mean, "stdev": stats.stdev(), "min": stats.min, "max": stats.max,
+                "q1": stats.quantiles(0.25), "median": stats.quantiles(0.5), "q3": stats.quantiles(0.75),
+                "weighted_mean": stats.weighted_mean, "weighted_stdev": stats.weighted_stdev(),
+                "weighted_q1": stats.quantiles(0.25, weighted=True), "weighted_median": stats.quantiles(0.5, weighted=True),
+                "weighted_q3": stats.quantiles(0.75, weighted=True),
+            }
+            part = [np.array([rank] * len(order), dtype=np.str_),
+                    np.array([names[i] for i in order], dtype=np.str_),
+                    np.array([lineages[i] for i in order], dtype=np.str_),
+                    stats.count[order],
+                    np.rint(stats.weight[order]).astype(np.int64)]
+            part += [summary[s][order, j] for j in range(len(METRIC_NAMES)) for s in STATISTICS + WEIGHTED_STATISTICS]
+            parts.append(part)
+        return [np.concatenate(column) for column in zip(*parts)]
+
+
+def aggregate_main(argv=None):
+    parser = argparse.ArgumentParser(prog="arsc aggregate", description="Join per-genome ARSC results with a taxonomy table and summarize them per taxonomic rank")
+    parser.add_argument("inputs", nargs="+", help="Per-genome arsc outputs (TSV[.gz|.zst], .npz, .parquet, .arrow; '-' reads TSV from stdin)")
+    parser.add_argument("--taxonomy", required=True, help="Genome to lineage table: 'genome<TAB>d__...;p__...;...' lines or a table with a header (e.g. GTDB metadata)")
+    parser.add_argument("--taxonomy-column", default="gtdb_taxonomy", help="Lineage column of a taxonomy table with a header")
+    parser.add_argument("--id-column", default="accession", help="Genome column of a taxonomy table with a header")
+    parser.add_argument("--ranks", default="phylum,class,order,family,genus", help=f"Comma-separated ranks to summarize ({', '.join(RANKS)})")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="Output format (default: from the -o suffix, otherwise tsv)")
+    parser.add_argument("-d", "--decimal-places", default=6, type=int, help="Decimal places")
+    parser.add_argument("--no-header", action="store_true", help="Suppress header line")
+    args = parser.parse_args(argv)
+
+    ranks = [rank.strip() for rank in args.ranks.split(",") if rank.strip()]
+    unknown = [rank for rank in ranks if rank not in RANKS]
+    if unknown or not ranks:
+        parser.error(f"--ranks: unknown rank {', '.join(unknown) or '(none)'}; choose from {', '.join(RANKS)}")
+    output_format = args.output_format or infer_output_format(args.output)
+    if output_format != "tsv" and not args.output:
+        parser.error(f"--output-format {output_format} requires -o/--output")
+    args.output, output_format = resolve_output_format(args.output, output_format)
+
+    try:
+        taxonomy = Taxonomy(args.taxonomy, args.taxonomy_column, args.id_column)
+        aggregator = TaxonAggregator(taxonomy, ranks)
+        for path in args.inputs:
+            for block in iter_blocks(path):
+                aggregator.add(block)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    write_columns(aggregator.columns(), aggregator.header(), args.output, output_format, args.decimal_places, args.no_header)
+
+    print(f"Aggregated {aggregator.rows} rows over {len(taxonomy.genomes)} genomes with taxonomy "
+          f"({', '.join(f'{int((s.count > 0).sum())} {rank}' for rank, s in aggregator.stats.items())}).", file=sys.stderr)
+    if aggregator.unmapped:
+        print(f"Warning: {aggregator.unmapped} rows had no genome in {args.taxonomy} and were skipped.", file=sys.stderr)
+    if aggregator.empty:
+        print(f"Warning: {aggregator.empty} rows without residues were skipped.", file=sys.stderr)
+    if args.output:
+        print(f"Output written to {args.output}", file=sys.stderr)
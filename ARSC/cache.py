@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to cache per-file ARSC results on disk for incremental re-runs.
+"""
+
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+
+# Bump when the layout of cached result dicts changes
+CACHE_FORMAT = 1
+
+
+class ResultCache:
+    """On-disk result cache keyed by file identity and processing mode.
+
+    Each entry is one pickled result dict (raw residue counts, base counts and
+    derived values), so any output option can be served from it. The key is built
+    from the absolute path, size and mtime (plus a SHA-256 of the content when
+    use_hash is set), the requested mode and the per-sequence flag. Entries are
+    touched on every hit and evicted least-recently-used first once the directory
+    grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None, use_hash=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+
+    def key(self, path, mode, per_sequence):
+        """Return the cache key of a file, or None if it cannot be stat'ed."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        parts = [str(CACHE_FORMAT), os.path.abspath(path), str(st.st_size), str(st.st_mtime_ns), mode, str(bool(per_sequence))]
+        if self.use_hash:
+            digest = hashlib.sha256()
+            with open(path, "rb") as fh:
+                for block in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(block)
+            parts.append(digest.hexdigest())
+        return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        """Load a cached result, or None on a miss."""
+        entry = self._entry_path(key)
+        try:
+            with open(entry, "rb") as fh:
+                result = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(entry)  # LRU clock
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """Store a result atomically (safe with several workers writing at once)."""
+        if "error" in result:
+            return
+        entry = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry)
+        except OSError as e:
+            print(f"Warning: could not write cache entry for {result.get('genome')}: {e}", file=sys.stderr)
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        if self.max_bytes is None or not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        total = 0
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".pkl"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -16,8 +16,39 @@ Original citations for calculation metrics in Mende et al. 2017:
 
 import os
 import sys
-from Bio import SeqIO
+import importlib
+from array import array
+from operator import mul
+from types import SimpleNamespace
 from collections import Counter
+from functools import lru_cache
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first use.
+
+    The first attribute access imports the module and rebinds alias in the owning module's
+    namespace to it, so later accesses go to the module directly. At module level:
+        np = LazyModule("numpy", globals(), "np")
+    """
+
+    def __init__(self, name, namespace, alias):
+        self._lazy_target = (name, namespace, alias)
+
+    def __getattr__(self, attr):
+        name, namespace, alias = self._lazy_target
+        module = importlib.import_module(name)
+        namespace[alias] = module
+        return getattr(module, attr)
+
+
+def preload_numpy():
+    """Import NumPy now: before forking workers (which then share it) or when it is needed anyway."""
+    importlib.import_module("numpy")
+
+
+# NumPy takes most of the startup time of a small run: it is imported on first use
+np = LazyModule("numpy", globals(), "np")
 
 # Amino acid dictionary
 # -----------------------
@@ -48,6 +79,79 @@ aa_dictionary = {
     'Z': {'N': 0.5, 'S': 0, 'MW': 146.6375, 'C': 3}
 }
 
+# Byte-level lookup tables for the "bytes" counting engine
+# -----------------------
+# Residue order used by count vectors; weight vectors are built once from aa_dictionary
+RESIDUES = tuple(aa_dictionary.keys())
+_RESIDUE_CODES = tuple(ord(aa) for aa in RESIDUES)
+_CODE_INDEX = {code: j for j, code in enumerate(_RESIDUE_CODES)}
+_RESIDUE_BYTES = bytes(_RESIDUE_CODES)
+_RESIDUE_SINGLES = tuple(bytes((code,)) for code in _RESIDUE_CODES)
+_WEIGHTS = {key: tuple(aa_dictionary[aa][key] for aa in RESIDUES) for key in ("N", "C", "S", "MW")}
+
+# 256-entry table: lower-case ASCII -> upper-case, everything else unchanged
+_UPPER_TABLE = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+# Bytes dropped before counting, as in the Biopython path: stop codons, spaces and line breaks.
+# Other whitespace (tab, \v, \f) is kept inside a line and counted as an unknown character.
+_DELETE_BYTES = b"* \r\n"
+# Biopython also right-strips every sequence line (str.rstrip), which drops that whitespace at line ends
+_LINE_END_SPACE = tuple(bytes((b,)) for b in b"\t\v\f\x1c\x1d\x1e\x1f")
+_RSTRIP_BYTES = b" \t\r\v\f\x1c\x1d\x1e\x1f"
+_COMMENT_STARTS = (b"#", b"!", b";")
+
+# Up to _PURE_COUNT_BYTES per process are counted with bytes methods while NumPy is not
+# loaded yet; beyond that, importing it costs less than counting without it.
+_PURE_COUNT_BYTES = 1 << 20
+_pure_counted = 0
+
+
+@lru_cache(maxsize=None)
+def _numpy_tables():
+    """Byte-value lookup tables of the NumPy paths, built on first use."""
+    residue_index = np.array(_RESIDUE_CODES, dtype=np.intp)
+    unknown_mask = np.ones(256, dtype=bool)
+    unknown_mask[residue_index] = False
+
+    # Column of every byte value in batch count matrices: residues follow RESIDUES (either case),
+    # unknown characters go to one extra last column and dropped bytes ('*', space, line breaks) to -1
+    batch_columns = np.full(256, len(RESIDUES), dtype=np.intp)
+    batch_columns[residue_index] = np.arange(len(RESIDUES))
+    batch_columns[residue_index + 32] = np.arange(len(RESIDUES))
+    batch_columns[np.frombuffer(_DELETE_BYTES, dtype=np.uint8)] = -1
+    # Weight matrix (RESIDUES x N/C/S/MW): one matrix multiply gives the metrics of a whole batch
+    weight_matrix = np.array([_WEIGHTS[key] for key in ("N", "C", "S", "MW")], dtype=np.float64).T
+
+    # Integer weights for window profiles: N x 2 (B/Z are 0.5), C and S x 1, MW x 10^4 (4 decimals),
+    # so prefix sums and window sums are exact; one byte-value row each, 0 for unknown characters
+    window_scale = np.array([2, 1, 1, 10000], dtype=np.int64)
+    window_weights = np.zeros((256, 4), dtype=np.int64)
+    window_weights[residue_index] = np.rint(weight_matrix * window_scale).astype(np.int64)
+    return SimpleNamespace(residue_index=residue_index, unknown_mask=unknown_mask, batch_columns=batch_columns,
+                           weight_matrix=weight_matrix, window_scale=window_scale, window_weights=window_weights)
+
+BACKENDS = ("bytes", "biopython")
+
+# Diagnostics: ignored (unknown) characters
+# -----------------------
+# Workers tally ignored characters per genome (result["ignored"]; see ARSC.diagnostics) instead of
+# printing one warning per sequence; set_ignored_warnings(True) restores the per-call warnings.
+_WARN_IGNORED = False
+
+
+def set_ignored_warnings(enabled):
+    """Print a warning for every sequence (or file) with ignored characters (off by default).
+
+    Also used as the initializer of worker pools, so that each worker process gets the setting.
+    """
+    global _WARN_IGNORED
+    _WARN_IGNORED = bool(enabled)
+
+
+def ignored_summary(tally):
+    """{character: count} of a tally keyed by byte value (bytes engine) or character (Biopython)."""
+    return {chr(c) if isinstance(c, int) else c: n for c, n in sorted(tally.items(), key=lambda item: -item[1]) if n}
+
+
 # Compute ARSCs (N/C/S/MW)
 # -----------------------
 def compute_ARSC_extended_counts(counts, aa_dict):
@@ -57,7 +161,7 @@ def compute_ARSC_extended_counts(counts, aa_dict):
 
     # Detect and log ignored characters
     ignored_chars = [a for a in counts if a not in aa_dict]
-    if ignored_chars:
+    if ignored_chars and _WARN_IGNORED:
         print(f"Warning: Ignored characters found in sequence: {', '.join(set(ignored_chars))}", file=sys.stderr)
 
     total_N  = sum(counts[a] * aa_dict[a]["N"]  for a in counts if a in aa_dict)
@@ -73,6 +177,49 @@ def compute_ARSC_extended_counts(counts, aa_dict):
     )
 
 
+def compute_ARSC_from_vector(residue_counts, total_aa, ignored=b"", order=None):
+    """Compute ARSCs (N/C/S/MW) from a count vector ordered like RESIDUES.
+
+    total_aa includes ignored (unknown) residues, as in compute_ARSC_extended_counts.
+    order: residue indices in first-appearance order. MW is summed in that order so
+    the floating-point result is identical to the Counter-based path.
+    """
+    if total_aa == 0:
+        return None, None, None, None
+
+    if ignored:
+        _warn_ignored(ignored)
+
+    if order is None:
+        order = range(len(RESIDUES))
+    mw = _WEIGHTS["MW"]
+    total_MW = sum(residue_counts[j] * mw[j] for j in order)
+
+    return (
+        sum(map(mul, residue_counts, _WEIGHTS["N"])) / total_aa,
+        sum(map(mul, residue_counts, _WEIGHTS["C"])) / total_aa,
+        sum(map(mul, residue_counts, _WEIGHTS["S"])) / total_aa,
+        total_MW / total_aa
+    )
+
+
+def _warn_ignored(ignored):
+    # ignored: ignored byte values (bytes, or a {byte: count} tally)
+    if not _WARN_IGNORED:
+        return
+    print(f"Warning: Ignored characters found in sequence: {', '.join(set(chr(b) for b in ignored))}", file=sys.stderr)
+
+
+def compute_ARSC_matrix(residue_counts, total_aa):
+    """Compute ARSCs of many count vectors at once: one matrix multiply.
+
+    residue_counts: n x len(RESIDUES) matrix; total_aa: n totals (unknown residues included).
+    Returns an n x 4 float matrix (N/C/S/MW columns), NaN where total_aa is 0.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (residue_counts @ _numpy_tables().weight_matrix) / np.asarray(total_aa)[:, None]
+
+
 def compute_aa_composition(counts):
     """Compute amino acid composition ratios."""
     total_aa = sum(counts.values())
@@ -86,44 +233,669 @@ def compute_aa_composition(counts):
     return composition
 
 
-def process_faa(faa_source, name=None, per_sequence=False):
+def composition_from_vector(residue_counts, total_aa):
+    """Amino acid composition ratios from a count vector ordered like RESIDUES."""
+    if total_aa == 0:
+        return {}
+    return {aa: n / total_aa for aa, n in zip(RESIDUES, residue_counts)}
+
+
+class SequenceTable:
+    """Per-sequence results of one genome in columnar form.
+
+    Replaces a list of per-sequence dicts: lengths, metrics (N/C/S/MW columns,
+    NaN for empty sequences) and the residue count matrix (columns follow RESIDUES)
+    are NumPy arrays, and sequence IDs are rebuilt from the genome name and ordinal.
+    Appending goes through compact array.array buffers until finish() is called.
+    """
+
+    METRICS = ("N_ARSC", "C_ARSC", "S_ARSC", "MW_ARSC")
+
+    def __init__(self, genome):
+        self.genome = genome
+        self._ordinals = array("q")
+        self._lengths = array("q")
+        self._metrics = array("d")
+        self._counts = array("q")
+        self.ordinals = self.lengths = self.metrics = self.counts = None
+
+    def append(self, ordinal, length, metrics, residue_counts):
+        self._ordinals.append(ordinal)
+        self._lengths.append(length)
+        self._metrics.extend(float("nan") if v is None else v for v in metrics)
+        self._counts.extend(residue_counts)
+
+    def finish(self):
+        """Freeze the append buffers into NumPy arrays; returns self."""
+        self.ordinals = np.frombuffer(self._ordinals, dtype=np.int64).astype(np.uint32)
+        self.lengths = np.frombuffer(self._lengths, dtype=np.int64).copy()
+        self.metrics = np.frombuffer(self._metrics, dtype=np.float64).reshape(-1, len(self.METRICS)).copy()
+        counts = np.frombuffer(self._counts, dtype=np.int64).reshape(-1, len(RESIDUES))
+        self.counts = counts.astype(np.uint32)
+        self._ordinals = self._lengths = self._metrics = self._counts = None
+        return self
+
+    def __getstate__(self):
+        return {"genome": self.genome, "ordinals": self.ordinals, "lengths": self.lengths,
+                "metrics": self.metrics, "counts": self.counts}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ordinals = self._lengths = self._metrics = self._counts = None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        """Yield one dict per sequence (the pre-columnar per-sequence format)."""
+        ids = self.sequence_ids()
+        for i in range(len(self)):
+            metrics = [None if v != v else v for v in self.metrics[i].tolist()]
+            length = int(self.lengths[i])
+            yield {
+                "sequence_id": ids[i],
+                "length": length,
+                **dict(zip(self.METRICS, metrics)),
+                "aa_composition": composition_from_vector(self.counts[i].tolist(), length)
+            }
+
+    def sequence_ids(self):
+        return [f"{self.genome}_{i}" for i in self.ordinals.tolist()]
+
+    def select(self, mask):
+        """Return a new table with the rows where mask is True."""
+        table = SequenceTable(self.genome)
+        table._ordinals = table._lengths = table._metrics = table._counts = None
+        table.ordinals = self.ordinals[mask]
+        table.lengths = self.lengths[mask]
+        table.metrics = self.metrics[mask]
+        table.counts = self.counts[mask]
+        return table
+
+    @classmethod
+    def concat(cls, genome, tables, records=None):
+        """Concatenate tables of consecutive ranges of one file, renumbering ordinals.
+
+        records: number of records read per range, when length filtering dropped rows
+        (default: the table lengths).
+        """
+        table = cls(genome)
+        table._ordinals = table._lengths = table._metrics = table._counts = None
+        offsets = np.cumsum([0] + list(records if records is not None else [len(t) for t in tables])[:-1])
+        table.ordinals = np.concatenate([t.ordinals + np.uint32(offset) for t, offset in zip(tables, offsets)])
+        table.lengths = np.concatenate([t.lengths for t in tables])
+        table.metrics = np.concatenate([t.metrics for t in tables])
+        table.counts = np.concatenate([t.counts for t in tables])
+        return table
+
+    def composition(self, residues=RESIDUES):
+        """Composition matrix (rows: sequences, columns: residues); empty sequences give 0."""
+        columns = [RESIDUES.index(aa) for aa in residues]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            comp = self.counts[:, columns] / self.lengths[:, None]
+        return np.nan_to_num(comp)
+
+
+def compute_batch(seqs, offsets=None, composition=False, chunk_bytes=1 << 24):
+    """Compute ARSCs (N/C/S/MW) of many in-memory protein sequences in one call.
+
+    seqs: iterable of str/bytes sequences, or one packed bytes-like buffer (or uint8
+    array) together with offsets, n + 1 non-decreasing positions such that sequence i
+    is seqs[offsets[i]:offsets[i + 1]]. Lower case, '*', spaces and line breaks are
+    handled as in process_faa; other whitespace counts as unknown characters.
+
+    Returns a dict of NumPy arrays with one entry per sequence: "length" (retained
+    characters, unknown ones included as in process_faa), "N_ARSC", "C_ARSC", "S_ARSC",
+    "MW_ARSC" (NaN for empty sequences), "ignored" (number of unknown characters),
+    "residue_counts" (n x len(RESIDUES)) and, with composition=True, "aa_composition"
+    (n x len(RESIDUES), 0 for empty sequences). Values equal those of
+    process_faa(per_sequence=True) up to floating-point rounding.
+    """
+    if offsets is None:
+        parts = [s.encode("ascii", "replace") if isinstance(s, str) else bytes(s) for s in seqs]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        data = np.frombuffer(b"".join(parts), dtype=np.uint8)
+    else:
+        data = seqs.view(np.uint8).ravel() if isinstance(seqs, np.ndarray) else np.frombuffer(seqs, dtype=np.uint8)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] < 0 or offsets[-1] > len(data) or np.any(np.diff(offsets) < 0):
+            raise ValueError("offsets must be n + 1 non-decreasing positions within the buffer")
+
+    n = len(offsets) - 1
+    width = len(RESIDUES) + 1
+    counts = np.zeros((n, width), dtype=np.int64)
+    # Sequences are counted in groups of about chunk_bytes to bound the per-byte index arrays
+    start = 0
+    while start < n:
+        stop = int(np.searchsorted(offsets, offsets[start] + chunk_bytes, side="right")) - 1
+        stop = min(max(stop, start + 1), n)
+        columns = _numpy_tables().batch_columns[data[offsets[start]:offsets[stop]]]
+        rows = np.repeat(np.arange(stop - start), np.diff(offsets[start:stop + 1]))
+        keep = columns >= 0
+        flat = np.bincount(rows[keep] * width + columns[keep], minlength=(stop - start) * width)
+        counts[start:stop] = flat.reshape(-1, width)
+        start = stop
+
+    residue_counts = counts[:, :-1]
+    lengths = counts.sum(axis=1)
+    metrics = compute_ARSC_matrix(residue_counts, lengths)
+    result = {
+        "length": lengths,
+        "N_ARSC": metrics[:, 0],
+        "C_ARSC": metrics[:, 1],
+        "S_ARSC": metrics[:, 2],
+        "MW_ARSC": metrics[:, 3],
+        "ignored": counts[:, -1],
+        "residue_counts": residue_counts
+    }
+    if composition:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["aa_composition"] = np.nan_to_num(residue_counts / lengths[:, None])
+    return result
+
+
+def window_positions(length, window, step=None):
+    """Starts and ends (0-based, end exclusive) of the full windows of a sequence of length residues.
+
+    Windows of window residues start every step residues (default: window, i.e. tiling);
+    sequences shorter than window have none.
+    """
+    step = step or window
+    if length < window:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.arange(0, length - window + 1, step, dtype=np.int64)
+    return starts, starts + window
+
+
+def _window_metrics(seq, starts, ends):
+    # seq is upper case without '*', spaces and line breaks; one prefix sum row per residue
+    tables = _numpy_tables()
+    prefix = np.zeros((len(seq) + 1, 4), dtype=np.int64)
+    np.cumsum(tables.window_weights[np.frombuffer(seq, dtype=np.uint8)], axis=0, out=prefix[1:])
+    sums = prefix[ends] - prefix[starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / (tables.window_scale * (ends - starts)[:, None])
+
+
+def compute_windows(seq, window=None, step=None, starts=None, ends=None):
+    """ARSC profile (N/C/S/MW) of one sequence over sliding windows or given regions.
+
+    seq: str/bytes sequence (lower case, '*', spaces and line breaks handled as in process_faa; the
+    coordinates count retained characters). Give window (and step) for sliding windows,
+    or starts and ends (0-based, end exclusive) for regions. All windows come from one
+    pass of prefix sums, so the cost is O(length + number of windows) whatever the window
+    size. Returns a dict of NumPy arrays: "start", "end", "N_ARSC", "C_ARSC", "S_ARSC",
+    "MW_ARSC" (NaN for empty regions); unknown characters count in the window length.
+    """
+    if isinstance(seq, str):
+        seq = seq.encode("ascii", "replace")
+    seq = bytes(seq).translate(_UPPER_TABLE, _DELETE_BYTES)
+    if window is not None:
+        starts, ends = window_positions(len(seq), window, step)
+    else:
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if np.any(starts < 0) or np.any(ends > len(seq)) or np.any(ends < starts):
+            raise ValueError("regions must satisfy 0 <= start <= end <= sequence length")
+    metrics = _window_metrics(seq, starts, ends)
+    return {"start": starts, "end": ends, "N_ARSC": metrics[:, 0], "C_ARSC": metrics[:, 1],
+            "S_ARSC": metrics[:, 2], "MW_ARSC": metrics[:, 3]}
+
+
+class WindowTable:
+    """Window / region results of one genome in columnar form (--window, --regions).
+
+    ordinals number the sequences in the file as in SequenceTable; starts and ends are
+    0-based, end exclusive; names holds the region names (None for sliding windows).
+    """
+
+    def __init__(self, genome):
+        self.genome = genome
+        self._parts = []
+        self.ordinals = self.starts = self.ends = self.metrics = self.names = None
+
+    def append(self, ordinal, starts, ends, metrics, names=None):
+        self._parts.append((ordinal, starts, ends, metrics, names))
+
+    def finish(self):
+        """Concatenate the appended sequences into NumPy arrays; returns self."""
+        parts = self._parts
+        self.ordinals = np.repeat(np.array([p[0] for p in parts], dtype=np.uint32), [len(p[1]) for p in parts])
+        self.starts = np.concatenate([p[1] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+        self.ends = np.concatenate([p[2] for p in parts]) if parts else np.empty(0, dtype=np.int64)
+        self.metrics = np.concatenate([p[3] for p in parts]) if parts else np.empty((0, 4))
+        if parts and parts[0][4] is not None:
+            self.names = np.array([name for p in parts for name in p[4]], dtype=np.str_)
+        self._parts = None
+        return self
+
+    def __getstate__(self):
+        return {"genome": self.genome, "ordinals": self.ordinals, "starts": self.starts, "ends": self.ends,
+                "metrics": self.metrics, "names": self.names}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._parts = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sequence_ids(self):
+        """Sequence ID of every row (built once per sequence: windows repeat their ordinal)."""
+        ordinals, inverse = np.unique(self.ordinals, return_inverse=True)
+        return np.array([f"{self.genome}_{i}" for i in ordinals.tolist()], dtype=np.str_)[inverse]
+
+
+@lru_cache(maxsize=4)
+def read_regions(path):
+    """Regions of a BED-like file: {sequence ID: (starts, ends, names)}.
+
+    Columns: sequence ID (first word of the FASTA header), start (0-based), end
+    (exclusive) and an optional name (default: id:start-end). Empty lines and
+    '#', 'track' and 'browser' lines are skipped. Cached per process, so workers
+    read the file once.
+    """
+    regions = {}
+    with open(path) as fh:
+        for n, line in enumerate(fh, 1):
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            try:
+                seq_id, start, end = fields[0], int(fields[1]), int(fields[2])
+            except (IndexError, ValueError):
+                raise ValueError(f"{path}, line {n}: expected 'id<TAB>start<TAB>end[<TAB>name]'")
+            if start < 0 or end < start:
+                raise ValueError(f"{path}, line {n}: invalid region {start}-{end}")
+            name = fields[3] if len(fields) > 3 and fields[3] else f"{seq_id}:{start}-{end}"
+            entry = regions.setdefault(seq_id, ([], [], []))
+            entry[0].append(start)
+            entry[1].append(end)
+            entry[2].append(name)
+    return {seq_id: (np.array(s, dtype=np.int64), np.array(e, dtype=np.int64), names)
+            for seq_id, (s, e, names) in regions.items()}
+
+
+def count_faa_windows(handle, windows, length_range=None):
+    """Window / region profiles of every sequence of a FASTA stream.
+
+    windows: {"window": size, "step": step} for sliding windows or {"regions": path}
+    for a BED-like region file (regions are clipped to the sequence; sequences
+    without regions are skipped). Returns {"windows": WindowTable, "records": n}.
+    """
+    regions = read_regions(windows["regions"]) if windows.get("regions") else None
+    table = WindowTable(None)
+    i = 0
+    for i, (header, seq) in enumerate(iter_fasta_bytes(handle), 1):
+        seq = seq.translate(_UPPER_TABLE, _DELETE_BYTES)
+        if length_range is not None and not in_length_range(len(seq), length_range):
+            continue
+        names = None
+        if regions is not None:
+            words = header.split(None, 1)
+            region = regions.get(words[0].decode(errors="replace")) if words else None
+            if region is None:
+                continue
+            starts, ends, names = region
+            ends = np.minimum(ends, len(seq))
+            keep = starts < ends
+            if not keep.all():
+                starts, ends, names = starts[keep], ends[keep], [name for name, k in zip(names, keep.tolist()) if k]
+        else:
+            starts, ends = window_positions(len(seq), windows["window"], windows.get("step"))
+        if len(starts):
+            table.append(i, starts, ends, _window_metrics(seq, starts, ends), names)
+    return {"windows": table.finish(), "records": i}
+
+
+def count_residues(seq):
+    """Count residues of one raw sequence (bytes, may contain newlines/'*'/lower case).
+
+    Returns (residue_counts, total_aa, ignored, order): residue_counts follows RESIDUES,
+    total_aa counts every retained character, ignored maps the byte value of every unknown
+    character to its count (empty when there are none) and order lists the indices of
+    present residues by first appearance.
+    """
+    return _count_normalized(seq.translate(_UPPER_TABLE, _DELETE_BYTES))
+
+
+def _count_normalized(seq):
+    # seq is upper case without '*', spaces and line breaks
+    global _pure_counted
+    ignored = {}
+    if "numpy" not in sys.modules and _pure_counted + len(seq) <= _PURE_COUNT_BYTES:
+        # Small input so far: count with bytes methods rather than import NumPy
+        _pure_counted += len(seq)
+        residue_counts = [seq.count(code) for code in _RESIDUE_SINGLES]
+        if sum(residue_counts) != len(seq):
+            ignored = dict(sorted(Counter(seq.translate(None, _RESIDUE_BYTES)).items()))
+    else:
+        tables = _numpy_tables()
+        histogram = np.bincount(np.frombuffer(seq, dtype=np.uint8), minlength=256)
+        residue_counts = histogram[tables.residue_index].tolist()
+        if sum(residue_counts) != len(seq):
+            codes = np.flatnonzero(histogram * tables.unknown_mask)
+            ignored = dict(zip(codes.tolist(), histogram[codes].tolist()))
+    present = [code for code, n in zip(_RESIDUE_CODES, residue_counts) if n]
+    present.sort(key=seq.find)
+    return residue_counts, len(seq), ignored, [_CODE_INDEX[code] for code in present]
+
+
+def _strip_comment_lines(body):
+    # Slow path, only taken when a block contains '#', '!' or ';' lines
+    if body[:1] not in _COMMENT_STARTS and b"\n#" not in body and b"\n!" not in body and b"\n;" not in body:
+        return body
+    return b"\n".join(line for line in body.split(b"\n") if not line.startswith(_COMMENT_STARTS))
+
+
+def _strip_line_ends(body):
+    # Slow path, only taken when a block contains tabs (or \v, \f): Biopython right-strips every line
+    if not any(space in body for space in _LINE_END_SPACE):
+        return body
+    return b"\n".join(line.rstrip(_RSTRIP_BYTES) for line in body.split(b"\n"))
+
+
+def _read_block(handle, block_size):
+    block = handle.read(block_size)
+    return block.encode() if isinstance(block, str) else block
+
+
+def _skip_preamble(handle, block_size):
+    # Drop comment lines before the first header; anything else is an error
+    buffer = b""
+    while True:
+        block = _read_block(handle, block_size)
+        buffer += block
+        while buffer[:1] in _COMMENT_STARTS:
+            newline = buffer.find(b"\n")
+            if newline == -1:
+                break
+            buffer = buffer[newline + 1:]
+        if buffer.startswith(b">"):
+            return buffer[1:]
+        if buffer and not buffer.startswith(_COMMENT_STARTS):
+            line = buffer.split(b"\n", 1)[0].decode(errors="replace")
+            raise ValueError(f"Expected FASTA record starting with '>' character.\nGot: '{line}'")
+        if not block:
+            return None
+
+
+def iter_fasta_blocks(handle, block_size=1 << 22):
+    """Yield lists of (header, raw_sequence) bytes pairs, one list per block read.
+
+    Reads in blocks and splits on record boundaries, so memory is bounded by the
+    block size plus the longest record. Comment lines ('#', '!', ';') are dropped
+    and sequence lines right-stripped as in Biopython's "fasta-blast" parser.
+    """
+    buffer = _skip_preamble(handle, block_size)
+    if buffer is None:
+        return
+
+    eof = False
+    while not eof:
+        block = _read_block(handle, block_size)
+        eof = not block
+        data = buffer + block
+        # Comment lines are rare; check the whole block once instead of every record
+        has_comments = b"\n#" in data or b"\n!" in data or b"\n;" in data
+        has_line_end_space = any(space in data for space in _LINE_END_SPACE)
+        records = data.split(b"\n>")
+        # Keep the last (possibly incomplete) record for the next block
+        buffer = b"" if eof else records.pop()
+        parsed = []
+        for record in records:
+            header, _, body = record.partition(b"\n")
+            if has_comments:
+                body = _strip_comment_lines(body)
+            if has_line_end_space:
+                body = _strip_line_ends(body)
+            parsed.append((header.rstrip(), body))
+        if parsed:
+            yield parsed
+
+
+def iter_fasta_bytes(handle, block_size=1 << 22):
+    """Yield (header, raw_sequence) bytes pairs from a FASTA handle."""
+    for records in iter_fasta_blocks(handle, block_size):
+        yield from records
+
+
+def _genome_name_from_path(faa_source):
+    base = os.path.basename(faa_source)
+    for ext in [".faa.gz", ".faa", ".gz"]:
+        if base.endswith(ext):
+            base = base[: -len(ext)]
+    return base
+
+
+def in_length_range(length, length_range):
+    """True if length is within length_range = (min or None, max or None); None accepts all."""
+    if length_range is None:
+        return True
+    low, high = length_range
+    return (low is None or length >= low) and (high is None or length <= high)
+
+
+def process_faa(faa_source, name=None, per_sequence=False, backend="bytes", length_range=None, memo=None, windows=None):
+    """Compute ARSCs for a protein FASTA (path or open handle).
+
+    backend: "bytes" (lookup-table counting over raw bytes, default) or
+    "biopython" (SeqIO + Counter, the original implementation).
+    length_range: (min, max) protein length, either may be None. Proteins outside it are
+    skipped before counting: per-sequence results leave them out (IDs keep their
+    position in the file) and whole-file results aggregate only the proteins inside.
+    memo: optional ARSC.memo.SequenceMemo reusing per-sequence results of repeated
+    sequences (bytes backend only).
+    windows: {"window": size, "step": step} or {"regions": BED path}: return window / region
+    profiles of every sequence as result["windows"] (a WindowTable; bytes backend only).
+    """
+    if backend == "biopython":
+        return _process_faa_biopython(faa_source, name=name, per_sequence=per_sequence, length_range=length_range)
+    if backend != "bytes":
+        return {"genome": name, "error": f"unknown backend: {backend}"}
+
+    try:
+        genome_name = name
+        if genome_name is None:
+            genome_name = _genome_name_from_path(faa_source)
+
+        if isinstance(faa_source, str):
+            with open(faa_source, "rb") as handle:
+                return _process_faa_bytes(handle, genome_name, per_sequence, length_range, memo, windows)
+        return _process_faa_bytes(faa_source, genome_name, per_sequence, length_range, memo, windows)
+
+    except Exception as e:
+        return {"genome": genome_name if name else None, "error": str(e)}
+
+
+def _process_faa_bytes(handle, genome_name, per_sequence, length_range=None, memo=None, windows=None):
+    if windows is not None:
+        table = count_faa_windows(handle, windows, length_range)["windows"]
+        table.genome = genome_name
+        return {"genome": genome_name, "windows": table}
+    return merge_faa_partials(genome_name, [count_faa_partial(handle, per_sequence, length_range, memo)], per_sequence)
+
+
+def count_faa_partial(handle, per_sequence=False, length_range=None, memo=None):
+    """Raw counts of a record-aligned FASTA stream (a whole file or one byte range).
+
+    Partials of consecutive ranges of one file are combined with merge_faa_partials.
+    Per-sequence partials number their sequences from 1 and record how many records
+    they read, so that ordinals stay right when length_range drops some.
+    memo: optional ARSC.memo.SequenceMemo; per-sequence results of repeated sequences are reused.
+    Partials tally ignored characters ("ignored": {byte: count}) and, per sequence, the
+    sequences that have any ("ignored_sequences").
+    """
+    ignored_tally = Counter()
+    if per_sequence:
+        # The table needs NumPy anyway: load it now so that _count_normalized uses bincount throughout
+        preload_numpy()
+        table = SequenceTable(None)
+        ignored_sequences = 0
+        i = 0
+        for i, (_, seq) in enumerate(iter_fasta_bytes(handle), 1):
+            seq = seq.translate(_UPPER_TABLE, _DELETE_BYTES)
+            if length_range is not None and not in_length_range(len(seq), length_range):
+                continue
+            if memo is not None:
+                key = memo.key(seq)
+                known = memo.get(key)
+                if known is not None:
+                    seq_length, metrics, residue_counts, ignored = known
+                    if ignored:
+                        _warn_ignored(ignored)
+                        ignored_tally.update({c: seq.count(bytes((c,))) for c in ignored})
+                        ignored_sequences += 1
+                    table.append(i, seq_length, metrics, residue_counts)
+                    continue
+            residue_counts, seq_length, ignored, order = _count_normalized(seq)
+            metrics = compute_ARSC_from_vector(residue_counts, seq_length, ignored, order)
+            if ignored:
+                ignored_tally.update(ignored)
+                ignored_sequences += 1
+            if memo is not None:
+                memo.put(key, seq_length, metrics, residue_counts, bytes(ignored))
+            table.append(i, seq_length, metrics, residue_counts)
+        return {"sequences": table.finish(), "records": i, "ignored": ignored_tally, "ignored_sequences": ignored_sequences}
+
+    totals = [0] * len(RESIDUES)
+    total_aa_length = 0
+    order = []
+    for records in iter_fasta_blocks(handle):
+        seqs = (seq for _, seq in records)
+        if length_range is not None:
+            seqs = [seq.translate(None, _DELETE_BYTES) for seq in seqs]
+            seqs = [seq for seq in seqs if in_length_range(len(seq), length_range)]
+        # Whole-file mode only needs totals, so count each block in one pass
+        residue_counts, seq_length, ignored, seq_order = count_residues(b"".join(seqs))
+        totals = list(map(sum, zip(totals, residue_counts)))
+        total_aa_length += seq_length
+        ignored_tally.update(ignored)
+        if len(order) < len(RESIDUES):
+            order.extend(j for j in seq_order if j not in order)
+    return {
+        "residue_counts": totals,
+        "total_aa_length": total_aa_length,
+        "ignored": ignored_tally,
+        "residue_order": order
+    }
+
+
+def count_faa_by_key(handle, key, length_range=None):
+    """Residue counts of the proteins of a FASTA stream, summed per key(header).
+
+    key: maps a header (bytes, without '>') to a group name. Consecutive proteins with
+    the same name are counted together in one vectorized pass (compute_batch).
+    Returns {"names": [...], "residue_counts": n x len(RESIDUES) int64, "total_aa": n int64},
+    groups in order of first appearance.
+    """
+    index = {}
+    names = []
+    counts = np.zeros((1024, len(RESIDUES) + 1), dtype=np.int64)
+    for records in iter_fasta_blocks(handle):
+        runs = []
+        run_keys = []
+        previous = None
+        for header, seq in records:
+            if length_range is not None and not in_length_range(len(seq.translate(None, _DELETE_BYTES)), length_range):
+                continue
+            name = key(header)
+            if name != previous:
+                runs.append([])
+                run_keys.append(index.setdefault(name, len(index)))
+                if len(index) > len(names):
+                    names.append(name)
+                previous = name
+            runs[-1].append(seq)
+        if not runs:
+            continue
+        batch = compute_batch([b"".join(run) for run in runs])
+        if len(names) > len(counts):
+            grown = np.zeros((max(len(names), 2 * len(counts)), counts.shape[1]), dtype=np.int64)
+            grown[:len(counts)] = counts
+            counts = grown
+        rows = np.array(run_keys, dtype=np.intp)
+        np.add.at(counts[:, :-1], rows, batch["residue_counts"])
+        np.add.at(counts[:, -1], rows, batch["length"])
+    counts = counts[:len(names)]
+    return {"names": names, "residue_counts": counts[:, :-1], "total_aa": counts[:, -1]}
+
+
+def merge_faa_partials(genome_name, partials, per_sequence=False):
+    """Combine partials (in file order) into the result dict of process_faa.
+
+    The ignored characters of all partials are summed into result["ignored"] ({character: count}).
+    """
+    ignored_tally = Counter()
+    for p in partials:
+        ignored_tally.update(p.get("ignored", {}))
+    if per_sequence:
+        tables = [p["sequences"] for p in partials]
+        records = [p.get("records", len(t)) for p, t in zip(partials, tables)]
+        return {"genome": genome_name, "sequences": SequenceTable.concat(genome_name, tables, records),
+                "ignored": ignored_summary(ignored_tally), "ignored_sequences": sum(p.get("ignored_sequences", 0) for p in partials)}
+
+    totals = [0] * len(RESIDUES)
+    total_aa_length = 0
+    order = []
+    for p in partials:
+        totals = list(map(sum, zip(totals, p["residue_counts"])))
+        total_aa_length += p["total_aa_length"]
+        # First appearance in the file = first appearance in the earliest range
+        order.extend(j for j in p["residue_order"] if j not in order)
+
+    N, C, S, MW = compute_ARSC_from_vector(totals, total_aa_length, ignored_tally, order)
+    return {
+        "genome": genome_name,
+        "N_ARSC": N,
+        "C_ARSC": C,
+        "S_ARSC": S,
+        "MW_ARSC": MW,
+        "aa_composition": composition_from_vector(totals, total_aa_length),
+        "residue_counts": totals,
+        "total_aa_length": total_aa_length,
+        "ignored": ignored_summary(ignored_tally)
+    }
+
+
+def _process_faa_biopython(faa_source, name=None, per_sequence=False, length_range=None):
+    # Biopython is imported here: it is only needed by this backend and slows down startup
+    from Bio import SeqIO
     try:
         # Determine genome name
         genome_name = name
         if genome_name is None:
             # faa_source is a path string
-            base = os.path.basename(faa_source)
-            for ext in [".faa.gz", ".faa", ".gz"]:
-                if base.endswith(ext):
-                    base = base[: -len(ext)]
-            genome_name = base
+            genome_name = _genome_name_from_path(faa_source)
 
+        ignored_tally = Counter()
         if per_sequence:
-            results = []
+            table = SequenceTable(genome_name)
+            ignored_sequences = 0
             # enumerateを使って、1番から順に番号を振る
+            # (IDはrecord.idに頼らず、ゲノム名 + 通し番号で作る)
             for i, record in enumerate(SeqIO.parse(faa_source, "fasta-blast"), 1):
                 seq = str(record.seq).upper().replace("*", "")
+                if length_range is not None and not in_length_range(len(seq), length_range):
+                    continue
                 seq_counts = Counter(seq)
                 seq_length = sum(seq_counts.values())
+                ignored = {a: n for a, n in seq_counts.items() if a not in aa_dictionary}
+                if ignored:
+                    ignored_tally.update(ignored)
+                    ignored_sequences += 1
 
-                # record.idに頼らず、ゲノム名 + 通し番号でIDを作る
-                display_id = f"{genome_name}_{i}"
-
-                N, C, S, MW = compute_ARSC_extended_counts(seq_counts, aa_dictionary)
-                results.append({
-                    "sequence_id": display_id,
-                    "length": seq_length,
-                    "N_ARSC": N,
-                    "C_ARSC": C,
-                    "S_ARSC": S,
-                    "MW_ARSC": MW,
-                    "aa_composition": compute_aa_composition(seq_counts)
-                })
-            return {"genome": genome_name, "sequences": results}
+                metrics = compute_ARSC_extended_counts(seq_counts, aa_dictionary)
+                table.append(i, seq_length, metrics, [seq_counts.get(aa, 0) for aa in RESIDUES])
+            return {"genome": genome_name, "sequences": table.finish(), "ignored": ignored_summary(ignored_tally),
+                    "ignored_sequences": ignored_sequences}
         else:
             counts = Counter()
             for record in SeqIO.parse(faa_source, "fasta-blast"):
                 seq = str(record.seq).upper().replace("*", "")
+                if length_range is not None and not in_length_range(len(seq), length_range):
+                    continue
                 counts.update(seq)
 
             total_aa_length = sum(counts.values())
@@ -137,7 +909,9 @@ def process_faa(faa_source, name=None, per_sequence=False):
                 "S_ARSC": S,
                 "MW_ARSC": MW,
                 "aa_composition": aa_composition,
-                "total_aa_length": total_aa_length
+                "residue_counts": [counts.get(aa, 0) for aa in RESIDUES],
+                "total_aa_length": total_aa_length,
+                "ignored": ignored_summary({a: n for a, n in counts.items() if a not in aa_dictionary})
             }
 
     except Exception as e:
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to collect the diagnostics of a run in the parent process: the ignored (unknown)
+characters that the workers tally per genome, merged into one summary instead of a warning per sequence.
+
+Workers attach result["ignored"] ({character: count}) and, in per-sequence mode, result["ignored_sequences"]
+(ARSC.core); Diagnostics.collect() takes them off the results as they arrive. The summary is printed to stderr
+and can be written as a JSON sidecar (--diagnostics).
+"""
+
+
+import sys
+import json
+from collections import Counter
+
+
+class Diagnostics:
+    """Run-wide tally of ignored characters; per genome for the genomes that have any.
+
+    verbosity: "off" (collect only), "summary" (one line at the end), "genome" (also one
+    line per genome as its result arrives) or "all" (workers also warn per sequence / file).
+    """
+
+    def __init__(self, verbosity="summary"):
+        self.verbosity = verbosity
+        self.ignored = Counter()
+        self.genomes = []
+        self.results = 0
+        self.sequences = 0
+
+    def add(self, r):
+        ignored = r.pop("ignored", None)
+        sequences = r.pop("ignored_sequences", 0)
+        if "error" in r:
+            return
+        self.results += 1
+        if not ignored:
+            return
+        self.ignored.update(ignored)
+        self.sequences += sequences
+        record = {"genome": r.get("genome"), "ignored": ignored, "total": sum(ignored.values())}
+        if "sequences" in r:
+            record["sequences"] = sequences
+        self.genomes.append(record)
+        if self.verbosity == "genome":
+            print(f"Warning: {record['genome']}: ignored characters {self.format_counts(ignored)}" +
+                  (f" in {sequences} sequences" if "sequences" in r else ""), file=sys.stderr)
+
+    def collect(self, results):
+        """Pass results through, taking off their ignored-character tallies."""
+        for r in results:
+            self.add(r)
+            yield r
+
+    @staticmethod
+    def format_counts(ignored):
+        return ", ".join(f"{c!r} x{n}" for c, n in sorted(ignored.items(), key=lambda item: -item[1]))
+
+    def summary(self):
+        """One line for stderr, or None when no character was ignored."""
+        if not self.ignored:
+            return None
+        where = f"{len(self.genomes)} of {self.results} genomes"
+        if self.sequences:
+            where += f" ({self.sequences} sequences)"
+        return (f"Ignored characters (counted in the length only): {self.format_counts(self.ignored)} in {where}. "
+                "See --diagnostics / --ignored-warnings for details.")
+
+    def to_dict(self):
+        return {
+            "results": self.results,
+            "genomes_with_ignored": len(self.genomes),
+            "sequences_with_ignored": self.sequences,
+            "ignored": dict(self.ignored.most_common()),
+            "genomes": self.genomes,
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=1)
+            fh.write("\n")
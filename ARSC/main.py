@@ -16,11 +16,19 @@ Original citations for calculation metrics in Mende et al. 2017:
 import sys
 import argparse
 import os
-from multiprocessing import Pool
-from statistics import mean, stdev
+from contextlib import nullcontext
 from ARSC import __version__
-from ARSC.utils import collect_faa_files, process_faa_auto, collect_fna_files, process_fna_pipeline, detect_nucleotide_file, dispatch_process
-from ARSC.core import aa_dictionary
+from ARSC.utils import collect_faa_files, process_faa_auto, collect_fna_files, process_fna_pipeline, detect_nucleotide_file, dispatch_task, is_bgzf, split_fasta_ranges
+from ARSC.utils import read_manifest, write_manifest, shard_items
+from ARSC.core import aa_dictionary, BACKENDS, RESIDUES, merge_faa_partials, compute_ARSC_matrix, set_ignored_warnings
+from ARSC.core import LazyModule, preload_numpy
+from ARSC.cache import ResultCache
+from ARSC.memo import SequenceMemo
+from ARSC.diagnostics import Diagnostics
+from ARSC.timing import Profiler, timed
+from ARSC.output import OUTPUT_FORMATS, COLUMNAR_FORMATS, ColumnarWriter, infer_output_format, resolve_output_format, open_text_output
+
+np = LazyModule("numpy", globals(), "np")
 
 quickARSC_LOGO = """
              _      _              _____   _____  _____ 
@@ -38,20 +46,401 @@ quickARSC_LOGO = """
 class CustomFormatter(argparse.RawTextHelpFormatter, argparse.ArgumentDefaultsHelpFormatter):
     pass
 
+def make_pool(threads, initializer=None, initargs=()):
+    """Worker pool; multiprocessing is only imported when more than one worker is used.
+
+    NumPy is loaded first so that forked workers share it instead of importing it each
+    (the parent needs it anyway to unpickle per-sequence tables).
+    """
+    preload_numpy()
+    from multiprocessing import Pool
+    return Pool(threads, initializer, initargs)
+
+def parse_shard(value):
+    """argparse type of --shard: 'i/N' with 1 <= i <= N."""
+    try:
+        index, count = (int(v) for v in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and N, got {value!r}")
+    return index, count
+
+def splittable(handle, args):
+    """True if a protein file is large enough to be counted in parallel byte ranges."""
+    if args.threads <= 1 or args.split_size <= 0 or args.backend != 'bytes' or args.windows is not None:
+        return False
+    if handle.endswith('.gz') and not is_bgzf(handle):
+        return False
+    try:
+        return os.path.getsize(handle) > args.split_size * 1024 * 1024
+    except OSError:
+        return False
+
+
+def faa_tasks(item, args, cache, profile=False, memo=None):
+    """Tasks of one protein file: one task, or one per byte range for large files."""
+    handle = item['handle']
+    if splittable(handle, args):
+        ranges = split_fasta_ranges(handle, args.split_size * 1024 * 1024)
+        if len(ranges) > 1:
+            bgzf = handle.endswith('.gz')
+            return [({**item, 'range': r, 'part': (i, len(ranges)), 'bgzf': bgzf}, 'faa', args.per_sequence, args.backend, None, profile, args.length_range, memo, args.windows, args.groups)
+                    for i, r in enumerate(ranges)]
+    return [(item, 'faa', args.per_sequence, args.backend, cache, profile, args.length_range, memo, args.windows, args.groups)]
+
+
+def merge_parts(pool_results, per_sequence, cache):
+    """Merge partial results of split files; other results pass through unchanged.
+
+    A merged result is yielded when its last part arrives, in place of that part.
+    """
+    pending = {}
+    for r in pool_results:
+        if 'part' not in r:
+            yield r
+            continue
+        index, count = r['part']
+        parts = pending.setdefault(r['source'], {})
+        parts[index] = r
+        if len(parts) < count:
+            continue
+        del pending[r['source']]
+        errors = [p for p in parts.values() if 'error' in p]
+        if errors:
+            yield errors[0]
+            continue
+        merged = merge_faa_partials(r['genome'], [parts[i] for i in range(count)], per_sequence)
+        if cache is not None and r.get('cache_key'):
+            cache.put(r['cache_key'], merged)
+        yield merged
+
+
+def iter_results(slots, pool_results, ordered):
+    """Merge cached results (non-None slots) with results coming from the pool."""
+    if ordered:
+        for slot in slots:
+            yield slot if slot is not None else next(pool_results)
+    else:
+        yield from (slot for slot in slots if slot is not None)
+        yield from pool_results
+
+
+def filter_result(r, args):
+    """Apply error and length filters to one worker result; return None to drop it."""
+    if 'error' in r:
+        print(f"Skipping genome due to error: {r['error']}", file=sys.stderr)
+        return None  # エラーがある場合は結果に含めない
+    # Per-protein length filters (-p, --filter-proteins, windows) were applied by the worker
+    if args.groups is not None:
+        return filter_groups(r, args)
+    if args.windows is not None:
+        return r if len(r['windows']) else None
+    if args.per_sequence:
+        return r if len(r['sequences']) else None
+    if args.length_range is not None:
+        return r if r.get('total_aa_length', 0) else None
+    length = r.get('total_aa_length', 0)
+    if (args.min_length is not None and length < args.min_length) or (args.max_length is not None and length > args.max_length):
+        return None
+    return r
+
+
+def filter_groups(r, args):
+    """--per-contig / --bins: keep the groups whose protein length is in range (unless filtered per protein)."""
+    groups = r['groups']
+    if args.length_range is None and (args.min_length is not None or args.max_length is not None):
+        total = groups['total_aa']
+        keep = np.ones(len(total), dtype=bool)
+        if args.min_length is not None:
+            keep &= total >= args.min_length
+        if args.max_length is not None:
+            keep &= total <= args.max_length
+        groups = {key: [v for v, k in zip(value, keep) if k] if key == 'names' else value[keep] for key, value in groups.items()}
+        r = {**r, 'groups': groups}
+    return r if len(groups['names']) else None
+
+
+def group_columns(r, args, aa_keys):
+    """Columns (header order) of a --per-contig / --bins result: GC, bases, ARSC, composition and counts per group."""
+    groups = r['groups']
+    n = len(groups['names'])
+    bases = groups['base_counts']
+    residue_counts = groups['residue_counts']
+    total = groups['total_aa']
+    atgc = bases.sum(axis=1)
+    metrics = np.nan_to_num(compute_ARSC_matrix(residue_counts, total))
+    columns = {"query": np.full(n, r['genome']), args.groups['by']: np.array(groups['names'], dtype=np.str_)}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        columns["genomic_GC"] = np.nan_to_num((bases[:, 2] + bases[:, 3]) * 100 / atgc)
+        for j, base in enumerate("ATGC"):
+            columns[f"base_{base}"] = np.nan_to_num(bases[:, j] * 100 / atgc)
+        for i, column in enumerate(("N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW")):
+            columns[column] = metrics[:, i]
+        columns["TotalLength"] = total
+        if args.aa_composition:
+            for aa in aa_keys:
+                columns[aa] = np.nan_to_num(residue_counts[:, RESIDUES.index(aa)] / total)
+    if args.raw_counts:
+        for aa in aa_keys:
+            columns[f"count_{aa}"] = residue_counts[:, RESIDUES.index(aa)]
+        columns["count_other"] = total - residue_counts.sum(axis=1)
+        for j, base in enumerate("ATGC"):
+            columns[f"base_count_{base}"] = bases[:, j]
+    return columns
+
+
+def format_header(args, aa_keys):
+    h = ["query"]
+    # --per-contig / --bins: コンティグ (ビン) 名の列
+    if args.groups is not None:
+        h.append(args.groups['by'])
+    # -n が指定された場合に GC, base_ATGC を追加
+    if args.nucleotide:
+        h.extend(["genomic_GC", "base_A", "base_T", "base_G", "base_C"])
+    # --window / --regions: 窓 (領域) ごとに一行
+    if args.windows is not None:
+        h.extend(["sequence_id", "start", "end"] + (["region"] if "regions" in args.windows else []))
+        h.extend(["N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW", "length"])
+        return h
+    # -p が指定された場合に sequence_id を追加
+    if args.per_sequence:
+        h.append("sequence_id")
+    h.extend(["N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW", "length" if args.per_sequence else "TotalLength"])
+    if args.aa_composition:
+        h.extend(aa_keys)
+    # --raw-counts: 残基数 (と -n では塩基数) をそのまま出力
+    if args.raw_counts:
+        h.extend([f"count_{aa}" for aa in aa_keys] + ["count_other"])
+        if args.nucleotide and not args.per_sequence:
+            h.extend(f"base_count_{base}" for base in "ATGC")
+    # --ignored-column: 長さにだけ数えた未知の文字の数
+    if args.ignored_column:
+        h.append("ignored")
+    return h
+
+
+def raw_count_columns(r, args, aa_keys):
+    """Raw count columns of one result (--raw-counts), in header order: a list of int64 arrays.
+
+    count_other holds the unknown characters that total_aa_length includes. Genome base
+    counts are left out of per-sequence rows, where they would be repeated on every row.
+    """
+    if args.per_sequence:
+        table = r['sequences']
+        counts = table.counts.astype(np.int64)
+        lengths = table.lengths
+    else:
+        counts = np.array([r.get('residue_counts') or [0] * len(RESIDUES)], dtype=np.int64)
+        lengths = np.array([r.get('total_aa_length', 0)], dtype=np.int64)
+    columns = [counts[:, RESIDUES.index(aa)] for aa in aa_keys]
+    columns.append(ignored_column(r, args))
+    if args.nucleotide and not args.per_sequence:
+        base_counts = r.get('base_counts', {})
+        columns.extend(np.array([base_counts.get(base, 0)], dtype=np.int64) for base in "ATGC")
+    return columns
+
+
+def ignored_column(r, args):
+    """Number of ignored (unknown) characters of each row: retained characters that are not residues."""
+    if args.per_sequence:
+        table = r['sequences']
+        return table.lengths - table.counts.sum(axis=1, dtype=np.int64)
+    return np.array([r.get('total_aa_length', 0) - sum(r.get('residue_counts') or [])], dtype=np.int64)
+
+
+def format_rows(r, args, decimal_fmt, aa_keys):
+    """Yield the TSV lines of one filtered result."""
+    if args.groups is not None:
+        columns = group_columns(r, args, aa_keys)
+        fmt = f"%.{args.decimal_places}f"
+        template = "\t".join("%s" if c.dtype.kind == "U" else "%d" if c.dtype.kind in "iu" else fmt for c in columns.values()) + "\n"
+        for values in zip(*(c.tolist() for c in columns.values())):
+            yield template % values
+        return
+    prefix = [r['genome']]
+    # -n
+    if args.nucleotide:
+        prefix.extend([
+            decimal_fmt.format(r.get('GC', 0)),
+            decimal_fmt.format(r.get('base_A', 0)),
+            decimal_fmt.format(r.get('base_T', 0)),
+            decimal_fmt.format(r.get('base_G', 0)),
+            decimal_fmt.format(r.get('base_C', 0))
+        ])
+
+    # --window / --regions: WindowTable も同様に整形する
+    if args.windows is not None:
+        table = r['windows']
+        fmt = f"%.{args.decimal_places}f"
+        escaped = [field.replace("%", "%%") for field in prefix]
+        template = "\t".join(escaped + [escaped[0] + "_%d", "%d", "%d"] + (["%s"] if table.names is not None else []) + [fmt] * 4 + ["%d"])
+        columns = [table.ordinals.tolist(), table.starts.tolist(), table.ends.tolist()]
+        if table.names is not None:
+            columns.append(table.names.tolist())
+        columns.extend(np.nan_to_num(table.metrics).T.tolist())
+        columns.append((table.ends - table.starts).tolist())
+        template += "\n"
+        for values in zip(*columns):
+            yield template % values
+
+    # -p: 列指向の SequenceTable を一行ずつ % で整形する
+    elif args.per_sequence:
+        table = r['sequences']
+        fmt = f"%.{args.decimal_places}f"
+        escaped = [field.replace("%", "%%") for field in prefix]
+        template = "\t".join(escaped + [escaped[0] + "_%d"] + [fmt] * 4 + ["%d"])
+        columns = [table.ordinals.tolist(), *np.nan_to_num(table.metrics).T.tolist(), table.lengths.tolist()]
+        if args.aa_composition:
+            template += "\t" + "\t".join([fmt] * len(aa_keys))
+            columns.extend(table.composition(aa_keys).T.tolist())
+        if args.raw_counts:
+            raw = raw_count_columns(r, args, aa_keys)
+            template += "\t%d" * len(raw)
+            columns.extend(column.tolist() for column in raw)
+        if args.ignored_column:
+            template += "\t%d"
+            columns.append(ignored_column(r, args).tolist())
+        template += "\n"
+        for values in zip(*columns):
+            yield template % values
+
+    # 通常
+    else:
+        row = prefix + [
+            decimal_fmt.format(r.get('N_ARSC') or 0),
+            decimal_fmt.format(r.get('C_ARSC') or 0),
+            decimal_fmt.format(r.get('S_ARSC') or 0),
+            decimal_fmt.format(r.get('MW_ARSC') or 0),
+            str(r.get('total_aa_length', 0))
+        ]
+        if args.aa_composition:
+            comp = r.get('aa_composition', {})
+            row.extend([decimal_fmt.format(comp.get(aa, 0)) for aa in aa_keys])
+        if args.raw_counts:
+            row.extend(str(column[0]) for column in raw_count_columns(r, args, aa_keys))
+        if args.ignored_column:
+            row.append(str(ignored_column(r, args)[0]))
+        yield "\t".join(row) + "\n"
+
+
+def window_columns(r, args):
+    """Binary output columns of a --window / --regions result."""
+    table = r['windows']
+    n = len(table)
+    columns = {"query": np.full(n, r['genome'])}
+    if args.nucleotide:
+        for key, column in (('GC', 'genomic_GC'), ('base_A', 'base_A'), ('base_T', 'base_T'), ('base_G', 'base_G'), ('base_C', 'base_C')):
+            columns[column] = np.full(n, r.get(key, 0), dtype=np.float64)
+    columns["sequence_id"] = np.array(table.sequence_ids(), dtype=np.str_)
+    columns["start"] = table.starts
+    columns["end"] = table.ends
+    if table.names is not None:
+        columns["region"] = table.names
+    metrics = np.nan_to_num(table.metrics)
+    for i, column in enumerate(("N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW")):
+        columns[column] = metrics[:, i]
+    columns["length"] = table.ends - table.starts
+    return columns
+
+
+def format_columns(r, args, aa_keys):
+    """Columns of one filtered result for binary output: NumPy arrays keyed like the header, not rounded."""
+    if args.groups is not None:
+        return group_columns(r, args, aa_keys)
+    if args.windows is not None:
+        return window_columns(r, args)
+    if args.per_sequence:
+        table = r['sequences']
+        n = len(table)
+        metrics = np.nan_to_num(table.metrics)
+    else:
+        n = 1
+        metrics = np.array([[r.get(key) or 0 for key in ('N_ARSC', 'C_ARSC', 'S_ARSC', 'MW_ARSC')]], dtype=np.float64)
+
+    columns = {"query": np.full(n, r['genome'])}
+    if args.nucleotide:
+        for key, column in (('GC', 'genomic_GC'), ('base_A', 'base_A'), ('base_T', 'base_T'), ('base_G', 'base_G'), ('base_C', 'base_C')):
+            columns[column] = np.full(n, r.get(key, 0), dtype=np.float64)
+    if args.per_sequence:
+        columns["sequence_id"] = np.array(table.sequence_ids(), dtype=np.str_)
+    for i, column in enumerate(("N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW")):
+        columns[column] = metrics[:, i]
+    if args.per_sequence:
+        columns["length"] = table.lengths
+        if args.aa_composition:
+            columns.update(zip(aa_keys, table.composition(aa_keys).T))
+    else:
+        columns["TotalLength"] = np.array([r.get('total_aa_length', 0)], dtype=np.int64)
+        if args.aa_composition:
+            comp = r.get('aa_composition', {})
+            columns.update((aa, np.array([comp.get(aa, 0)], dtype=np.float64)) for aa in aa_keys)
+    if args.raw_counts:
+        raw = raw_count_columns(r, args, aa_keys)
+        header = format_header(args, aa_keys)[:-1] if args.ignored_column else format_header(args, aa_keys)
+        columns.update(zip(header[-len(raw):], raw))
+    if args.ignored_column:
+        columns["ignored"] = ignored_column(r, args)
+    return columns
+
+
 def main():
+    # Subcommands
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        from ARSC.merge import merge_main
+        return merge_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "aggregate":
+        from ARSC.aggregate import aggregate_main
+        return aggregate_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        from ARSC.webindex import index_main
+        return index_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from ARSC.serve import serve_main
+        return serve_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description=f"{quickARSC_LOGO}\n\n", formatter_class=CustomFormatter)
-    parser.add_argument("input", help="Positional input: fasta file or directory")
+    parser.add_argument("input", nargs="?", help="Positional input: fasta file or directory")
+    parser.add_argument("--manifest", help="Read input files from a manifest instead: one path per line, optional tab-separated name and size columns (relative paths are relative to the manifest)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search input directories recursively")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="Process only shard i of N (1-based); files are assigned deterministically, balanced by file size")
+    parser.add_argument("--write-manifest", metavar="FILE", help="Write the (sharded) input file list with sizes as a manifest and exit")
     parser.add_argument("-p", "--per-sequence", action="store_true", help="Process each sequence individually")
     parser.add_argument("-a", "--aa-composition", action="store_true", help="Include amino acid composition ratios")
     parser.add_argument("-o", "--output", help="Output TSV file (default: stdout)")
-    parser.add_argument("-s", "--stats", action="store_true", help="Output summary statistics to stderr")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="Output format (default: from the -o suffix: .gz, .zst, .parquet, .arrow/.feather, .npz; otherwise tsv). parquet/arrow need pyarrow (falls back to npz); binary formats store unrounded values")
+    parser.add_argument("-s", "--stats", action="store_true", help="Output summary statistics (mean, stdev, min, quartiles, max) to stderr")
+    parser.add_argument("--stats-by-genome", metavar="TSV", help="With -p: write per-genome statistics of the per-sequence metrics to this TSV file")
     parser.add_argument("--no-auto-detection", action="store_true", help="Disable automatic nucleotide sequence detection (skip nucleotide-detected files)")
     parser.add_argument("--no-header", action="store_true", help="Suppress header line")
     parser.add_argument("-t", "--threads", default=1, type=int, help="Number of threads")
     parser.add_argument("-d", "--decimal-places", default=6, type=int, help="Decimal places")
     parser.add_argument("--min-length", type=int, help="Minimum sequence length")
     parser.add_argument("--max-length", type=int, help="Maximum sequence length")
+    parser.add_argument("--filter-proteins", action="store_true", help="Without -p: apply --min-length/--max-length to each protein and aggregate only the proteins in range (default: filter genomes by total length)")
     parser.add_argument("-n", "--nucleotide", action="store_true", help="Nucleotide mode for calculate GC contents and ARSCs from fna/fna.gz (please install Prodigal)")
+    parser.add_argument("--ordered", action="store_true", help="Write results in input order (default: as soon as each file finishes)")
+    parser.add_argument("--chunksize", default=1, type=int, help="Number of files sent to a worker at once")
+    parser.add_argument("--split-size", default=256, type=int, help="With -t > 1, split protein files (plain or BGZF) larger than this many MB into record-aligned ranges counted in parallel (0: off)")
+    parser.add_argument("--backend", default="bytes", choices=BACKENDS, help="Residue counting engine (bytes: lookup-table counting, biopython: SeqIO + Counter)")
+    parser.add_argument("--cache-dir", help="Directory of the persistent result cache (unchanged files are not recomputed)")
+    parser.add_argument("--cache-size", default=1024, type=int, help="Cache size limit in MB (least recently used entries are evicted)")
+    parser.add_argument("--cache-hash", action="store_true", help="Also key the cache by a SHA-256 of file contents (reads every file)")
+    parser.add_argument("--memo", action="store_true", help="With -p: reuse the results of identical sequences (in-process LRU keyed by a digest of the sequence)")
+    parser.add_argument("--memo-size", default=200000, type=int, help="Number of sequences kept in the --memo LRU of each worker")
+    parser.add_argument("--memo-db", metavar="FILE", help="SQLite file persisting the sequence memo across workers and runs (implies --memo)")
+    parser.add_argument("--window", type=int, metavar="N", help="Output N/C/S-ARSC profiles over sliding windows of N residues along each protein (one row per window, coordinates 0-based, end exclusive)")
+    parser.add_argument("--step", type=int, metavar="N", help="Step between --window starts (default: the window size)")
+    parser.add_argument("--regions", metavar="BED", help="Output profiles of the regions in a BED-like file instead (id, start, end[, name]; id is the first word of the FASTA header)")
+    parser.add_argument("--per-contig", action="store_true", help="With -n: one row per contig (GC, base composition and ARSC of the proteins predicted on it) instead of per file")
+    parser.add_argument("--bins", metavar="MAP", help="With -n: one row per bin, from a two-column contig<TAB>bin file (contigs without a bin are grouped as 'unbinned')")
+    parser.add_argument("--raw-counts", action="store_true", help="Also output raw residue counts (count_<aa>, count_other) and, with -n, base counts, so results can be combined exactly with 'arsc merge'")
+    parser.add_argument("--ignored-column", action="store_true", help="Add an 'ignored' column: the number of unknown characters (not in the residue table) counted in the length only")
+    parser.add_argument("--diagnostics", metavar="JSON", help="Write the ignored characters of the run (totals and per genome) to this JSON file")
+    parser.add_argument("--ignored-warnings", default="summary", choices=["off", "summary", "genome", "all"],
+                        help="Report ignored characters: off, one summary line (summary), also one line per genome (genome), or a warning for every sequence / file from the workers as in earlier versions (all)")
+    parser.add_argument("--profile", metavar="JSONL", help="Record per-file, per-stage timings as JSON lines and print a profile summary")
+    parser.add_argument("--trace", metavar="JSON", help="Write per-file, per-stage timings as a Chrome trace (chrome://tracing, Perfetto) and print a profile summary")
     parser.add_argument("-v", "--version", action="version", version=f"%(prog)s {__version__}")
 
     args = parser.parse_args()
@@ -62,172 +451,256 @@ def main():
 
     # 入力パス
     target_input = args.input
-    if not target_input:
-        parser.error("missing input: provide a .faa/.faa.gz file or directory")
+    if not target_input and not args.manifest:
+        parser.error("missing input: provide a .faa/.faa.gz file or directory, or --manifest")
+    if target_input and args.manifest:
+        parser.error("give either an input path or --manifest, not both")
 
-    if args.stats and not os.path.isdir(target_input):
-        parser.error("--stats can only be used with directory input")
+    if args.window is not None and args.regions:
+        parser.error("give either --window or --regions, not both")
+    if args.step is not None and args.window is None:
+        parser.error("--step requires --window")
+    if (args.window is not None and args.window < 1) or (args.step is not None and args.step < 1):
+        parser.error("--window and --step must be positive")
+    args.windows = None
+    if args.window is not None:
+        args.windows = {"window": args.window, "step": args.step or args.window}
+    elif args.regions:
+        if not os.path.isfile(args.regions):
+            parser.error(f"--regions file not found: {args.regions}")
+        args.windows = {"regions": os.path.abspath(args.regions)}
+    if args.windows is not None:
+        incompatible = [flag for flag, used in (("-p", args.per_sequence), ("-a", args.aa_composition), ("--raw-counts", args.raw_counts),
+                                                 ("--ignored-column", args.ignored_column),
+                                                 ("--memo", args.memo or args.memo_db), ("--stats-by-genome", args.stats_by_genome),
+                                                 ("--backend biopython", args.backend != "bytes")) if used]
+        if incompatible:
+            parser.error(f"--window/--regions cannot be combined with {', '.join(incompatible)}")
+    args.groups = None
+    if args.per_contig or args.bins:
+        if not args.nucleotide:
+            parser.error("--per-contig/--bins require -n/--nucleotide")
+        if args.per_sequence or args.windows is not None or args.ignored_column:
+            parser.error("--per-contig/--bins cannot be combined with -p, --window/--regions or --ignored-column")
+        if args.bins and not os.path.isfile(args.bins):
+            parser.error(f"--bins file not found: {args.bins}")
+        args.groups = {"by": "bin", "map": os.path.abspath(args.bins)} if args.bins else {"by": "contig"}
+    if (args.memo or args.memo_db) and not args.per_sequence:
+        parser.error("--memo/--memo-db require -p/--per-sequence")
+    if (args.memo or args.memo_db) and args.backend != "bytes":
+        parser.error("--memo/--memo-db are only supported by the bytes backend")
+    if args.stats_by_genome and not args.per_sequence:
+        parser.error("--stats-by-genome requires -p/--per-sequence")
 
-    if args.nucleotide:
-        items = list(collect_fna_files(args.input))
-        initial_mode = 'fna'
+    output_format = args.output_format or infer_output_format(args.output)
+    if output_format != "tsv" and not args.output:
+        parser.error(f"--output-format {output_format} requires -o/--output")
+    args.output, output_format = resolve_output_format(args.output, output_format)
+
+    if args.manifest:
+        items = list(read_manifest(args.manifest))
+    elif args.nucleotide:
+        items = list(collect_fna_files(args.input, recursive=args.recursive))
     else:
-        items = list(collect_faa_files(args.input))
-        initial_mode = 'faa'
+        items = list(collect_faa_files(args.input, recursive=args.recursive))
+    initial_mode = 'fna' if args.nucleotide else 'faa'
+
+    if args.shard:
+        index, count = args.shard
+        n_all = len(items)
+        items = shard_items(items, index, count)
+        print(f"Shard {index}/{count}: {len(items)} of {n_all} files ({sum(item['size'] for item in items) / 1e6:.1f} MB).", file=sys.stderr)
+
+    if args.write_manifest:
+        n = write_manifest(items, args.write_manifest)
+        print(f"Manifest of {n} files written to {args.write_manifest}", file=sys.stderr)
+        return
 
     print(f"quickARSC Version: {__version__}", file=sys.stderr)
     print(f"Found {len(items)} files to process.", file=sys.stderr)
     print(f"Using {args.threads} threads.", file=sys.stderr)
 
+    # 長さフィルタ: -p と --filter-proteins ではワーカーが範囲外のタンパク質を数えずに飛ばす
+    args.length_range = None
+    if (args.per_sequence or args.filter_proteins or args.windows is not None) and (args.min_length is not None or args.max_length is not None):
+        args.length_range = (args.min_length, args.max_length)
+
+    # --- プロファイル (--profile / --trace) ---
+    profiler = Profiler() if args.profile or args.trace else None
+    profile = profiler is not None
+
+    # --- 配列メモ (--memo): 同一配列の結果を再利用 ---
+    memo = SequenceMemo(args.memo_size, args.memo_db) if args.memo or args.memo_db else None
+
+    # --- 診断: 無視した文字はワーカーで集計し、ここでまとめる ---
+    diagnostics = Diagnostics(args.ignored_warnings)
+    set_ignored_warnings(args.ignored_warnings == "all")
+
+    # --- キャッシュ ---
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024, use_hash=args.cache_hash)
+        # Key by the requested mode: the detected mode follows from it and the file content
+        cache_mode = 'faa-noauto' if initial_mode == 'faa' and args.no_auto_detection else initial_mode
+        if args.length_range is not None:
+            cache_mode += f":length={args.length_range[0]}-{args.length_range[1]}"
+        if args.window is not None:
+            cache_mode += f":window={args.window}/{args.windows['step']}"
+        elif args.regions:
+            st = os.stat(args.regions)
+            cache_mode += f":regions={args.windows['regions']}:{st.st_size}:{st.st_mtime_ns}"
+        if args.bins:
+            st = os.stat(args.bins)
+            cache_mode += f":bins={args.groups['map']}:{st.st_size}:{st.st_mtime_ns}"
+        elif args.per_contig:
+            cache_mode += ":per-contig"
+
     # --- 各ファイルの処理モードを決め、並列で dispatch ---
+    # slots: input order; a cached result, or None for a result coming from the pool
     task_args = []
-    if initial_mode == 'fna':
-        for item in items:
-            task_args.append((item, 'fna', args.per_sequence))
-    else:
-        for item in items:
-            handle = item.get('handle')
-            is_nuc = detect_nucleotide_file(handle)
-            if is_nuc:
-                if args.no_auto_detection:
-                    # User requested to disable auto-detection: treat everything as amino-acid sequences
-                    print(f"Note: {item.get('name')} looks like nucleotide sequences but --no-auto-detection set; treating as protein.", file=sys.stderr)
-                    task_args.append((item, 'faa', args.per_sequence))
-                else:
-                    print(f"Warning: {item.get('name')} looks like nucleotide sequences — switching to nucleotide processing", file=sys.stderr)
-                    task_args.append((item, 'fna', args.per_sequence))
+    slots = []
+    for item in items:
+        if cache is not None:
+            with timed(profiler, 'cache', item['name']):
+                key = cache.key(item['handle'], cache_mode, args.per_sequence)
+                cached = cache.get(key) if key else None
+            if cached is not None:
+                slots.append(cached)
+                continue
+            item['cache_key'] = key
+        slots.append(None)
+
+        if initial_mode == 'fna':
+            task_args.append((item, 'fna', args.per_sequence, args.backend, cache, profile, args.length_range, memo, args.windows, args.groups))
+            continue
+        if not splittable(item['handle'], args):
+            # Sequence type is detected by the worker on its first read of the file
+            task_args.append((item, 'auto-faa' if args.no_auto_detection else 'auto', args.per_sequence, args.backend, cache, profile, args.length_range, memo, args.windows, args.groups))
+            continue
+
+        # Large files may be split into ranges, which needs the sequence type up front
+        is_nuc = detect_nucleotide_file(item['handle'])
+        if is_nuc:
+            if args.no_auto_detection:
+                # User requested to disable auto-detection: treat everything as amino-acid sequences
+                print(f"Note: {item.get('name')} looks like nucleotide sequences but --no-auto-detection set; treating as protein.", file=sys.stderr)
+                task_args.extend(faa_tasks(item, args, cache, profile, memo))
             else:
-                task_args.append((item, 'faa', args.per_sequence))
-
-    with Pool(args.threads) as pool:
-        results = pool.starmap(dispatch_process, task_args)
-
-    # フィルタリング
-    filtered_results = []
-    for r in results:
-        if 'error' in r:
-            print(f"Skipping genome due to error: {r['error']}", file=sys.stderr)
-            continue  # エラーがある場合は結果に含めない
-        if args.per_sequence:
-            r['sequences'] = [seq for seq in r['sequences'] if (args.min_length is None or seq['length'] >= args.min_length) and (args.max_length is None or seq['length'] <= args.max_length)]
-            if r['sequences']:
-                filtered_results.append(r)
+                print(f"Warning: {item.get('name')} looks like nucleotide sequences — switching to nucleotide processing", file=sys.stderr)
+                task_args.append((item, 'fna', args.per_sequence, args.backend, cache, profile, args.length_range, memo, args.windows, args.groups))
         else:
-            length = r.get('total_aa_length', 0)
-            if (args.min_length is not None and length < args.min_length) or (args.max_length is not None and length > args.max_length):
-                continue
-            filtered_results.append(r)
+            task_args.extend(faa_tasks(item, args, cache, profile, memo))
 
-    results = filtered_results
-    print(f"After filtering: {len(results)} results.", file=sys.stderr)
+    if cache is not None:
+        print(f"Loaded {sum(slot is not None for slot in slots)} results from cache.", file=sys.stderr)
 
-    # 統計
-    if args.stats:
-        n_vals, c_vals, s_vals, mw_vals = [], [], [], []
-        for r in results:
-            if 'error' in r: continue
-            target_list = r['sequences'] if args.per_sequence else [r]
-            for data in target_list:
-                n_vals.append(data.get('N_ARSC', 0))
-                c_vals.append(data.get('C_ARSC', 0))
-                s_vals.append(data.get('S_ARSC', 0))
-                mw_vals.append(data.get('MW_ARSC', 0))
-        
-        if n_vals:
-            print("\n" + "="*70, file=sys.stderr)
-            label = "Per-Sequence" if args.per_sequence else "Per-File"
-            print(f"SUMMARY STATISTICS ({label})".center(70), file=sys.stderr)
-            print("="*70, file=sys.stderr)
-            print(f"{'Metric':<12} {'Mean':<16} {'Stdev':<16} {'Min':<16} {'Max':<16}", file=sys.stderr)
-            print("-"*70, file=sys.stderr)
-            for name, vals in [('N_ARSC', n_vals), ('C_ARSC', c_vals), ('S_ARSC', s_vals), ('AvgResMW', mw_vals)]:
-                sd = stdev(vals) if len(vals) > 1 else 0
-                print(f"{name:<12} {mean(vals):<16.{args.decimal_places}f} {sd:<16.{args.decimal_places}f} {min(vals):<16.{args.decimal_places}f} {max(vals):<16.{args.decimal_places}f}", file=sys.stderr)
-            print("-"*70, file=sys.stderr)
-            print(f"{'Count':<12} {len(n_vals):<16}", file=sys.stderr)
-            print("="*70 + "\n", file=sys.stderr)
-
-    # 出力
     decimal_fmt = f"{{:.{args.decimal_places}f}}"
-    out_handle = open(args.output, "w") if args.output else sys.stdout
     aa_keys = sorted(aa_dictionary.keys())
+    # 統計は結果が届くたびに更新する (配列を溜めない)
+    # ARSC.stats (NumPy) は必要なときだけ読み込む
+    stats = genome_stats = None
+    if args.stats or args.stats_by_genome:
+        from ARSC.stats import RunningStats, print_summary, genome_stats_header, genome_stats_row
+        stats = RunningStats() if args.stats else None
+    n_results = 0
 
+    # 出力 (結果はワーカーが終わり次第、順に書き出す)
+    # TSV: rows are formatted per result; binary formats: columns are buffered and written in batches
+    writer = out_handle = None
+    if output_format in COLUMNAR_FORMATS:
+        writer = ColumnarWriter(args.output, output_format, format_header(args, aa_keys))
+    else:
+        out_handle = open_text_output(args.output, output_format)
     try:
-        if not args.no_header:
-            h = ["query"]
-            # -n が指定された場合に GC, base_ATGC を追加
-            if args.nucleotide:
-                h.extend(["genomic_GC", "base_A", "base_T", "base_G", "base_C"])
-            # -p が指定された場合に sequence_id を追加
-            if args.per_sequence:
-                h.append("sequence_id")
-            h.extend(["N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW", "length" if args.per_sequence else "TotalLength"])
-            if args.aa_composition:
-                h.extend(aa_keys)
-            out_handle.write("\t".join(h) + "\n")
-
-        # データ行
-        for r in results:
-            if 'error' in r: continue
-
-            # -p
-            if args.per_sequence:
-                for seq in r.get('sequences', []):
-                    row = [r['genome']]
-
-                    if args.nucleotide:
-                        row.extend([
-                            decimal_fmt.format(r.get('GC', 0)),
-                            decimal_fmt.format(r.get('base_A', 0)),
-                            decimal_fmt.format(r.get('base_T', 0)),
-                            decimal_fmt.format(r.get('base_G', 0)),
-                            decimal_fmt.format(r.get('base_C', 0))
-                        ])
-
-                    row.append(seq['sequence_id'])
-
-                    row.extend([
-                        decimal_fmt.format(seq.get('N_ARSC') or 0),
-                        decimal_fmt.format(seq.get('C_ARSC') or 0),
-                        decimal_fmt.format(seq.get('S_ARSC') or 0),
-                        decimal_fmt.format(seq.get('MW_ARSC') or 0),
-                        str(seq.get('length', 0))
-                    ])
-
-                    if args.aa_composition:
-                        comp = seq.get('aa_composition', {})
-                        row.extend([decimal_fmt.format(comp.get(aa, 0)) for aa in aa_keys])
-
-                    out_handle.write("\t".join(row) + "\n")
-
-            # 通常
+        if out_handle is not None and not args.no_header:
+            out_handle.write("\t".join(format_header(args, aa_keys)) + "\n")
+        if args.stats_by_genome:
+            genome_stats = open(args.stats_by_genome, "w")
+            genome_stats.write("\t".join(genome_stats_header()) + "\n")
+
+        # 1 スレッドまたは 1 タスクならプールを作らず、このプロセスで順に処理する
+        in_process = args.threads <= 1 or len(task_args) <= 1
+        with nullcontext() if in_process else make_pool(args.threads, set_ignored_warnings, (args.ignored_warnings == "all",)) as pool:
+            if pool is None:
+                pool_results = map(dispatch_task, task_args)
             else:
-                row = [r['genome']]
-                # -n
-                if args.nucleotide:
-                    row.extend([
-                        decimal_fmt.format(r.get('GC', 0)),
-                        decimal_fmt.format(r.get('base_A', 0)),
-                        decimal_fmt.format(r.get('base_T', 0)),
-                        decimal_fmt.format(r.get('base_G', 0)),
-                        decimal_fmt.format(r.get('base_C', 0))
-                    ])
-                row.extend([
-                    decimal_fmt.format(r.get('N_ARSC') or 0),
-                    decimal_fmt.format(r.get('C_ARSC') or 0),
-                    decimal_fmt.format(r.get('S_ARSC') or 0),
-                    decimal_fmt.format(r.get('MW_ARSC') or 0),
-                    str(r.get('total_aa_length', 0))
-                ])
-                if args.aa_composition:
-                    comp = r.get('aa_composition', {})
-                    row.extend([decimal_fmt.format(comp.get(aa, 0)) for aa in aa_keys])
-                out_handle.write("\t".join(row) + "\n")
+                imap = pool.imap if args.ordered else pool.imap_unordered
+                pool_results = imap(dispatch_task, task_args, chunksize=args.chunksize)
+            if profiler is not None:
+                pool_results = profiler.collect(pool_results)
+            if memo is not None:
+                pool_results = memo.collect(pool_results)
+            pool_results = merge_parts(pool_results, args.per_sequence, cache)
+            for r in diagnostics.collect(iter_results(slots, pool_results, args.ordered)):
+                with timed(profiler, 'write', r.get('genome')):
+                    r = filter_result(r, args)
+                    if r is None:
+                        continue
+                    n_results += 1
+
+                    if args.groups is not None:
+                        if stats is not None:
+                            groups = r['groups']
+                            stats.update(np.nan_to_num(compute_ARSC_matrix(groups['residue_counts'], groups['total_aa'])))
+                    elif args.windows is not None:
+                        if stats is not None:
+                            stats.update(np.nan_to_num(r['windows'].metrics))
+                    elif args.per_sequence and (stats is not None or genome_stats is not None):
+                        metrics = np.nan_to_num(r['sequences'].metrics)
+                        if stats is not None:
+                            stats.update(metrics)
+                        if genome_stats is not None and len(metrics):
+                            genome_stats.write(genome_stats_row(r['genome'], metrics, args.decimal_places))
+                    elif stats is not None:
+                        stats.update([r.get(key) or 0 for key in ('N_ARSC', 'C_ARSC', 'S_ARSC', 'MW_ARSC')])
+
+                    if writer is not None:
+                        writer.write(format_columns(r, args, aa_keys))
+                    else:
+                        out_handle.writelines(format_rows(r, args, decimal_fmt, aa_keys))
+                        if output_format == "tsv":
+                            out_handle.flush()
 
     finally:
-        if args.output:
+        if writer is not None:
+            writer.close()
+        elif args.output:
             out_handle.close()
+        if genome_stats is not None:
+            genome_stats.close()
+        if args.output:
             print(f"Output written to {args.output}", file=sys.stderr)
+        if args.stats_by_genome:
+            print(f"Per-genome statistics written to {args.stats_by_genome}", file=sys.stderr)
+
+    print(f"After filtering: {n_results} results.", file=sys.stderr)
+    if memo is not None:
+        print(memo.summary(), file=sys.stderr)
+    if args.ignored_warnings != "off" and diagnostics.summary():
+        print(diagnostics.summary(), file=sys.stderr)
+    if args.diagnostics:
+        diagnostics.write_json(args.diagnostics)
+        print(f"Diagnostics written to {args.diagnostics}", file=sys.stderr)
+
+    if cache is not None:
+        removed = cache.evict()
+        if removed:
+            print(f"Evicted {removed} old cache entries.", file=sys.stderr)
+
+    # 統計
+    if stats is not None and stats.count:
+        label = f"Per-{args.groups['by'].capitalize()}" if args.groups is not None else "Per-Window" if args.windows is not None else "Per-Sequence" if args.per_sequence else "Per-File"
+        print_summary(stats, label, args.decimal_places)
+
+    # プロファイル
+    if profiler is not None:
+        if args.profile:
+            profiler.write_jsonl(args.profile)
+            print(f"Profile written to {args.profile}", file=sys.stderr)
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+            print(f"Trace written to {args.trace}", file=sys.stderr)
+        profiler.summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to memoize per-sequence results by sequence content (--memo), so that proteins
+shared across genomes (pangenomes, redundant collections) are counted only once.
+"""
+
+
+import os
+import struct
+import hashlib
+from collections import OrderedDict
+
+# length, N/C/S/MW (NaN when empty), residue counts (RESIDUES order); ignored bytes follow
+_VALUE = struct.Struct("<q4d24q")
+# Bump when the stored value layout changes (used in the table name)
+MEMO_FORMAT = 1
+
+# One store per process and configuration; workers keep theirs across tasks
+_STORES = {}
+
+
+class _MemoStore:
+    """LRU of packed values and an optional SQLite file shared by workers and runs."""
+
+    def __init__(self, max_entries, path):
+        self.max_entries = max_entries
+        self.path = path
+        self.pid = os.getpid()
+        self.entries = OrderedDict()
+        self.pending = []
+        self.db = None
+        if path:
+            import sqlite3
+            self.db = sqlite3.connect(path, timeout=60)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS sequences_v{MEMO_FORMAT} (key BLOB PRIMARY KEY, value BLOB) WITHOUT ROWID")
+            self.db.commit()
+
+    def remember(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+
+def _store(max_entries, path):
+    store = _STORES.get((max_entries, path))
+    if store is None or store.pid != os.getpid():
+        # A store inherited through fork keeps the parent's SQLite connection: open a new one
+        store = _STORES[(max_entries, path)] = _MemoStore(max_entries, path)
+    return store
+
+
+class SequenceMemo:
+    """Per-sequence results keyed by a BLAKE2b digest of the normalized sequence bytes.
+
+    Values (length, metrics, residue counts, ignored characters) live in a bounded
+    in-process LRU of max_entries sequences and, with path, in a SQLite file that
+    several workers and later runs share. Only the settings are pickled: each
+    process reuses its own store across tasks. hits / misses count lookups made
+    through this handle; collect() sums the counts workers send back with results.
+    """
+
+    def __init__(self, max_entries=200000, path=None):
+        self.max_entries = max_entries
+        self.path = os.path.abspath(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.total_hits = 0
+        self.total_misses = 0
+        self._cache = None
+
+    def __getstate__(self):
+        return {"max_entries": self.max_entries, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["max_entries"], state["path"])
+
+    @property
+    def store(self):
+        if self._cache is None or self._cache.pid != os.getpid():
+            self._cache = _store(self.max_entries, self.path)
+        return self._cache
+
+    @staticmethod
+    def key(seq):
+        return hashlib.blake2b(seq, digest_size=16).digest()
+
+    def get(self, key):
+        """(length, metrics, residue_counts, ignored) of a known sequence, or None."""
+        store = self.store
+        value = store.entries.get(key)
+        if value is not None:
+            store.entries.move_to_end(key)
+        elif store.db is not None:
+            row = store.db.execute(f"SELECT value FROM sequences_v{MEMO_FORMAT} WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = row[0]
+                store.remember(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        fields = _VALUE.unpack_from(value)
+        return fields[0], fields[1:5], list(fields[5:]), value[_VALUE.size:]
+
+    def put(self, key, length, metrics, residue_counts, ignored=b""):
+        value = _VALUE.pack(length, *(float("nan") if v is None else v for v in metrics), *residue_counts) + ignored
+        store = self.store
+        store.remember(key, value)
+        if store.db is not None:
+            store.pending.append((key, value))
+            if len(store.pending) >= 10000:
+                self.flush()
+
+    def flush(self):
+        """Write new entries to the SQLite file (one transaction)."""
+        store = self.store
+        if store.db is None or not store.pending:
+            return
+        with store.db:
+            store.db.executemany(f"INSERT OR IGNORE INTO sequences_v{MEMO_FORMAT} (key, value) VALUES (?, ?)", store.pending)
+        store.pending = []
+
+    def counts(self):
+        return self.hits, self.misses
+
+    def collect(self, results):
+        """Pass results through, taking off the lookup counts of the worker ("memo")."""
+        for r in results:
+            hits, misses = r.pop("memo", (0, 0))
+            self.total_hits += hits
+            self.total_misses += misses
+            yield r
+
+    def summary(self):
+        lookups = self.total_hits + self.total_misses
+        rate = self.total_hits / lookups if lookups else 0.0
+        where = f"; store {self.path}" if self.path else ""
+        return f"Sequence memo: {self.total_hits} of {lookups} sequences reused ({rate:.1%} hit rate, {self.total_misses} computed{where})."
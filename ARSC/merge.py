@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to merge raw-count outputs (arsc --raw-counts) across shards or by a grouping key
+and recompute ARSC and composition exactly from the summed counts.
+
+Usage:
+    arsc merge shard_*.tsv.gz -o merged.tsv
+    arsc merge genomes.parquet --map genome2genus.tsv -a -o genus.tsv
+"""
+
+
+import sys
+import gzip
+import argparse
+from itertools import islice
+from contextlib import nullcontext
+from types import SimpleNamespace
+import numpy as np
+from ARSC.core import RESIDUES, aa_dictionary, compute_ARSC_matrix
+from ARSC.output import OUTPUT_FORMATS, COLUMNAR_FORMATS, ColumnarWriter, infer_output_format, resolve_output_format, open_text_output
+
+BASES = "ATGC"
+
+
+def open_text_input(path):
+    if path == "-":
+        return nullcontext(sys.stdin)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    if path.endswith(".zst"):
+        try:
+            from compression import zstd  # Python >= 3.14
+            return zstd.open(path, "rt")
+        except ImportError:
+            import zstandard
+            return zstandard.open(path, "rt")
+    return open(path)
+
+
+def iter_blocks(path, block_rows=65536, first_columns=("query",)):
+    """Yield an output file of arsc in blocks of rows: {column: sequence of values}.
+
+    TSV (plain, .gz, .zst, or "-" for stdin; header required), .npz, .parquet and .arrow/.feather are read.
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+        n = len(columns["query"])
+        for start in range(0, n, block_rows):
+            yield {name: column[start:start + block_rows] for name, column in columns.items()}
+    elif path.endswith((".parquet", ".arrow", ".feather")):
+        import pyarrow as pa
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            batches = pq.ParquetFile(path).iter_batches(batch_size=block_rows)
+        else:
+            reader = pa.ipc.open_file(path)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            yield {name: column.to_numpy(zero_copy_only=False) for name, column in zip(batch.schema.names, batch.columns)}
+    else:
+        with open_text_input(path) as fh:
+            header = fh.readline().rstrip("\n").split("\t")
+            if header[0] not in first_columns:
+                raise ValueError(f"{path}: a header line is required (do not use --no-header)")
+            while True:
+                lines = list(islice(fh, block_rows))
+                if not lines:
+                    break
+                yield dict(zip(header, zip(*(line.rstrip("\n").split("\t") for line in lines))))
+
+
+def read_group_map(path):
+    """query -> group from a two-column TSV ('#' lines skipped)."""
+    groups = {}
+    with open_text_input(path) as fh:
+        for line in fh:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2:
+                raise ValueError(f"{path}: expected 'query<TAB>group' lines, got {line.strip()!r}")
+            groups[fields[0]] = fields[1]
+    return groups
+
+
+class CountMerger:
+    """Streaming sum of the raw count columns (count_*, base_count_*) per group.
+
+    Groups are the query column, or query mapped through group_map (rows with an
+    unmapped query are counted in self.unmapped and skipped). Each block is added
+    with one vectorized np.add.at over its count matrix.
+    """
+
+    def __init__(self, group_map=None):
+        self.group_map = group_map
+        self.keys = {}
+        self.names = None
+        self.sums = None
+        self.rows = 0
+        self.unmapped = 0
+
+    def add(self, block):
+        if self.names is None:
+            self.names = [name for name in block if name.startswith(("count_", "base_count_"))]
+            missing = [f"count_{aa}" for aa in RESIDUES if f"count_{aa}" not in block] + \
+                      [name for name in ("count_other",) if name not in block]
+            if missing:
+                raise ValueError("input has no raw count columns (" + ", ".join(missing[:3]) + ", ...); "
+                                 "run arsc with --raw-counts")
+            self.sums = np.zeros((1024, len(self.names)), dtype=np.int64)
+        missing = [name for name in self.names if name not in block]
+        if missing:
+            raise ValueError(f"inputs have different columns: missing {', '.join(missing)}")
+
+        queries = block["query"]
+        values = np.column_stack([np.asarray(block[name], dtype=np.int64) for name in self.names])
+        self.rows += len(values)
+        if self.group_map is not None:
+            groups = [self.group_map.get(q) for q in queries]
+            keep = np.array([g is not None for g in groups], dtype=bool)
+            self.unmapped += int((~keep).sum())
+            groups = [g for g in groups if g is not None]
+            values = values[keep]
+        else:
+            groups = queries
+        keys = self.keys
+        index = np.fromiter((keys.setdefault(str(g), len(keys)) for g in groups), dtype=np.intp, count=len(values))
+        if len(keys) > len(self.sums):
+            grown = np.zeros((max(len(keys), 2 * len(self.sums)), len(self.names)), dtype=np.int64)
+            grown[:len(self.sums)] = self.sums
+            self.sums = grown
+        np.add.at(self.sums, index, values)
+
+    def columns(self, header):
+        """Output columns (header order) of the merged groups, recomputed from the summed counts."""
+        sums = self.sums[:len(self.keys)]
+        counts = {name: sums[:, i] for i, name in enumerate(self.names)}
+        residue_counts = np.column_stack([counts[f"count_{aa}"] for aa in RESIDUES])
+        total = residue_counts.sum(axis=1) + counts["count_other"]
+        metrics = np.nan_to_num(compute_ARSC_matrix(residue_counts, total))
+
+        columns = {"query": np.array(list(self.keys), dtype=np.str_),
+                   "N_ARSC": metrics[:, 0], "C_ARSC": metrics[:, 1], "S_ARSC": metrics[:, 2], "AvgResMW": metrics[:, 3],
+                   "TotalLength": np.asarray(total, dtype=np.int64)}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for j, aa in enumerate(RESIDUES):
+                columns[aa] = np.nan_to_num(residue_counts[:, j] / total)
+            if self.has_bases:
+                atgc = sum(counts[f"base_count_{base}"] for base in BASES)
+                columns["genomic_GC"] = np.nan_to_num((counts["base_count_G"] + counts["base_count_C"]) * 100 / atgc)
+                for base in BASES:
+                    columns[f"base_{base}"] = np.nan_to_num(counts[f"base_count_{base}"] * 100 / atgc)
+        columns.update(counts)
+        return [columns[name] for name in header]
+
+    @property
+    def has_bases(self):
+        return bool(self.names) and all(f"base_count_{base}" in self.names for base in BASES)
+
+
+def write_columns(columns, header, output, fmt, decimal_places, no_header=False, block_rows=65536):
+    """Write whole columns: TSV through one %-template per row in blocks of rows, binary formats in batches."""
+    if fmt in COLUMNAR_FORMATS:
+        writer = ColumnarWriter(output, fmt, header)
+        writer.write(dict(zip(header, columns)))
+        writer.close()
+        return
+    fields = ["%s" if c.dtype.kind == "U" else "%d" if c.dtype.kind in "iu" else f"%.{decimal_places}f" for c in columns]
+    template = "\t".join(fields) + "\n"
+    out = open_text_output(output, fmt)
+    try:
+        if not no_header:
+            out.write("\t".join(header) + "\n")
+        for start in range(0, len(columns[0]) if columns else 0, block_rows):
+            block = (c[start:start + block_rows].tolist() for c in columns)
+            out.writelines(template % values for values in zip(*block))
+    finally:
+        if output:
+            out.close()
+
+
+def merge_main(argv=None):
+    parser = argparse.ArgumentParser(prog="arsc merge", description="Sum raw counts (arsc --raw-counts) across files or by group and recompute ARSC exactly")
+    parser.add_argument("inputs", nargs="+", help="arsc outputs with raw counts (TSV[.gz|.zst], .npz, .parquet, .arrow)")
+    parser.add_argument("--map", help="Two-column TSV (query, group): sum rows by group instead of by query")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, help="Output format (default: from the -o suffix, otherwise tsv)")
+    parser.add_argument("-a", "--aa-composition", action="store_true", help="Include amino acid composition ratios")
+    parser.add_argument("--raw-counts", action="store_true", help="Keep the summed raw counts in the output (for further merges)")
+    parser.add_argument("-d", "--decimal-places", default=6, type=int, help="Decimal places")
+    parser.add_argument("--no-header", action="store_true", help="Suppress header line")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format or infer_output_format(args.output)
+    if output_format != "tsv" and not args.output:
+        parser.error(f"--output-format {output_format} requires -o/--output")
+    args.output, output_format = resolve_output_format(args.output, output_format)
+
+    merger = CountMerger(read_group_map(args.map) if args.map else None)
+    try:
+        for path in args.inputs:
+            for block in iter_blocks(path):
+                merger.add(block)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if merger.names is None:
+        print("Error: no rows to merge", file=sys.stderr)
+        sys.exit(1)
+
+    from ARSC.main import format_header
+    aa_keys = sorted(aa_dictionary.keys())
+    header = format_header(SimpleNamespace(nucleotide=merger.has_bases, per_sequence=False, aa_composition=args.aa_composition,
+                                           raw_counts=args.raw_counts, ignored_column=False, windows=None, groups=None), aa_keys)
+    write_columns(merger.columns(header), header, args.output, output_format, args.decimal_places, args.no_header)
+
+    print(f"Merged {merger.rows} rows from {len(args.inputs)} files into {len(merger.keys)} groups.", file=sys.stderr)
+    if merger.unmapped:
+        print(f"Warning: {merger.unmapped} rows had no group in {args.map} and were skipped.", file=sys.stderr)
+    if args.output:
+        print(f"Output written to {args.output}", file=sys.stderr)
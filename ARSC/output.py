@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to write ARSC results as TSV (plain, gzip or zstd) or as columnar binary files
+(Parquet, Arrow IPC, NumPy .npz).
+"""
+
+
+import os
+import sys
+import gzip
+import zipfile
+import tempfile
+import importlib.util
+from ARSC.core import LazyModule
+
+np = LazyModule("numpy", globals(), "np")
+
+OUTPUT_FORMATS = ("tsv", "tsv.gz", "tsv.zst", "parquet", "arrow", "npz")
+COLUMNAR_FORMATS = ("parquet", "arrow", "npz")
+# Output suffix -> format, used when --output-format is not given
+_SUFFIX_FORMATS = ((".gz", "tsv.gz"), (".zst", "tsv.zst"), (".parquet", "parquet"), (".arrow", "arrow"),
+                   (".feather", "arrow"), (".npz", "npz"))
+# --per-contig / --bins add a "contig" or "bin" column of names
+STRING_COLUMNS = ("query", "sequence_id", "region", "contig", "bin")
+INTEGER_COLUMNS = ("length", "TotalLength", "start", "end", "ignored")
+# --raw-counts columns
+INTEGER_PREFIXES = ("count_", "base_count_")
+
+
+def infer_output_format(path):
+    """Output format from the file suffix of path (tsv if none matches)."""
+    for suffix, fmt in _SUFFIX_FORMATS:
+        if path and path.endswith(suffix):
+            return fmt
+    return "tsv"
+
+
+def resolve_output_format(path, fmt):
+    """Fall back to .npz next to path when pyarrow is missing; returns (path, fmt)."""
+    if fmt in ("parquet", "arrow") and importlib.util.find_spec("pyarrow") is None:
+        npz_path = os.path.splitext(path)[0] + ".npz"
+        print(f"Warning: pyarrow is not installed; writing NumPy .npz to {npz_path} instead of {fmt}", file=sys.stderr)
+        return npz_path, "npz"
+    return path, fmt
+
+
+def open_text_output(path, fmt):
+    """Text handle for TSV output: stdout when path is None, gzip/zstd compressed by fmt."""
+    if path is None:
+        return sys.stdout
+    if fmt == "tsv.gz":
+        return gzip.open(path, "wt", compresslevel=6)
+    if fmt == "tsv.zst":
+        try:
+            from compression import zstd  # Python >= 3.14
+            return zstd.open(path, "wt")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd output requires Python >= 3.14 or the 'zstandard' package")
+        return zstandard.open(path, "wt")
+    return open(path, "w")
+
+
+def is_integer_column(name):
+    return name in INTEGER_COLUMNS or name.startswith(INTEGER_PREFIXES)
+
+
+def column_dtype(name):
+    if name in STRING_COLUMNS:
+        return np.str_
+    return np.int64 if is_integer_column(name) else np.float64
+
+
+class ColumnarWriter:
+    """Buffers result columns and writes them in batches of about batch_rows rows.
+
+    names: column names (the TSV header); each write() gets a dict of equally long
+    NumPy arrays keyed by them. parquet / arrow are written batch by batch through
+    pyarrow; npz batches go to temporary files (_NpzColumns) and are copied into
+    the archive on close(), so memory stays bounded by the batch size either way.
+    """
+
+    def __init__(self, path, fmt, names, batch_rows=65536):
+        self.path = path
+        self.fmt = fmt
+        self.names = list(names)
+        self.batch_rows = batch_rows
+        self._pending = []
+        self._pending_rows = 0
+        self._writer = self._npz = None
+        if fmt in ("parquet", "arrow"):
+            import pyarrow as pa
+            self._pa = pa
+            self._schema = pa.schema([(name, pa.string() if name in STRING_COLUMNS else
+                                       pa.int64() if is_integer_column(name) else pa.float64()) for name in self.names])
+            if fmt == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+            else:
+                self._writer = pa.ipc.new_file(path, self._schema)
+        elif fmt == "npz":
+            self._npz = _NpzColumns(path, self.names)
+        else:
+            raise ValueError(f"not a columnar output format: {fmt}")
+
+    def write(self, columns):
+        self._pending.append(columns)
+        self._pending_rows += len(columns[self.names[0]])
+        if self._pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        batch = {name: np.concatenate([c[name] for c in self._pending]) for name in self.names}
+        self._pending = []
+        self._pending_rows = 0
+        if self._npz is not None:
+            self._npz.write(batch)
+            return
+        pa = self._pa
+        arrays = [pa.array(batch[name], type=field.type) for name, field in zip(self.names, self._schema)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+        else:
+            self._npz.close()
+
+
+class _NpzColumns:
+    """npz output (np.savez layout: one stored .npy member per column) written without holding the run.
+
+    Each batch is appended to one temporary file per column, next to the output; close()
+    streams every column into its member, widening string batches to the longest one.
+    """
+
+    def __init__(self, path, names):
+        directory = os.path.dirname(os.path.abspath(path))
+        self.path = path
+        self.names = names
+        self._spill = {name: tempfile.TemporaryFile(dir=directory) for name in names}
+        self._dtypes = {name: [] for name in names}
+        self._rows = 0
+
+    def write(self, batch):
+        for name in self.names:
+            np.save(self._spill[name], batch[name], allow_pickle=False)
+            self._dtypes[name].append(batch[name].dtype)
+        self._rows += len(batch[self.names[0]])
+
+    def close(self):
+        try:
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name in self.names:
+                    dtypes = self._dtypes[name]
+                    dtype = np.result_type(*dtypes) if dtypes else np.dtype(column_dtype(name))
+                    header = np.lib.format.header_data_from_array_1_0(np.empty(0, dtype=dtype))
+                    header["shape"] = (self._rows,)
+                    spill = self._spill[name]
+                    spill.seek(0)
+                    with archive.open(name + ".npy", "w", force_zip64=True) as member:
+                        np.lib.format.write_array_header_1_0(member, header)
+                        for _ in dtypes:
+                            member.write(np.load(spill, allow_pickle=False).astype(dtype, copy=False).tobytes())
+        finally:
+            for spill in self._spill.values():
+                spill.close()
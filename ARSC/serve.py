@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to run quickARSC as a long-running local service: a warm worker pool that takes jobs
+over HTTP (TCP on localhost or a Unix socket), so that callers do not pay for Python startup, imports and pool
+creation on every genome.
+
+Usage:
+    arsc serve -t 8                                   # http://127.0.0.1:8750
+    arsc serve -t 8 --socket /tmp/arsc.sock
+
+    curl --data-binary @genome.faa 'http://127.0.0.1:8750/arsc?name=genome'
+    curl --data-binary @genome.faa.gz 'http://127.0.0.1:8750/arsc?name=genome&per_sequence=1&format=tsv'
+    curl -d '{"paths": ["genomes/"], "options": {"aa_composition": true}}' http://127.0.0.1:8750/arsc
+    curl http://127.0.0.1:8750/stats
+
+Endpoints:
+    POST /arsc    FASTA body (plain or gzip; ?name=) or JSON {"paths": [...], "fasta": [{"name", "data"}], "options": {...}}
+                  -> JSON {"header", "rows", "errors", "ignored"} or TSV (format=tsv, or Accept: text/tab-separated-values)
+    GET  /stats   counters: requests, files, residues, rejected and timed-out jobs, queue depth, latency percentiles, throughput
+    GET  /health
+Options (query parameters or "options"): per_sequence, aa_composition, raw_counts, ignored_column, nucleotide, no_auto_detection,
+min_length, max_length, filter_proteins, backend, decimal_places, no_header, format.
+
+Jobs go through a bounded queue (full: 503 with Retry-After) to a dispatcher thread that batches the files of
+jobs arriving within --batch-wait into one submission per worker, and keeps at most --max-inflight files in the
+pool. Each file is one dispatch_process call, as in 'arsc'. A request that gets no results within --job-timeout
+(e.g. a worker was killed) is answered with 503.
+"""
+
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import tempfile
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from ARSC import __version__
+from ARSC.core import BACKENDS, aa_dictionary
+from ARSC.utils import collect_faa_files, collect_fna_files, dispatch_task
+from ARSC.diagnostics import Diagnostics
+from ARSC.main import make_pool, filter_result, format_header, format_rows, format_columns
+
+DEFAULT_PORT = 8750
+# Options of a request and their types (flags: 1/true/yes/on or an empty value)
+FLAG_OPTIONS = ("per_sequence", "aa_composition", "raw_counts", "ignored_column", "nucleotide", "no_auto_detection", "filter_proteins", "no_header")
+INT_OPTIONS = ("min_length", "max_length", "decimal_places")
+FORMATS = ("json", "tsv")
+
+
+class RequestError(ValueError):
+    """Bad request (HTTP 400)."""
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ("", "1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise RequestError(f"expected a boolean, got {value!r}")
+
+
+def request_args(options):
+    """Namespace of one request as main() builds it (the fields used by filter_result / format_*)."""
+    unknown = [key for key in options if key not in FLAG_OPTIONS + INT_OPTIONS + ("backend", "format", "name")]
+    if unknown:
+        raise RequestError(f"unknown option {', '.join(unknown)}")
+    args = argparse.Namespace(windows=None, groups=None, decimal_places=6, backend="bytes", format="json")
+    for key in FLAG_OPTIONS:
+        setattr(args, key, _flag(options[key]) if key in options else False)
+    for key in INT_OPTIONS:
+        value = options.get(key)
+        try:
+            value = int(value) if value not in (None, "") else None
+        except (TypeError, ValueError):
+            raise RequestError(f"{key}: expected an integer, got {value!r}")
+        if key != "decimal_places" or value is not None:
+            setattr(args, key, value)
+    if "backend" in options:
+        if options["backend"] not in BACKENDS:
+            raise RequestError(f"backend: choose from {', '.join(BACKENDS)}")
+        args.backend = options["backend"]
+    if "format" in options:
+        if options["format"] not in FORMATS:
+            raise RequestError(f"format: choose from {', '.join(FORMATS)}")
+        args.format = options["format"]
+    # 長さフィルタ: main() と同じく -p と --filter-proteins ではワーカーがタンパク質ごとに適用する
+    args.length_range = None
+    if (args.per_sequence or args.filter_proteins) and (args.min_length is not None or args.max_length is not None):
+        args.length_range = (args.min_length, args.max_length)
+    return args
+
+
+def make_task(item, args):
+    """dispatch_task tuple of one file (no cache, profile, memo, windows or groups)."""
+    mode = 'fna' if args.nucleotide else 'auto-faa' if args.no_auto_detection else 'auto'
+    return (item, mode, args.per_sequence, args.backend, None, False, args.length_range, None, None, None)
+
+
+class Job:
+    """Files of one request; results are stored in task order and done is set when the last one arrives."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.results = [None] * len(tasks)
+        self.remaining = len(tasks)
+        self.created = time.perf_counter()
+        self.started = self.finished = None
+        self.done = threading.Event()
+        if not tasks:
+            self.started = self.finished = self.created
+            self.done.set()
+
+
+class Counters:
+    """Service counters; latencies of the last `window` jobs for percentiles."""
+
+    def __init__(self, window=4096):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.requests = self.jobs = self.files = self.errors = self.residues = self.rejected = self.bad_requests = self.timed_out = 0
+        self.latency = deque(maxlen=window)
+        self.queue_wait = deque(maxlen=window)
+
+    def job_done(self, job):
+        residues = 0
+        errors = 0
+        for r in job.results:
+            if 'error' in r:
+                errors += 1
+            elif 'sequences' in r:
+                residues += int(r['sequences'].lengths.sum())
+            else:
+                residues += r.get('total_aa_length', 0)
+        with self.lock:
+            self.jobs += 1
+            self.files += len(job.results)
+            self.errors += errors
+            self.residues += residues
+            self.latency.append(job.finished - job.created)
+            self.queue_wait.append(job.started - job.created)
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self.lock:
+            uptime = time.time() - self.start
+            latency = np.array(self.latency) * 1000
+            queue_wait = np.array(self.queue_wait) * 1000
+            snapshot = {"uptime_s": round(uptime, 3), "requests": self.requests, "jobs": self.jobs, "files": self.files,
+                        "errors": self.errors, "residues": self.residues, "rejected": self.rejected, "bad_requests": self.bad_requests,
+                        "timed_out": self.timed_out,
+                        "files_per_s": self.files / uptime if uptime else 0.0, "residues_per_s": self.residues / uptime if uptime else 0.0}
+        for name, values in (("latency_ms", latency), ("queue_wait_ms", queue_wait)):
+            if len(values):
+                p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+                snapshot[name] = {"mean": float(values.mean()), "p50": p50, "p90": p90, "p99": p99, "max": float(values.max())}
+            else:
+                snapshot[name] = None
+        return snapshot
+
+
+class WorkerService:
+    """Warm worker pool behind a bounded job queue.
+
+    A dispatcher thread takes jobs from the queue, gathers the files of jobs arriving within
+    batch_wait seconds (up to max_batch files) and submits them as at most `threads` chunks,
+    one pool message each. A semaphore keeps at most max_inflight files in the pool, so a
+    saturated pool stops the dispatcher, the queue fills and new jobs are rejected.
+    Requests wait at most job_timeout seconds for their job (a killed worker never answers).
+    """
+
+    def __init__(self, threads=1, max_queue=64, max_batch=None, batch_wait=0.005, max_inflight=None, job_timeout=600.0):
+        self.threads = max(1, threads)
+        self.job_timeout = job_timeout
+        self.max_batch = max_batch or 8 * self.threads
+        self.batch_wait = batch_wait
+        self.max_inflight = max_inflight or 4 * self.threads
+        self.queue = queue.Queue(max_queue)
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.counters = Counters()
+        self.pool = make_pool(self.threads)
+        self.dispatcher = threading.Thread(target=self._dispatch, name="arsc-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, job):
+        """Queue a job; raises queue.Full when the queue is at its limit."""
+        if job.done.is_set():
+            return
+        self.queue.put_nowait(job)
+
+    def _dispatch(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            batch = [job]
+            n = len(job.tasks)
+            deadline = time.perf_counter() + self.batch_wait
+            stop = False
+            while n < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    job = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+                n += len(job.tasks)
+            self._submit_batch(batch)
+            if stop:
+                return
+
+    def _submit_batch(self, batch):
+        units = [(job, i) for job in batch for i in range(len(job.tasks))]
+        size = min(max(1, -(-len(units) // self.threads)), self.max_inflight)
+        now = time.perf_counter()
+        for job in batch:
+            job.started = now
+        for start in range(0, len(units), size):
+            chunk = units[start:start + size]
+            for _ in chunk:
+                self.slots.acquire()
+            with self.lock:
+                self.inflight += len(chunk)
+            try:
+                self.pool.map_async(dispatch_task, [job.tasks[i] for job, i in chunk], chunksize=len(chunk),
+                                    callback=lambda results, chunk=chunk: self._finish(chunk, results),
+                                    error_callback=lambda e, chunk=chunk: self._fail(chunk, e))
+            except Exception as e:
+                # プールが使えない (閉じている) ときもジョブを終わらせる
+                self._fail(chunk, e)
+
+    def _fail(self, chunk, error):
+        self._finish(chunk, [{"genome": job.tasks[i][0]["name"], "error": str(error)} for job, i in chunk])
+
+    def _finish(self, chunk, results):
+        now = time.perf_counter()
+        finished = []
+        with self.lock:
+            self.inflight -= len(chunk)
+            for (job, i), r in zip(chunk, results):
+                job.results[i] = r
+                job.remaining -= 1
+                if job.remaining == 0:
+                    job.finished = now
+                    finished.append(job)
+        for _ in chunk:
+            self.slots.release()
+        for job in finished:
+            self.counters.job_done(job)
+            job.done.set()
+
+    def stats(self):
+        snapshot = self.counters.snapshot()
+        with self.lock:
+            inflight = self.inflight
+        snapshot.update(queue_depth=self.queue.qsize(), queue_limit=self.queue.maxsize, inflight=inflight,
+                        max_inflight=self.max_inflight, threads=self.threads)
+        return snapshot
+
+    def close(self):
+        self.queue.put(None)
+        self.dispatcher.join()
+        self.pool.close()
+        self.pool.join()
+
+
+def format_response(job, args):
+    """(content type, body) of a finished job: TSV lines as 'arsc' writes them, or JSON rows, errors and ignored characters."""
+    aa_keys = sorted(aa_dictionary.keys())
+    header = format_header(args, aa_keys)
+    diagnostics = Diagnostics("off")
+    errors = [{"query": r.get("genome"), "error": r["error"]} for r in job.results if 'error' in r]
+    results = [r for r in (filter_result(r, args) for r in diagnostics.collect(job.results) if 'error' not in r) if r is not None]
+    if args.format == "tsv":
+        decimal_fmt = f"{{:.{args.decimal_places}f}}"
+        lines = [] if args.no_header else ["\t".join(header) + "\n"]
+        for r in results:
+            lines.extend(format_rows(r, args, decimal_fmt, aa_keys))
+        return "text/tab-separated-values; charset=utf-8", "".join(lines).encode()
+    rows = []
+    for r in results:
+        columns = format_columns(r, args, aa_keys)
+        names = list(columns)
+        rows.extend(dict(zip(names, values)) for values in zip(*(np.asarray(c).tolist() for c in columns.values())))
+    return "application/json", json.dumps({"header": header, "rows": rows, "errors": errors, "ignored": diagnostics.genomes}).encode()
+
+
+class ARSCRequestHandler(BaseHTTPRequestHandler):
+    server_version = f"quickARSC/{__version__}"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, content_type, body, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, obj, headers=()):
+        self.send_body(status, "application/json", json.dumps(obj).encode(), headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self.send_json(200, {"status": "ok", "version": __version__})
+        elif path == "/stats":
+            self.send_json(200, self.server.service.stats())
+        else:
+            self.send_json(404, {"error": f"no such endpoint: {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if url.path != "/arsc":
+            self.rfile.read(length)
+            self.send_json(404, {"error": f"no such endpoint: {url.path}"})
+            return
+        service = self.server.service
+        service.counters.count("requests")
+        if length > self.server.max_body:
+            self.close_connection = True
+            self.send_json(413, {"error": f"request body larger than {self.server.max_body} bytes"})
+            return
+        body = self.rfile.read(length)
+
+        items, spooled = [], []
+        try:
+            options = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+            if self.headers.get_content_type() == "application/json":
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError as e:
+                    raise RequestError(f"invalid JSON: {e}")
+                if not isinstance(request, dict):
+                    raise RequestError("expected a JSON object")
+                for key, kind, name in (("options", dict, "a JSON object"), ("paths", list, "a list"), ("fasta", list, "a list")):
+                    if not isinstance(request.get(key, kind()), kind):
+                        raise RequestError(f"{key}: expected {name}")
+                options.update(request.get("options") or {})
+                args = request_args(options)
+                items = self.collect_paths(request.get("paths") or [], args)
+                for k, entry in enumerate(request.get("fasta") or [], 1):
+                    if not isinstance(entry, dict) or not isinstance(entry.get("data"), str):
+                        raise RequestError("fasta: expected a list of {\"name\", \"data\"} objects")
+                    spooled.append(self.spool(entry["data"].encode(), entry.get("name") or f"fasta_{k}"))
+            else:
+                args = request_args(options)
+                spooled.append(self.spool(body, options.get("name") or "query"))
+            if "format" not in options and "text/tab-separated-values" in self.headers.get("Accept", ""):
+                args.format = "tsv"
+            items += [{"handle": path, "name": name} for path, name in spooled]
+        except (RequestError, KeyError, TypeError, AttributeError) as e:
+            self.remove(spooled)
+            service.counters.count("bad_requests")
+            self.send_json(400, {"error": str(e) if isinstance(e, RequestError) else f"malformed request: {e!r}"})
+            return
+
+        job = Job([make_task(item, args) for item in items])
+        try:
+            service.submit(job)
+        except queue.Full:
+            self.remove(spooled)
+            service.counters.count("rejected")
+            self.send_json(503, {"error": "queue full, retry later"}, [("Retry-After", "1")])
+            return
+        if not job.done.wait(service.job_timeout):
+            self.remove(spooled)
+            service.counters.count("timed_out")
+            self.send_json(503, {"error": f"no result from the workers within {service.job_timeout:g} s"})
+            return
+        self.remove(spooled)
+        content_type, response = format_response(job, args)
+        timings = [("X-ARSC-Queue-Time", f"{(job.started - job.created) * 1000:.3f}"),
+                   ("X-ARSC-Compute-Time", f"{(job.finished - job.started) * 1000:.3f}")]
+        self.send_body(200, content_type, response, timings)
+
+    def collect_paths(self, paths, args):
+        items = []
+        for path in paths:
+            if not isinstance(path, str):
+                raise RequestError(f"paths: expected strings, got {path!r}")
+            try:
+                items.extend(collect_fna_files(path) if args.nucleotide else collect_faa_files(path))
+            except ValueError as e:
+                raise RequestError(str(e))
+        return items
+
+    def spool(self, data, name):
+        """Write a posted FASTA to the spool directory: (path, genome name)."""
+        suffix = ".fa.gz" if data[:2] == b"\x1f\x8b" else ".fa"
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.server.spool_dir)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        return path, name
+
+    @staticmethod
+    def remove(spooled):
+        for path, _ in spooled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    # many clients may connect at once; jobs beyond the queue are rejected with 503, not by the kernel
+    request_queue_size = 128
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve_main(argv=None):
+    parser = argparse.ArgumentParser(prog="arsc serve", description="Serve ARSC computations from a warm worker pool over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", default=DEFAULT_PORT, type=int, help="TCP port")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("-t", "--threads", default=1, type=int, help="Number of worker processes")
+    parser.add_argument("--max-queue", default=64, type=int, help="Jobs waiting for the pool before new ones are rejected with 503")
+    parser.add_argument("--max-inflight", type=int, help="Files in the pool at once (default: 4 x threads)")
+    parser.add_argument("--max-batch", type=int, help="Files gathered into one submission (default: 8 x threads)")
+    parser.add_argument("--batch-wait", default=5.0, type=float, help="Milliseconds to wait for more jobs to batch")
+    parser.add_argument("--job-timeout", default=600.0, type=float, help="Seconds a request waits for its results before 503")
+    parser.add_argument("--max-body", default=1024, type=int, help="Largest accepted request body in MB")
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+    args = parser.parse_args(argv)
+    if args.threads < 1 or args.max_queue < 1 or (args.max_inflight is not None and args.max_inflight < 1):
+        parser.error("--threads, --max-queue and --max-inflight must be positive")
+    if args.job_timeout <= 0:
+        parser.error("--job-timeout must be positive")
+
+    service = WorkerService(args.threads, args.max_queue, args.max_batch, args.batch_wait / 1000, args.max_inflight, args.job_timeout)
+    try:
+        if args.socket:
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+            server = UnixHTTPServer(args.socket, ARSCRequestHandler)
+            address = args.socket
+        else:
+            server = TCPHTTPServer((args.host, args.port), ARSCRequestHandler)
+            address = f"http://{args.host}:{server.server_address[1]}"
+    except OSError as e:
+        service.close()
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix="arsc-serve-") as spool_dir:
+        server.service = service
+        server.spool_dir = spool_dir
+        server.max_body = args.max_body * 1024 * 1024
+        server.quiet = args.quiet
+        print(f"quickARSC Version: {__version__}", file=sys.stderr)
+        print(f"Serving on {address} with {service.threads} workers (queue {args.max_queue}, in flight {service.max_inflight}).", file=sys.stderr)
+        # SIGTERM (service managers) stops the server like Ctrl-C
+        signal.signal(signal.SIGTERM, _interrupt)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.close()
+            if args.socket:
+                try:
+                    os.remove(args.socket)
+                except OSError:
+                    pass
+    print("Server stopped.", file=sys.stderr)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to compute summary statistics of ARSC results in constant memory (--stats).
+"""
+
+
+import sys
+import math
+import numpy as np
+
+METRIC_NAMES = ("N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW")
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (log-spaced buckets, as in DDSketch).
+
+    A value x > 0 goes to bucket ceil(log_gamma(x)) with gamma = (1 + a) / (1 - a), so any
+    quantile is returned within a relative error a of a value of the data. Memory grows
+    with the number of occupied buckets (the dynamic range of the data), not with the
+    number of values; two sketches merge by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.001):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def _add_store(self, store, values):
+        if not len(values):
+            return
+        index, counts = np.unique(np.ceil(np.log(values) / self._log_gamma).astype(np.int64), return_counts=True)
+        for i, n in zip(index.tolist(), counts.tolist()):
+            store[i] = store.get(i, 0) + n
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self._add_store(self.positive, values[values > 0])
+        self._add_store(self.negative, -values[values < 0])
+        self.zero += int(np.count_nonzero(values == 0))
+        self.count += len(values)
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for i, n in other_store.items():
+                store[i] = store.get(i, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1); NaN when empty."""
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = 0
+        for i in sorted(self.negative, reverse=True):
+            seen += self.negative[i]
+            if seen > rank:
+                return -self._value(i)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for i in sorted(self.positive):
+            seen += self.positive[i]
+            if seen > rank:
+                return self._value(i)
+        return self._value(max(self.positive))
+
+
+class RunningStats:
+    """Streaming count / mean / variance (Welford, merged batch-wise), min / max and quantile
+    sketches of k columns. Memory does not depend on the number of values added.
+    """
+
+    def __init__(self, names=METRIC_NAMES, relative_accuracy=0.001):
+        self.names = tuple(names)
+        k = len(self.names)
+        self.count = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.sketches = [QuantileSketch(relative_accuracy) for _ in range(k)]
+
+    def _combine(self, n, mean, m2, low, high):
+        # Chan et al. parallel update of (count, mean, M2)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+        self.min = np.minimum(self.min, low)
+        self.max = np.maximum(self.max, high)
+
+    def update(self, values):
+        """Add rows of values (n x k array, or one row of k values)."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.names))
+        if not len(values):
+            return
+        mean = values.mean(axis=0)
+        self._combine(len(values), mean, ((values - mean) ** 2).sum(axis=0), values.min(axis=0), values.max(axis=0))
+        for sketch, column in zip(self.sketches, values.T):
+            sketch.add(column)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+            for sketch, other_sketch in zip(self.sketches, other.sketches):
+                sketch.merge(other_sketch)
+
+    def stdev(self):
+        """Sample standard deviation (0 for fewer than two values), like statistics.stdev."""
+        if self.count < 2:
+            return np.zeros(len(self.names))
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def quantiles(self, q):
+        """Approximate q-quantile of every column, clipped to the exact min / max."""
+        return np.clip([sketch.quantile(q) for sketch in self.sketches], self.min, self.max)
+
+
+def print_summary(stats, label, decimal_places, file=sys.stderr):
+    """Print the --stats table: mean, stdev, min, quartiles and max per metric."""
+    width = 13 + 7 * 15
+    d = decimal_places
+    q1, median, q3 = stats.quantiles(0.25), stats.quantiles(0.5), stats.quantiles(0.75)
+    print("\n" + "="*width, file=file)
+    print(f"SUMMARY STATISTICS ({label})".center(width), file=file)
+    print("="*width, file=file)
+    print(f"{'Metric':<12} " + " ".join(f"{h:<14}" for h in ('Mean', 'Stdev', 'Min', 'Q1', 'Median', 'Q3', 'Max')), file=file)
+    print("-"*width, file=file)
+    sd = stats.stdev()
+    for j, name in enumerate(stats.names):
+        values = (stats.mean[j], sd[j], stats.min[j], q1[j], median[j], q3[j], stats.max[j])
+        print(f"{name:<12} " + " ".join(f"{v:<14.{d}f}" for v in values), file=file)
+    print("-"*width, file=file)
+    print(f"{'Count':<12} {stats.count:<14}", file=file)
+    print(f"Quantiles are approximate (relative error <= {stats.sketches[0].relative_accuracy:.1%}).", file=file)
+    print("="*width + "\n", file=file)
+
+
+def genome_stats_header(names=METRIC_NAMES):
+    return ["query", "count"] + [f"{name}_{s}" for name in names for s in ("mean", "stdev", "min", "q1", "median", "q3", "max")]
+
+
+def genome_stats_row(genome, metrics, decimal_places):
+    """One line of --stats-by-genome: exact statistics of one genome's per-sequence metrics (n x k)."""
+    n = len(metrics)
+    fmt = f"{{:.{decimal_places}f}}"
+    fields = [genome, str(n)]
+    q1, median, q3 = np.percentile(metrics, (25, 50, 75), axis=0)
+    sd = metrics.std(axis=0, ddof=1) if n > 1 else np.zeros(metrics.shape[1])
+    for j in range(metrics.shape[1]):
+        values = (metrics[:, j].mean(), sd[j], metrics[:, j].min(), q1[j], median[j], q3[j], metrics[:, j].max())
+        fields.extend(fmt.format(v) for v in values)
+    return "\t".join(fields) + "\n"
+
+
+# Sketch keys of GroupedStats: (group * k + column) << _KEY_BITS | signed bucket + _KEY_OFFSET
+_KEY_BITS = 23
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_BUCKET_SHIFT = 1 << 20  # separates positive (> 0) and negative (< 0) buckets around zero (0)
+
+
+class GroupedStats:
+    """Streaming per-group statistics of k columns, updated one block of rows at a time.
+
+    For every group: count, mean and sample stdev, min / max, weighted mean and
+    (population) stdev, and plain and weighted quantiles from log-spaced buckets as
+    in QuantileSketch. All updates are vectorized over the block (bincount, reduceat,
+    unique); memory is proportional to the number of groups and occupied buckets,
+    not to the number of rows added.
+    """
+
+    def __init__(self, names=METRIC_NAMES, relative_accuracy=0.001, max_pending=1 << 20):
+        self.names = tuple(names)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_pending = max_pending
+        k = len(self.names)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.weight = np.zeros(0)
+        self.mean = np.zeros((0, k))
+        self.m2 = np.zeros((0, k))
+        self.weighted_mean = np.zeros((0, k))
+        self.weighted_m2 = np.zeros((0, k))
+        self.min = np.zeros((0, k))
+        self.max = np.zeros((0, k))
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._key_counts = np.zeros(0, dtype=np.int64)
+        self._key_weights = np.zeros(0)
+        self._pending = []
+        self._pending_size = 0
+
+    @property
+    def groups(self):
+        return len(self.count)
+
+    def _grow(self, n):
+        if n <= self.groups:
+            return
+        extra = n - self.groups
+        k = len(self.names)
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.weight = np.concatenate([self.weight, np.zeros(extra)])
+        for name in ("mean", "m2", "weighted_mean", "weighted_m2"):
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros((extra, k))]))
+        self.min = np.concatenate([self.min, np.full((extra, k), np.inf)])
+        self.max = np.concatenate([self.max, np.full((extra, k), -np.inf)])
+
+    @staticmethod
+    def _moments(groups, values, weights, size):
+        # Per-group total weight, weighted mean and weighted sum of squared deviations of a block
+        total = np.bincount(groups, weights, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.column_stack([np.bincount(groups, weights * v, minlength=size) for v in values.T]) / total[:, None]
+        mean = np.nan_to_num(mean)
+        m2 = np.column_stack([np.bincount(groups, weights * (v - mean[groups, j]) ** 2, minlength=size) for j, v in enumerate(values.T)])
+        return total, mean, m2
+
+    @staticmethod
+    def _combine(total, mean, m2, n, block_mean, block_m2):
+        # Chan et al. parallel update, elementwise over groups; returns the new (total, mean, m2)
+        new_total = total + n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.where(new_total > 0, n / new_total, 0.0)[:, None]
+        delta = block_mean - mean
+        return new_total, mean + delta * share, m2 + block_m2 + delta ** 2 * (total[:, None] * share)
+
+    def update(self, groups, values, weights=None):
+        """Add rows of values (n x k) belonging to groups (n group indices >= 0) with optional weights (n)."""
+        groups = np.asarray(groups, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64).reshape(len(groups), len(self.names))
+        weights = np.ones(len(groups)) if weights is None else np.asarray(weights, dtype=np.float64)
+        if not len(groups):
+            return
+        self._grow(int(groups.max()) + 1)
+        size = self.groups
+
+        n, mean, m2 = self._moments(groups, values, np.ones(len(groups)), size)
+        count, self.mean, self.m2 = self._combine(self.count.astype(np.float64), self.mean, self.m2, n, mean, m2)
+        self.count = np.rint(count).astype(np.int64)
+        w, mean, m2 = self._moments(groups, values, weights, size)
+        self.weight, self.weighted_mean, self.weighted_m2 = self._combine(self.weight, self.weighted_mean, self.weighted_m2, w, mean, m2)
+
+        order = np.argsort(groups, kind="stable")
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        present = sorted_groups[starts]
+        self.min[present] = np.minimum(self.min[present], np.minimum.reduceat(values[order], starts))
+        self.max[present] = np.maximum(self.max[present], np.maximum.reduceat(values[order], starts))
+
+        k = len(self.names)
+        keys = ((groups[:, None] * k + np.arange(k)) << _KEY_BITS) + (self._bucket(values) + _KEY_OFFSET)
+        self._pending.append((keys.ravel(), np.repeat(weights, k)))
+        self._pending_size += keys.size
+        if self._pending_size >= self.max_pending:
+            self._consolidate()
+
+    def _bucket(self, values):
+        # Signed bucket index, ordered like the values: negative < 0 (zero) < positive
+        with np.errstate(divide="ignore", invalid="ignore"):
+            index = np.ceil(np.log(np.abs(values)) / self._log_gamma)
+        index = np.where(values == 0, 0, index + _BUCKET_SHIFT)
+        return (np.sign(values) * index).astype(np.int64)
+
+    def _value(self, bucket):
+        magnitude = 2 * self.gamma ** (np.abs(bucket) - _BUCKET_SHIFT) / (self.gamma + 1)
+        return np.where(bucket == 0, 0.0, np.sign(bucket) * magnitude)
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + [keys for keys, _ in self._pending])
+        weights = np.concatenate([self._key_weights] + [weights for _, weights in self._pending])
+        counts = np.concatenate([self._key_counts] + [np.ones(len(k), dtype=np.int64) for k, _ in self._pending])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._key_counts = np.bincount(inverse, counts, minlength=len(self._keys)).astype(np.int64)
+        self._key_weights = np.bincount(inverse, weights, minlength=len(self._keys))
+        self._pending = []
+        self._pending_size = 0
+
+    def stdev(self):
+        """Sample standard deviation per group (0 for fewer than two values)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count[:, None] > 1, np.sqrt(self.m2 / (self.count[:, None] - 1)), 0.0)
+
+    def weighted_stdev(self):
+        """Weighted population standard deviation per group."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.nan_to_num(np.sqrt(self.weighted_m2 / self.weight[:, None]))
+
+    def quantiles(self, q, weighted=False):
+        """Approximate q-quantile per group and column (groups x k), clipped to the exact min / max.
+
+        Unweighted quantiles use the nearest lower rank like QuantileSketch; weighted ones
+        are the first bucket at which the cumulative weight reaches q of the group's total.
+        """
+        self._consolidate()
+        k = len(self.names)
+        result = np.full(self.groups * k, np.nan)
+        if len(self._keys):
+            segments = self._keys >> _KEY_BITS
+            starts = np.flatnonzero(np.r_[True, segments[1:] != segments[:-1]])
+            ends = np.r_[starts[1:], len(segments)]
+            cumulative = np.cumsum(self._key_weights if weighted else self._key_counts)
+            before = np.r_[0, cumulative][starts]
+            within = cumulative[ends - 1] - before
+            if weighted:
+                index = np.searchsorted(cumulative, before + q * within, side="left")
+            else:
+                index = np.searchsorted(cumulative, before + q * (within - 1), side="right")
+            index = np.clip(index, starts, ends - 1)
+            result[segments[starts]] = self._value((self._keys[index] & ((1 << _KEY_BITS) - 1)) - _KEY_OFFSET)
+        return np.clip(result.reshape(self.groups, k), self.min, self.max)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to record per-file, per-stage timings of ARSC runs (--profile / --trace).
+
+Workers fill a FileTrace per task and send it back inside the result dict ("profile");
+the parent Profiler takes it off again, adds its own stages and writes JSON lines,
+a Chrome trace (chrome://tracing, Perfetto) and a summary. With profiling off the
+trace is None and the helpers below return the reader unchanged / a no-op context.
+
+Stages:
+    read      time spent inside read() of the input (I/O and decompression)
+    count     FASTA parsing and residue counting (waits on read/prodigal excluded)
+    prodigal  time spent waiting for Prodigal output
+    cache     writing the result to the cache (worker) / cache lookups (parent)
+    ipc       from the end of a task until the parent takes its result (pickling, queueing)
+    write     filtering, formatting and writing rows (parent)
+"""
+
+
+import io
+import os
+import sys
+import json
+import time
+import pickle
+from contextlib import contextmanager, nullcontext
+
+STAGES = ("read", "count", "prodigal", "cache", "ipc", "write")
+
+
+class TimedReader(io.BufferedIOBase):
+    """Binary reader that adds the time spent in read() and the bytes returned to a stage."""
+
+    def __init__(self, fh, totals):
+        self._fh = fh
+        self._totals = totals  # [wall_s, cpu_s, bytes]
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        data = self._fh.read(size)
+        totals = self._totals
+        totals[0] += time.perf_counter() - wall
+        totals[1] += time.thread_time() - cpu
+        totals[2] += len(data)
+        return data
+
+    read1 = read
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _StageTimes:
+    """Stage totals ({stage: [wall_s, cpu_s, bytes]}) and timed spans of one process."""
+
+    def __init__(self):
+        self.stages = {}
+        self.spans = []  # (stage, label, start epoch s, duration s)
+
+    def totals(self, stage):
+        return self.stages.setdefault(stage, [0.0, 0.0, 0])
+
+    @contextmanager
+    def timed(self, stage, label=None, excluding=None):
+        """Time a block as one span of stage; time spent meanwhile in `excluding` is subtracted."""
+        before = list(self.totals(excluding)) if excluding else None
+        start = time.time()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            self.spans.append((stage, label, start, wall))
+            if before is not None:
+                after = self.totals(excluding)
+                wall -= after[0] - before[0]
+                cpu -= after[1] - before[1]
+            totals = self.totals(stage)
+            totals[0] += max(wall, 0.0)
+            totals[1] += max(cpu, 0.0)
+
+
+class FileTrace(_StageTimes):
+    """Timings of one task, collected in the worker."""
+
+    def __init__(self, item, mode):
+        super().__init__()
+        self.item = item
+        self.mode = mode
+        self.start = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def record(self, result):
+        """JSON-serialisable record of the finished task (sent back with its result)."""
+        end = time.time()
+        record = {
+            "type": "file",
+            "file": self.item.get("handle"),
+            "genome": self.item.get("name"),
+            "mode": self.mode,
+            "part": self.item.get("part"),
+            "pid": os.getpid(),
+            "start": self.start,
+            "end": end,
+            "wall_s": time.perf_counter() - self._wall,
+            "cpu_s": time.process_time() - self._cpu,  # all threads of the worker
+            "bytes_read": self.totals("read")[2],
+            "residues": result_residues(result),
+            "result_bytes": len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)),
+            "error": result.get("error"),
+            "stages": {name: {"wall_s": w, "cpu_s": c, "bytes": b} for name, (w, c, b) in self.stages.items()},
+            "spans": [[stage, start, duration] for stage, _, start, duration in self.spans],
+        }
+        return record
+
+
+def result_residues(result):
+    """Residues counted for a worker result (whole-file, per-sequence or partial)."""
+    if "sequences" in result:
+        return int(result["sequences"].lengths.sum())
+    return int(result.get("total_aa_length") or 0)
+
+
+def timed_reader(trace, fh, stage="read"):
+    """Wrap fh so that its reads are added to stage; fh itself when not profiling."""
+    return fh if trace is None else TimedReader(fh, trace.totals(stage))
+
+
+def timed(tracker, stage, label=None, excluding=None):
+    """Time a block on a FileTrace / Profiler; a no-op context when tracker is None."""
+    return nullcontext() if tracker is None else tracker.timed(stage, label, excluding)
+
+
+class Profiler(_StageTimes):
+    """Parent side: gathers the worker records and writes them out."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.start = time.time()
+        self._wall = time.perf_counter()
+
+    def collect(self, results):
+        """Pass pool results through, taking off their trace records."""
+        for r in results:
+            record = r.pop("profile", None)
+            if record is not None:
+                record["stages"]["ipc"] = {"wall_s": max(time.time() - record["end"], 0.0), "cpu_s": 0.0,
+                                           "bytes": record["result_bytes"]}
+                self.records.append(record)
+            yield r
+
+    def write_jsonl(self, path):
+        """One JSON object per task, then one for the parent process."""
+        with open(path, "w") as fh:
+            for record in self.records:
+                fh.write(json.dumps(record) + "\n")
+            fh.write(json.dumps({
+                "type": "parent", "pid": os.getpid(), "start": self.start,
+                "wall_s": time.perf_counter() - self._wall,
+                "stages": {name: {"wall_s": w, "cpu_s": c, "bytes": b} for name, (w, c, b) in self.stages.items()},
+            }) + "\n")
+
+    def write_chrome_trace(self, path):
+        """Chrome trace event file: one row per worker process, spans for tasks and timed stages."""
+        def us(t):
+            return round((t - self.start) * 1e6, 1)
+
+        events = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "quickARSC (parent)"}}]
+        for pid in sorted({r["pid"] for r in self.records}):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"worker {pid}"}})
+        for r in self.records:
+            args = {k: r[k] for k in ("file", "mode", "part", "bytes_read", "residues", "result_bytes", "error")}
+            args.update({f"{name}_s": round(s["wall_s"], 6) for name, s in r["stages"].items()})
+            events.append({"name": r["genome"], "cat": "task", "ph": "X", "ts": us(r["start"]),
+                           "dur": round(r["wall_s"] * 1e6, 1), "pid": r["pid"], "tid": 0, "args": args})
+            for stage, start, duration in r["spans"]:
+                events.append({"name": stage, "cat": "stage", "ph": "X", "ts": us(start),
+                               "dur": round(duration * 1e6, 1), "pid": r["pid"], "tid": 0})
+        for stage, label, start, duration in self.spans:
+            events.append({"name": stage, "cat": "parent", "ph": "X", "ts": us(start), "dur": round(duration * 1e6, 1),
+                           "pid": os.getpid(), "tid": 0, "args": {"genome": label}})
+        with open(path, "w") as fh:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
+
+    def summary(self, top=10, file=sys.stderr):
+        """Print where the time went per stage and the slowest files."""
+        wall = time.perf_counter() - self._wall
+        totals = {}
+        for r in self.records:
+            for name, s in r["stages"].items():
+                t = totals.setdefault(name, [0.0, 0.0, 0])
+                t[0] += s["wall_s"]
+                t[1] += s["cpu_s"]
+                t[2] += s["bytes"]
+        stage_rows = [(name, totals[name], "workers") for name in STAGES if name in totals]
+        stage_rows += [(name, self.stages[name], "parent") for name in STAGES if name in self.stages]
+        stage_wall = sum(t[0] for _, t, _ in stage_rows) or 1.0
+
+        print("\n" + "="*70, file=file)
+        print(f"PROFILE SUMMARY ({len(self.records)} tasks)".center(70), file=file)
+        print("="*70, file=file)
+        print(f"{'Stage':<10} {'Where':<8} {'Wall (s)':>10} {'CPU (s)':>10} {'Share':>7} {'MB':>10}", file=file)
+        print("-"*70, file=file)
+        for name, (w, c, b), where in stage_rows:
+            print(f"{name:<10} {where:<8} {w:>10.3f} {c:>10.3f} {w / stage_wall:>7.1%} {b / 1e6:>10.1f}", file=file)
+        print("-"*70, file=file)
+        task_wall = sum(r["wall_s"] for r in self.records)
+        residues = sum(r["residues"] for r in self.records)
+        print(f"Run wall time {wall:.3f} s; task wall time {task_wall:.3f} s; "
+              f"{residues / wall / 1e6 if wall else 0:.2f} M residues/s", file=file)
+
+        slowest = sorted(self.records, key=lambda r: r["wall_s"], reverse=True)[:top]
+        if slowest:
+            print(f"\nSlowest {len(slowest)} tasks:", file=file)
+            print(f"{'Genome':<30} {'Wall (s)':>10} {'Main stage':<16} {'MB read':>10} {'Residues':>12}", file=file)
+            for r in slowest:
+                genome = r["genome"] if r["part"] is None else f"{r['genome']} [{r['part'][0] + 1}/{r['part'][1]}]"
+                worker = {k: v for k, v in r["stages"].items() if k != "ipc"} or {"-": {"wall_s": 0.0}}
+                main_stage = max(worker, key=lambda k: worker[k]["wall_s"])
+                stage_txt = f"{main_stage} {worker[main_stage]['wall_s'] / r['wall_s']:.0%}" if r["wall_s"] else main_stage
+                print(f"{genome[:30]:<30} {r['wall_s']:>10.3f} {stage_txt:<16} {r['bytes_read'] / 1e6:>10.1f} "
+                      f"{r['residues']:>12}", file=file)
+        print("="*70 + "\n", file=file)
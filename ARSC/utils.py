@@ -12,14 +12,20 @@ This script was created to build a file processing utility for ARSC computations
 import os
 import re
 import gzip
+import zlib
+import struct
+import bisect
+import heapq
 import subprocess
 import shutil
-import tempfile
+import io
+import threading
+from functools import lru_cache
 import sys
-from ARSC.core import process_faa
-from collections import Counter
-from Bio import SeqIO
-from Bio.SeqUtils import gc_fraction
+from ARSC.core import process_faa, count_faa_partial, count_faa_by_key, RESIDUES, LazyModule
+from ARSC.timing import FileTrace, timed, timed_reader
+
+np = LazyModule("numpy", globals(), "np")
 
 
 # Remove extensions
@@ -31,17 +37,29 @@ def get_genome_name(path):
     return root
 
 
+def scan_files(directory, extensions, recursive=False):
+    """Yield paths of files ending with extensions, in name order; subdirectories too if recursive.
+
+    Symlinks to files are followed, symlinks to directories are not (no cycles).
+    """
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from scan_files(entry.path, extensions, recursive)
+        elif entry.name.endswith(extensions) and entry.is_file():
+            yield entry.path
+
+
 # Return items: {"handle": <file_path>, "name": <genome_name>}
-def collect_faa_files(input_path):
+def collect_faa_files(input_path, recursive=False):
     extensions = (".faa", ".faa.gz", ".fna", ".fna.gz", ".fasta", ".fasta.gz", ".fa", ".fa.gz")
 
     # --- directory ---
     if os.path.isdir(input_path):
-        for f in os.listdir(input_path):
-            if f.endswith(extensions):
-                fpath = os.path.join(input_path, f)
-                genome = get_genome_name(f)
-                yield {"handle": fpath, "name": genome}
+        for fpath in scan_files(input_path, extensions, recursive):
+            yield {"handle": fpath, "name": get_genome_name(fpath)}
         return
 
     # --- single file ---
@@ -56,63 +74,558 @@ def collect_faa_files(input_path):
     raise ValueError(f"input path does not exist: {input_path}")
 
 
-def collect_fna_files(input_path):
+def collect_fna_files(input_path, recursive=False):
     # .fna, .fasta, .fa とそのgzを対象にする
     extensions = (".fna", ".fna.gz", ".fasta", ".fasta.gz", ".fa", ".fa.gz")
     if os.path.isdir(input_path):
-        for f in os.listdir(input_path):
-            if f.endswith(extensions):
-                yield {"handle": os.path.join(input_path, f), "name": get_genome_name(f)}
+        for fpath in scan_files(input_path, extensions, recursive):
+            yield {"handle": fpath, "name": get_genome_name(fpath)}
     elif os.path.isfile(input_path) and input_path.endswith(extensions):
         yield {"handle": input_path, "name": get_genome_name(input_path)}
 
 
-def process_faa_auto(item, per_sequence=False):
+# Manifest: one file per line, "path[<TAB>name[<TAB>size]]"; '#' lines and blank lines are skipped.
+# Relative paths are relative to the directory of the manifest.
+def read_manifest(manifest_path):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            path = os.path.join(base, fields[0])
+            item = {"handle": path, "name": fields[1] if len(fields) > 1 and fields[1] else get_genome_name(path)}
+            if len(fields) > 2 and fields[2]:
+                try:
+                    item["size"] = int(fields[2])
+                except ValueError:
+                    raise ValueError(f"{manifest_path}:{line_no}: size must be an integer: {fields[2]}")
+            yield item
+
+
+def write_manifest(items, manifest_path):
+    """Write items as a manifest (absolute path, name, size); returns the number of files."""
+    n = 0
+    with open(manifest_path, "w") as out:
+        for item in items:
+            out.write(f"{os.path.abspath(item['handle'])}\t{item['name']}\t{_item_size(item)}\n")
+            n += 1
+    return n
+
+
+def _item_size(item):
+    if item.get("size") is None:
+        try:
+            item["size"] = os.path.getsize(item["handle"])
+        except OSError:
+            item["size"] = 0
+    return item["size"]
+
+
+def shard_items(items, index, count):
+    """Items of shard index (1-based) out of count, balanced by file size.
+
+    Files are taken largest first (ties by path) and each goes to the least loaded shard,
+    so every node computes the same assignment from the same files, whatever their order.
+    Input order is kept within the shard.
+    """
+    order = sorted(range(len(items)), key=lambda i: (-_item_size(items[i]), items[i]["handle"]))
+    loads = [(0, shard) for shard in range(1, count + 1)]
+    mine = []
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        if shard == index:
+            mine.append(i)
+        heapq.heappush(loads, (load + items[i]["size"], shard))
+    return [items[i] for i in sorted(mine)]
+
+
+def process_faa_auto(item, per_sequence=False, backend="bytes", trace=None, length_range=None, memo=None, windows=None):
     """
     item: {"handle": path_str, "name": genome_name}
     per_sequence: bool, whether to process sequences individually
+    backend: counting engine passed to process_faa ("bytes" or "biopython")
+    trace: optional ARSC.timing.FileTrace (--profile / --trace)
+    length_range: optional (min, max) protein length passed to process_faa
+    memo: optional ARSC.memo.SequenceMemo (per-sequence results of repeated sequences)
+    windows: optional window / region spec passed to process_faa (--window, --regions)
     """
     handle = item["handle"]
     name = item["name"]
 
-    if handle.endswith(".gz"):
-        with gzip.open(handle, "rt") as f:
-            return process_faa(f, name=name, per_sequence=per_sequence)
+    if "range" in item:
+        return process_faa_range(item, per_sequence=per_sequence, trace=trace, length_range=length_range, memo=memo)
+
+    if handle.endswith(".gz") or trace is not None:
+        opener = gzip.open if handle.endswith(".gz") else open
+        with opener(handle, "rb") as f:
+            # bytes backend reads raw bytes; Biopython needs a text handle
+            reader = timed_reader(trace, f)
+            if backend == "biopython":
+                reader = io.TextIOWrapper(reader)
+            with timed(trace, "count", excluding="read"):
+                return process_faa(reader, name=name, per_sequence=per_sequence, backend=backend, length_range=length_range, memo=memo, windows=windows)
     else:
-        return process_faa(handle, name=name, per_sequence=per_sequence)
+        return process_faa(handle, name=name, per_sequence=per_sequence, backend=backend, length_range=length_range, memo=memo, windows=windows)
+
+
+# --- Intra-file parallelism: record-aligned byte ranges ---
+# Plain files: ranges are (start, end) byte offsets.
+# BGZF files: ranges are ((block_offset, within), (block_offset, within)) virtual offsets.
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
 
 
-def run_prodigal(input_file):
+def is_bgzf(path):
+    """True if path starts with a BGZF block (gzip member with a 'BC' extra subfield)."""
+    try:
+        with open(path, "rb") as fh:
+            header = fh.read(12)
+            if len(header) < 12 or header[:4] != BGZF_MAGIC:
+                return False
+            return _bgzf_bsize(fh.read(struct.unpack("<H", header[10:12])[0])) is not None
+    except OSError:
+        return False
+
+
+def _bgzf_bsize(extra):
+    # FEXTRA field: subfields SI1 SI2 SLEN (uint16) data; BGZF keeps BSIZE (block size - 1) in 'BC'
+    i = 0
+    while i + 4 <= len(extra):
+        slen = struct.unpack("<H", extra[i + 2:i + 4])[0]
+        if extra[i:i + 2] == b"BC" and slen == 2 and i + 6 <= len(extra):
+            return struct.unpack("<H", extra[i + 4:i + 6])[0]
+        i += 4 + slen
+    return None
+
+
+def _read_bgzf_header(fh):
+    """Read the header of the BGZF block at the current position.
+
+    Returns (block size, header length = 12 + XLEN), or None at the end of the file.
+    The 'BC' subfield may follow other extra subfields.
     """
-    Run Prodigal on the input file and return the path to the generated .faa file.
+    offset = fh.tell()
+    header = fh.read(12)
+    if len(header) < 12:
+        return None
+    if header[:4] != BGZF_MAGIC:
+        raise ValueError(f"not a BGZF block at offset {offset}")
+    xlen = struct.unpack("<H", header[10:12])[0]
+    bsize = _bgzf_bsize(fh.read(xlen))
+    if bsize is None:
+        raise ValueError(f"no BGZF 'BC' subfield in the block at offset {offset}")
+    return bsize + 1, 12 + xlen
+
+
+def _iter_bgzf_blocks(fh):
+    """Yield (block_offset, decompressed_data) from the current position of a BGZF file."""
+    while True:
+        offset = fh.tell()
+        header = _read_bgzf_header(fh)
+        if header is None:
+            return
+        block_size, header_size = header
+        cdata = fh.read(block_size - header_size - 8)
+        fh.read(8)  # CRC32 + ISIZE
+        yield offset, zlib.decompress(cdata, -15)
+
+
+def _bgzf_block_offsets(fh):
+    # Header-only scan: seek over compressed payloads without inflating them
+    offsets = []
+    fh.seek(0)
+    while True:
+        offset = fh.tell()
+        header = _read_bgzf_header(fh)
+        if header is None:
+            return offsets
+        offsets.append(offset)
+        fh.seek(offset + header[0])
+
+
+def _find_record_start(fh, pos, bgzf):
+    """Position of the first '>' that follows a newline at or after pos (None at EOF)."""
+    if bgzf:
+        fh.seek(pos)
+        prev = b""
+        for offset, data in _iter_bgzf_blocks(fh):
+            i = (prev + data).find(b"\n>")
+            if i != -1:
+                return (offset, i + 1 - len(prev))
+            prev = data[-1:]
+        return None
+
+    fh.seek(pos - 1)
+    prev = b""
+    while True:
+        block = fh.read(1 << 16)
+        if not block:
+            return None
+        i = (prev + block).find(b"\n>")
+        if i != -1:
+            return pos - 1 + i + 1 - len(prev)
+        pos += len(block)
+        prev = block[-1:]
+
+
+def split_fasta_ranges(path, chunk_bytes):
+    """Split a plain or BGZF FASTA file into record-aligned ranges of about chunk_bytes.
+
+    Returns a list of ranges; a single range means the file is not worth splitting.
     """
-    # Prodigalの出力ファイル名を定義
-    name = get_genome_name(input_file)
-    out_faa = os.path.join(tempfile.gettempdir(), f"{name}_output.faa")
+    bgzf = is_bgzf(path)
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        if bgzf:
+            blocks = _bgzf_block_offsets(fh)
+            bounds, end = [(0, 0)], (size, 0)
+        else:
+            bounds, end = [0], size
+
+        target = chunk_bytes
+        while target < size:
+            if bgzf:
+                # A BGZF range starts inside the first block at or after the target
+                i = bisect.bisect_left(blocks, target)
+                if i == len(blocks):
+                    break
+                pos = blocks[i]
+            else:
+                pos = target
+            boundary = _find_record_start(fh, pos, bgzf)
+            if boundary is None:
+                break
+            bounds.append(boundary)
+            target = (boundary[0] if bgzf else boundary) + chunk_bytes
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _RangeReader:
+    """Minimal read()-only view of [start, end) of a plain or BGZF file."""
+
+    def __init__(self, path, start, end, bgzf):
+        self._fh = open(path, "rb")
+        self._end = end
+        self._bgzf = bgzf
+        if bgzf:
+            self._fh.seek(start[0])
+            self._blocks = _iter_bgzf_blocks(self._fh)
+            self._skip = start[1]
+            self._pending = b""
+        else:
+            self._fh.seek(start)
+            self._remaining = end - start
+
+    def read(self, size=-1):
+        if not self._bgzf:
+            if size < 0 or size > self._remaining:
+                size = self._remaining
+            data = self._fh.read(size)
+            self._remaining -= len(data)
+            return data
+
+        while not self._pending and self._blocks is not None:
+            block = next(self._blocks, None)
+            if block is None:
+                self._blocks = None
+                break
+            offset, data = block
+            if offset >= self._end[0]:
+                data = data[:self._end[1]]
+                self._blocks = None
+            self._pending = data[self._skip:]
+            self._skip = 0
+        data, self._pending = self._pending, b""
+        return data
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_faa_range(item, per_sequence=False, trace=None, length_range=None, memo=None):
+    """Count one record-aligned range of a file (item["range"]); returns a partial.
+
+    The parent merges the partials of a file with ARSC.core.merge_faa_partials.
+    """
+    start, end = item["range"]
+    try:
+        with _RangeReader(item["handle"], start, end, item.get("bgzf", False)) as reader:
+            with timed(trace, "count", excluding="read"):
+                partial = count_faa_partial(timed_reader(trace, reader), per_sequence=per_sequence, length_range=length_range, memo=memo)
+    except Exception as e:
+        return {"genome": item["name"], "source": item["handle"], "part": item["part"], "error": str(e)}
+    partial["genome"] = item["name"]
+    partial["source"] = item["handle"]
+    partial["part"] = item["part"]
+    partial["cache_key"] = item.get("cache_key")
+    return partial
 
-    if input_file.endswith(".gz"):
-        # 解凍してProdigal処理を行う
-        with gzip.open(input_file, 'rb') as f_in:
-            content = f_in.read()
 
-        process = subprocess.Popen(
-            ["prodigal", "-p", "meta", "-a", out_faa, "-o", "/dev/null"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            text=True
-        )
-        process.communicate(input=content.decode())
-    else:
-        # 通常の.fnaファイル処理
-        process = subprocess.Popen(
-            ["prodigal", "-i", input_file, "-p", "meta", "-a", out_faa, "-o", "/dev/null"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        process.wait()
+def start_prodigal():
+    """
+    Start Prodigal reading a genome on stdin and writing predicted proteins to stdout.
+    """
+    return subprocess.Popen(
+        ["prodigal", "-p", "meta", "-a", "/dev/stdout", "-o", "/dev/null"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+class BaseCounter:
+    """Streaming A/T/G/C counter over raw FASTA bytes (header lines excluded, case-insensitive).
+
+    Blocks may split lines anywhere; only a partial header line is carried over.
+    """
+
+    def __init__(self):
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self._carry = b""
+        self._line_start = True
+
+    def _add(self, data):
+        self.histogram += np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+
+    def _add_lines(self, data):
+        # data starts at a line start; subtract the bytes of its header lines
+        self._add(data)
+        headers = []
+        start = 0 if data.startswith(b">") else (data.find(b"\n>") + 1 or None)
+        while start is not None:
+            end = data.find(b"\n", start)
+            headers.append(data[start:end])
+            start = data.find(b"\n>", end) + 1 or None
+        if headers:
+            self.histogram -= np.bincount(np.frombuffer(b"".join(headers), dtype=np.uint8), minlength=256)
+
+    def update(self, block):
+        data = self._carry + block
+        self._carry = b""
+        if not self._line_start:
+            # Continuation of a sequence line from the previous block
+            newline = data.find(b"\n")
+            if newline == -1:
+                self._add(data)
+                return
+            self._add(data[:newline + 1])
+            data = data[newline + 1:]
+        cut = data.rfind(b"\n") + 1
+        self._add_lines(data[:cut])
+        tail = data[cut:]
+        if tail.startswith(b">"):
+            self._carry = tail
+            self._line_start = True
+        else:
+            self._add(tail)
+            self._line_start = not tail
 
-    return out_faa
+    def counts(self):
+        h = self.histogram
+        return {base: int(h[ord(base)] + h[ord(base.lower())]) for base in "ATGC"}
+
+
+class ContigBaseCounter:
+    """Streaming A/T/G/C counts per contig (first word of the header), in file order.
+
+    Used instead of BaseCounter for --per-contig / --bins. A block is cut at header
+    lines into sequence segments, and each base is summed over all segments with one
+    np.add.reduceat; blocks may split lines anywhere and only a partial header line
+    is carried over.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+        self._counts = np.zeros((1024, 4), dtype=np.int64)
+        self._current = -1  # contig of the bytes at the start of the next block (-1: before any header)
+        self._carry = b""
+        self._line_start = True
+
+    def _contig(self, header):
+        words = header.split(None, 1)
+        name = words[0].decode(errors="replace") if words else ""
+        index = self.index.get(name)
+        if index is None:
+            index = self.index[name] = len(self.names)
+            self.names.append(name)
+            if index >= len(self._counts):
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        return index
+
+    def update(self, block):
+        data = self._carry + block if self._carry else block
+        self._carry = b""
+        if not data:
+            return
+        # Headers: '>' at the start of a line, up to the next newline
+        starts = [0] if self._line_start and data.startswith(b">") else []
+        start = data.find(b"\n>") + 1
+        while start:
+            starts.append(start)
+            start = data.find(b"\n>", start) + 1
+        bounds = [0]
+        contigs = [self._current]
+        for start in starts:
+            end = data.find(b"\n", start)
+            if end < 0:
+                # The last header line is incomplete: keep it for the next block
+                self._carry = data[start:]
+                data = data[:start]
+                break
+            bounds += (start, end)
+            contigs.append(self._contig(data[start + 1:end]))
+
+        if data:
+            # Segments alternate sequence / header; reduceat sums [bounds[i], bounds[i + 1])
+            lower = np.frombuffer(data, dtype=np.uint8) | 32
+            bounds = np.array(bounds, dtype=np.intp)
+            empty = np.append(bounds[1:], len(lower))[::2] == bounds[::2]
+            counts = np.empty((len(contigs), 4), dtype=np.int64)
+            for j, base in enumerate(b"atgc"):
+                counts[:, j] = np.add.reduceat(lower == base, bounds, dtype=np.int64)[::2]
+            counts[empty] = 0
+            rows = np.array(contigs, dtype=np.intp)
+            keep = rows >= 0  # bytes before the first header belong to no contig
+            np.add.at(self._counts, rows[keep], counts[keep])
+        self._current = contigs[-1]
+        # A carried header starts a line
+        self._line_start = bool(self._carry) or data.endswith(b"\n")
+
+    def close(self):
+        if self._carry:
+            self._contig(self._carry[1:])
+            self._carry = b""
+
+    def contig_counts(self):
+        """A/T/G/C counts (n_contigs x 4) in the order of self.names."""
+        return self._counts[:len(self.names)]
+
+    def counts(self):
+        totals = self.contig_counts().sum(axis=0).tolist()
+        return dict(zip("ATGC", totals))
+
+
+def _protein_contig(header):
+    # Prodigal names proteins <contig>_<n>
+    words = header.split(None, 1)
+    return words[0].rsplit(b"_", 1)[0].decode(errors="replace") if words else ""
+
+
+@lru_cache(maxsize=4)
+def _read_bins(path):
+    from ARSC.merge import read_group_map
+    return read_group_map(path)
+
+
+def group_contigs(counter, proteins, groups):
+    """Rows of --per-contig / --bins: base and residue counts per contig or bin.
+
+    counter: ContigBaseCounter of the genome; proteins: count_faa_by_key result keyed by
+    contig; groups: {"by": "contig"} or {"by": "bin", "map": path} (contigs without a
+    bin form the group "unbinned"). Returns {"names", "base_counts", "residue_counts", "total_aa"}.
+    """
+    names = list(counter.names)
+    index = dict(counter.index)
+    for name in proteins["names"]:
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+    base_counts = np.zeros((len(names), 4), dtype=np.int64)
+    base_counts[:len(counter.names)] = counter.contig_counts()
+    residue_counts = np.zeros((len(names), len(RESIDUES)), dtype=np.int64)
+    total_aa = np.zeros(len(names), dtype=np.int64)
+    rows = np.array([index[name] for name in proteins["names"]], dtype=np.intp)
+    if len(rows):
+        residue_counts[rows] = proteins["residue_counts"]
+        total_aa[rows] = proteins["total_aa"]
+    if groups.get("by") == "bin":
+        bins = _read_bins(groups["map"])
+        bin_index = {}
+        rows = np.array([bin_index.setdefault(bins.get(name, "unbinned"), len(bin_index)) for name in names], dtype=np.intp)
+        names = list(bin_index)
+        summed = [np.zeros((len(names),) + a.shape[1:], dtype=np.int64) for a in (base_counts, residue_counts, total_aa)]
+        for total, values in zip(summed, (base_counts, residue_counts, total_aa)):
+            np.add.at(total, rows, values)
+        base_counts, residue_counts, total_aa = summed
+    return {"names": names, "base_counts": base_counts, "residue_counts": residue_counts, "total_aa": total_aa}
+
+
+def _feed_prodigal(reader, stdin, counter, errors):
+    # Single pass over the genome: decompress once, count bases and pipe the bytes to Prodigal
+    try:
+        for block in iter(lambda: reader.read(1 << 20), b""):
+            counter.update(block)
+            stdin.write(block)
+        if isinstance(counter, ContigBaseCounter):
+            counter.close()
+    except BrokenPipeError:
+        pass  # Prodigal exited early; reported through its return code
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+# Byte tables for detection: drop non-letters, then drop nucleotide letters
+_NON_ALPHA = bytes(b for b in range(256) if not (65 <= b <= 90 or 97 <= b <= 122))
+_NUCLEOTIDE_BYTES = b"ATGCUNatgcun"
+
+
+def detect_nucleotide_bytes(data, sample_chars=1000, threshold=0.95):
+    """
+    先頭の配列から1000文字をサンプリングして、ATGC/U/Nの割合が95%以上なら核酸と判断する。
+    data: raw bytes from the start of a (decompressed) FASTA file
+    """
+    collected = []
+    n_collected = 0
+    for line in data.split(b"\n"):
+        if line.startswith(b">"):
+            continue
+        cleaned = line.translate(None, _NON_ALPHA)
+        if not cleaned:
+            continue
+        collected.append(cleaned)
+        n_collected += len(cleaned)
+        if n_collected >= sample_chars:
+            break
+    sample = b"".join(collected)[:sample_chars]
+    if not sample:
+        return False
+    nuc_chars = len(sample) - len(sample.translate(None, _NUCLEOTIDE_BYTES))
+    return nuc_chars / len(sample) >= threshold
+
+
+def _read_detection_sample(fh, sample_chars=1000, block_size=1 << 16):
+    # Read blocks until they hold enough sequence letters for detection (or EOF).
+    # Header letters do not count: files with long headers would otherwise stop too early.
+    data = b""
+    letters = 0
+    header = None  # whether the line continued from the previous block is a header (None: nothing read of it yet)
+    while letters < 2 * sample_chars:
+        block = fh.read(block_size)
+        if not block:
+            break
+        data += block
+        for k, line in enumerate(block.split(b"\n")):
+            if k:
+                header = None
+            if header is None and line:
+                header = line.startswith(b">")
+            if header is False:
+                letters += len(line.translate(None, _NON_ALPHA))
+    return data
 
 
 def detect_nucleotide_file(handle, sample_chars=1000, threshold=0.95):
@@ -121,44 +634,131 @@ def detect_nucleotide_file(handle, sample_chars=1000, threshold=0.95):
     """
     try:
         opener = gzip.open if str(handle).endswith('.gz') else open
-        mode = 'rt' if str(handle).endswith('.gz') else 'r'
-        collected = []
-        with opener(handle, mode) as fh:
-            for line in fh:
-                if line.startswith('>'):
-                    continue
-                cleaned = ''.join(ch for ch in line if ch.isalpha())
-                if not cleaned:
-                    continue
-                collected.append(cleaned)
-                if sum(len(s) for s in collected) >= sample_chars:
-                    break
-        sample = ''.join(collected)[:sample_chars].upper()
-        if not sample:
-            return False
-        nuc_chars = sum(1 for ch in sample if ch in ('A', 'T', 'G', 'C', 'U', 'N'))
-        frac = nuc_chars / len(sample)
-        return frac >= threshold
+        with opener(handle, 'rb') as fh:
+            return detect_nucleotide_bytes(_read_detection_sample(fh, sample_chars), sample_chars, threshold)
     except Exception:
         return False
 
 
-def dispatch_process(item, mode, per_sequence_flag):
+class _PrefixedReader(io.RawIOBase):
+    """Binary reader that replays bytes already read (the detection sample) before the rest."""
+
+    def __init__(self, prefix, fh):
+        self._prefix = prefix
+        self._fh = fh
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self._prefix:
+            if size is None or size < 0:
+                data, self._prefix = self._prefix + self._fh.read(), b""
+            else:
+                data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        return self._fh.read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def process_auto(item, per_sequence=False, backend="bytes", switch_to_fna=True, trace=None, length_range=None, memo=None, windows=None):
+    """Detect the sequence type from the first block read and process the rest of the same stream.
+
+    switch_to_fna: process nucleotide-looking files with Prodigal (otherwise only log a note).
+    trace: optional ARSC.timing.FileTrace (--profile / --trace)
+    length_range: optional (min, max) protein length passed to process_faa
+    memo: optional ARSC.memo.SequenceMemo (per-sequence results of repeated sequences)
+    windows: optional window / region spec passed to process_faa (--window, --regions)
+    """
+    handle = item["handle"]
+    name = item["name"]
+    opener = gzip.open if handle.endswith(".gz") else open
+    try:
+        fh = opener(handle, "rb")
+    except Exception as e:
+        return {"genome": name, "error": str(e)}
+
+    with fh:
+        source = timed_reader(trace, fh)
+        try:
+            prefix = _read_detection_sample(source)
+        except Exception as e:
+            return {"genome": name, "error": str(e)}
+        reader = _PrefixedReader(prefix, source)
+
+        if detect_nucleotide_bytes(prefix):
+            if switch_to_fna:
+                print(f"Warning: {name} looks like nucleotide sequences — switching to nucleotide processing", file=sys.stderr)
+                return process_fna_pipeline(item, per_sequence=per_sequence, backend=backend, source=reader, trace=trace,
+                                            length_range=length_range, memo=memo, windows=windows)
+            # User requested to disable auto-detection: treat everything as amino-acid sequences
+            print(f"Note: {name} looks like nucleotide sequences but --no-auto-detection set; treating as protein.", file=sys.stderr)
+
+        if backend == "biopython":
+            reader = io.TextIOWrapper(io.BufferedReader(reader))
+        with timed(trace, "count", excluding="read"):
+            return process_faa(reader, name=name, per_sequence=per_sequence, backend=backend, length_range=length_range, memo=memo, windows=windows)
+
+
+def dispatch_process(item, mode, per_sequence_flag, backend="bytes", cache=None, profile=False, length_range=None, memo=None,
+                     windows=None, groups=None):
     """Dispatch to the appropriate processing function for multiprocessing.
-    mode: 'fna' or 'faa'
+    mode: 'fna', 'faa', 'auto' (detect in the worker) or 'auto-faa' (detect, log, treat as protein)
+    backend: counting engine ("bytes" or "biopython")
+    cache: optional ResultCache; the result is stored under item['cache_key']
+    profile: attach per-stage timings to the result as result['profile'] (see ARSC.timing)
+    length_range: optional (min, max) protein length; other proteins are skipped while counting
+    memo: optional ARSC.memo.SequenceMemo; its lookup counts are sent back as result['memo']
+    windows: optional {"window": size, "step": step} or {"regions": path}: window / region profiles
+    groups: optional per-contig / per-bin grouping of nucleotide files ('fna' mode, see group_contigs)
     This function is useful as a picklable target for multiprocessing.
     """
+    trace = FileTrace(item, mode) if profile else None
+    options = {"per_sequence": per_sequence_flag, "backend": backend, "trace": trace, "length_range": length_range, "memo": memo,
+               "windows": windows}
+    memo_before = memo.counts() if memo is not None else None
     if mode == 'fna':
-        return process_fna_pipeline(item, per_sequence=per_sequence_flag)
+        result = process_fna_pipeline(item, groups=groups, **options)
     elif mode == 'faa':
-        return process_faa_auto(item, per_sequence=per_sequence_flag)
+        result = process_faa_auto(item, **options)
+    elif mode in ('auto', 'auto-faa'):
+        result = process_auto(item, switch_to_fna=(mode == 'auto'), **options)
     else:
         return {"genome": item.get('name'), 'error': 'skipped by auto-detection'}
 
+    if cache is not None and item.get('cache_key'):
+        with timed(trace, "cache"):
+            cache.put(item['cache_key'], result)
+    if memo is not None:
+        memo.flush()
+        result['memo'] = tuple(after - before for after, before in zip(memo.counts(), memo_before))
+    if trace is not None:
+        result['profile'] = trace.record(result)
+    return result
+
+
+def dispatch_task(task):
+    """Single-argument wrapper of dispatch_process for Pool.imap / imap_unordered.
+    task: (item, mode, per_sequence_flag, backend, cache, profile, length_range, memo, windows, groups) tuple
+    """
+    return dispatch_process(*task)
+
 
-def process_fna_pipeline(item, per_sequence=False):
+def process_fna_pipeline(item, per_sequence=False, backend="bytes", source=None, trace=None, length_range=None, memo=None, windows=None,
+                         groups=None):
     """
     Process .fna or .fna.gz files, handling GC content and Prodigal processing.
+    source: optional open binary reader of the (decompressed) genome; item["handle"] is opened otherwise
+    trace: optional ARSC.timing.FileTrace (--profile / --trace)
+    length_range: optional (min, max) length of predicted proteins passed to process_faa
+    memo: optional ARSC.memo.SequenceMemo (per-sequence results of repeated sequences)
+    windows: optional window / region spec passed to process_faa (--window, --regions)
+    groups: optional {"by": "contig"} or {"by": "bin", "map": path}: also count bases and residues
+    per contig (or bin) and return them as result["groups"] (see group_contigs)
     """
     # Prodigalが存在しない場合のエラーハンドリング
     if shutil.which("prodigal") is None:
@@ -168,49 +768,66 @@ def process_fna_pipeline(item, per_sequence=False):
     handle = item["handle"]
     name = item["name"]
 
-    base_counts = Counter()
-    total_length = 0
-
-    opener = gzip.open if handle.endswith(".gz") else open
-    mode = "rt" if handle.endswith(".gz") else "r"
-    
+    # Prodigal: ゲノムを stdin に流し、タンパク質を stdout からそのまま ARSC 計算へ
+    try:
+        prodigal = start_prodigal()
+    except OSError as e:
+        return {"genome": name, "error": f"Prodigal error: {str(e)}"}
     try:
-        with opener(handle, mode) as f:
-            for line in f:
-                if line.startswith(">"):
-                    continue
-                clean_line = line.strip().upper()
-                base_counts.update(clean_line)
-        
-        # 集計
-        A = base_counts.get("A", 0)
-        T = base_counts.get("T", 0)
-        G = base_counts.get("G", 0)
-        C = base_counts.get("C", 0)
-        total_atgc = A + T + G + C
-        gc_content = (G + C) / total_atgc * 100 if total_atgc > 0 else 0
-        
+        genome = source if source is not None else (gzip.open if handle.endswith(".gz") else open)(handle, "rb")
     except Exception as e:
+        prodigal.kill()
+        prodigal.wait()
         return {"genome": name, "error": f"Base composition error: {str(e)}"}
-
-    # Prodigal
-    faa_file = run_prodigal(handle)
-
-    # ARSC 計算
-    arsc_results = process_faa_auto({"handle": faa_file, "name": name}, per_sequence=per_sequence)
+    # A source from process_auto is already timed
+    reader = genome if source is not None else timed_reader(trace, genome)
+    counter = BaseCounter() if groups is None else ContigBaseCounter()
+    feed_errors = []
+    feeder = threading.Thread(target=_feed_prodigal, args=(reader, prodigal.stdin, counter, feed_errors), daemon=True)
+    feeder.start()
+
+    proteins = timed_reader(trace, prodigal.stdout, "prodigal")
+    if backend == "biopython":
+        proteins = io.TextIOWrapper(proteins)
+    with timed(trace, "count", excluding="prodigal"):
+        if groups is None:
+            arsc_results = process_faa(proteins, name=name, per_sequence=per_sequence, backend=backend, length_range=length_range, memo=memo, windows=windows)
+        else:
+            # タンパク質を由来コンティグごとに集計 (Prodigal の ID: <contig>_<n>)
+            try:
+                arsc_results = {"genome": name, "contig_proteins": count_faa_by_key(proteins, _protein_contig, length_range)}
+            except Exception as e:
+                arsc_results = {"genome": name, "error": str(e)}
+    if "error" in arsc_results:
+        prodigal.kill()
+    feeder.join()
+    if source is None:
+        genome.close()
+    prodigal.stdout.close()
+    returncode = prodigal.wait()
+
+    if feed_errors:
+        return {"genome": name, "error": f"Base composition error: {str(feed_errors[0])}"}
+    if returncode != 0 and "error" not in arsc_results:
+        return {"genome": name, "error": f"Prodigal exited with status {returncode}"}
+
+    # 集計
+    base_counts = counter.counts()
+    A, T, G, C = base_counts["A"], base_counts["T"], base_counts["G"], base_counts["C"]
+    total_atgc = A + T + G + C
+    gc_content = (G + C) / total_atgc * 100 if total_atgc > 0 else 0
 
     # 結果
     result = {
         "GC": gc_content,
+        "base_counts": base_counts,
         "base_A": A*100/total_atgc if total_atgc > 0 else 0,
         "base_T": T*100/total_atgc if total_atgc > 0 else 0,
         "base_G": G*100/total_atgc if total_atgc > 0 else 0,
         "base_C": C*100/total_atgc if total_atgc > 0 else 0,
         **arsc_results
     }
-
-    #(一時ファイル削除)
-    if os.path.exists(faa_file):
-        os.remove(faa_file)
+    if groups is not None and "error" not in result:
+        result["groups"] = group_contigs(counter, result.pop("contig_proteins"), groups)
 
     return result
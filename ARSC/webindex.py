@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to build the compact binary index of ARSC results that the web viewer loads instead of
+the full TSV (js/arsc_scatterplot.js).
+
+Usage:
+    arsc index genomes.tsv --taxonomy bac120_taxonomy_r226.tsv -o data/arsc_gtdb_r226rep.arscidx
+    arsc index arsc_gtdb_r226rep.tsv -o data/arsc_gtdb_r226rep.arscidx.gz   # taxonomy columns already in the TSV
+
+Layout (little-endian): the magic b"ARSCIDX1", a uint32 length and a JSON header (padded so that the body starts at
+a multiple of 8), then the body of 8-byte aligned sections that the header points to ({"offset" in the body,
+"count", "dtype"}):
+    columns  numeric columns, float32 (integers: uint32, or float64 when they do not fit)
+    strings  text columns (ids, ...): uint32 offsets (rows + 1) into UTF-8 data
+    ranks    per rank, dictionary values (in the header), a code per row and the row offsets of each code
+Rows are sorted by lineage, so every taxon is the contiguous row range starts[code]:starts[code + 1] and the
+taxa of a rank inside a range are the codes codes[start]..codes[end - 1].
+"""
+
+
+import sys
+import gzip
+import json
+import struct
+import argparse
+import numpy as np
+from ARSC.merge import iter_blocks
+from ARSC.aggregate import RANKS, Taxonomy
+
+MAGIC = b"ARSCIDX1"
+# Column names of arsc outputs -> names used by the web viewer
+VIEWER_NAMES = {"query": "id", "genomic_GC": "GC(%)", "TotalLength": "sum_len"}
+LEVELS = ("domain", "phylum", "class", "order", "family", "genus")
+
+
+def _column(values):
+    """Typed array of one input column: float32, uint32 / float64 for integers, or str."""
+    array = np.asarray(values)
+    if array.dtype.kind in "iu":
+        return array.astype(np.uint32) if len(array) == 0 or (array.min() >= 0 and array.max() < 2 ** 32) else array.astype(np.float64)
+    if array.dtype.kind in "fb":
+        return array.astype(np.float32)
+    try:
+        numbers = array.astype(np.float64)
+    except ValueError:
+        return array.astype(np.str_)
+    if not any(c in value for value in array.tolist() for c in ".eEnN"):
+        return _column(numbers.astype(np.int64))
+    return numbers.astype(np.float32)
+
+
+def _code_dtype(n):
+    return np.uint16 if n <= 1 << 16 else np.uint32
+
+
+def build_index(columns, ranks):
+    """Bytes of the index of columns ({name: array}, header order; the first one is the row id).
+
+    ranks names the str columns holding the taxonomy (top -> bottom); rows are sorted by them and by id.
+    """
+    names = list(columns)
+    n = len(columns[names[0]])
+    order = np.lexsort([columns[names[0]]] + [columns[rank] for rank in reversed(ranks)]) if n else np.zeros(0, dtype=np.intp)
+
+    sections = []
+    offset = 0
+
+    def add(array):
+        nonlocal offset
+        data = np.ascontiguousarray(array).astype(array.dtype.newbyteorder("<"), copy=False).tobytes()
+        section = {"offset": offset, "count": len(array), "dtype": np.dtype(array.dtype).name}
+        sections.append(data + b"\0" * (-len(data) % 8))
+        offset += len(sections[-1])
+        return section
+
+    meta = {"format": 1, "rows": n, "header": names, "id": names[0], "columns": [], "strings": [], "ranks": []}
+    changed = np.zeros(n, dtype=bool)
+    if n:
+        changed[0] = True
+    for rank in ranks:
+        values = columns[rank][order]
+        changed[1:] |= values[1:] != values[:-1]
+        starts = np.flatnonzero(changed)
+        codes = (np.cumsum(changed) - 1).astype(_code_dtype(len(starts)))
+        meta["ranks"].append({"name": rank, "values": values[starts].tolist(), "codes": add(codes),
+                              "starts": add(np.append(starts, n).astype(np.uint32))})
+    for name in names:
+        if name in ranks:
+            continue
+        column = columns[name][order]
+        if column.dtype.kind == "U":
+            encoded = [value.encode() for value in column.tolist()]
+            offsets = np.zeros(n + 1, dtype=np.uint32)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            meta["strings"].append({"name": name, "offsets": add(offsets), "data": add(np.frombuffer(b"".join(encoded), dtype=np.uint8))})
+        else:
+            meta["columns"].append(dict(add(column), name=name))
+
+    header = json.dumps(meta, separators=(",", ":")).encode()
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+    return MAGIC + struct.pack("<I", len(header)) + header + b"".join(sections)
+
+
+def read_index(path):
+    """Read an index (plain or gzip-compressed) back: {"header": [...], "columns": {name: array}, "ranks": {...}}."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    elif path.endswith(".br"):
+        import brotli
+        data = brotli.decompress(data)
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: not an ARSC index")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    body = len(MAGIC) + 4 + length
+    meta = json.loads(data[len(MAGIC) + 4:body])
+
+    def view(section):
+        return np.frombuffer(data, dtype=np.dtype(section["dtype"]).newbyteorder("<"), count=section["count"], offset=body + section["offset"])
+
+    columns = {c["name"]: view(c) for c in meta["columns"]}
+    for s in meta["strings"]:
+        offsets, text = view(s["offsets"]), view(s["data"]).tobytes()
+        columns[s["name"]] = np.array([text[a:b].decode() for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())], dtype=np.str_)
+    ranks = {}
+    for r in meta["ranks"]:
+        values = np.array(r["values"], dtype=np.str_)
+        ranks[r["name"]] = {"values": values, "codes": view(r["codes"]), "starts": view(r["starts"])}
+        columns[r["name"]] = values[ranks[r["name"]]["codes"]] if meta["rows"] else np.zeros(0, dtype=np.str_)
+    return {"header": meta["header"], "columns": {name: columns[name] for name in meta["header"]}, "ranks": ranks}
+
+
+def write_index(data, path, compress=None):
+    """Write index bytes, gzip- or brotli-compressed (compress, or the .gz / .br suffix of path)."""
+    compress = compress or ("gzip" if path.endswith(".gz") else "brotli" if path.endswith(".br") else None)
+    if compress == "gzip":
+        data = gzip.compress(data, compresslevel=9, mtime=0)
+    elif compress == "brotli":
+        try:
+            import brotli
+        except ImportError:
+            raise ImportError("brotli compression requires the brotli package (pip install brotli)")
+        data = brotli.compress(data, quality=11)
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return len(data)
+
+
+def collect_columns(paths, taxonomy=None, ranks=LEVELS):
+    """Columns of arsc outputs (viewer names, id first), with rank columns from taxonomy or from the inputs."""
+    blocks = {}
+    for path in paths:
+        for block in iter_blocks(path, first_columns=("query", "id")):
+            for name, values in block.items():
+                blocks.setdefault(VIEWER_NAMES.get(name, name), []).append(np.asarray(values))
+    if not blocks:
+        raise ValueError("no rows to index")
+    columns = {name: np.concatenate(parts) for name, parts in blocks.items()}
+    names = list(columns)
+    ids = columns[names[0]].astype(np.str_)
+    if taxonomy is not None:
+        lineages = taxonomy.lookup(ids)
+        for rank in ranks:
+            depth = RANKS.index(rank)
+            columns[rank] = np.array([taxonomy.lineages[i][depth] if i >= 0 and depth < len(taxonomy.lineages[i]) else ""
+                                      for i in lineages.tolist()], dtype=np.str_)
+        names = names[:1] + list(ranks) + [name for name in names[1:] if name not in ranks]
+    missing = [rank for rank in ranks if rank not in columns]
+    if missing:
+        raise ValueError(f"no {', '.join(missing)} column; give a taxonomy table with --taxonomy")
+    typed = {names[0]: ids}
+    for name in names[1:]:
+        typed[name] = columns[name].astype(np.str_) if name in ranks else _column(columns[name])
+    return typed
+
+
+def index_main(argv=None):
+    parser = argparse.ArgumentParser(prog="arsc index", description="Build the binary index of ARSC results for the web viewer")
+    parser.add_argument("inputs", nargs="+", help="Per-genome arsc outputs or viewer TSVs (TSV[.gz|.zst], .npz, .parquet, .arrow; '-' reads TSV from stdin)")
+    parser.add_argument("-o", "--output", required=True, help="Index file (.gz / .br suffixes compress)")
+    parser.add_argument("--taxonomy", help="Genome to lineage table (as in 'arsc aggregate'); without it, rank columns are read from the inputs")
+    parser.add_argument("--taxonomy-column", default="gtdb_taxonomy", help="Lineage column of a taxonomy table with a header")
+    parser.add_argument("--id-column", default="accession", help="Genome column of a taxonomy table with a header")
+    parser.add_argument("--ranks", default=",".join(LEVELS), help=f"Comma-separated ranks to index ({', '.join(RANKS)})")
+    parser.add_argument("--compress", choices=["gzip", "brotli"], help="Compress the index (default: from the -o suffix)")
+    args = parser.parse_args(argv)
+
+    ranks = [rank.strip() for rank in args.ranks.split(",") if rank.strip()]
+    unknown = [rank for rank in ranks if rank not in RANKS]
+    if unknown:
+        parser.error(f"--ranks: unknown rank {', '.join(unknown)}; choose from {', '.join(RANKS)}")
+
+    try:
+        taxonomy = Taxonomy(args.taxonomy, args.taxonomy_column, args.id_column) if args.taxonomy else None
+        columns = collect_columns(args.inputs, taxonomy, ranks)
+        data = build_index(columns, ranks)
+        size = write_index(data, args.output, args.compress)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    rows = len(next(iter(columns.values())))
+    print(f"Indexed {rows} rows ({', '.join(f'{len(set(columns[r].tolist()))} {r}' for r in ranks)}): "
+          f"{len(data)} bytes, {size} written to {args.output}", file=sys.stderr)
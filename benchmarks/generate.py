@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to generate deterministic synthetic proteomes and genomes for benchmarks.
+
+Usage:
+    python benchmarks/generate.py proteome out.faa --sequences 4000 --length-mean 330
+    python benchmarks/generate.py genome out.fna.gz --contigs 50 --contig-length 100000
+    python benchmarks/generate.py proteome-dir out_dir --files 200 --sequences 3000
+
+Metadata (residue/base counts, sizes) is printed to stdout as JSON.
+"""
+
+
+import os
+import sys
+import json
+import gzip
+import argparse
+import numpy as np
+
+AMINO_ACIDS = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+# Background frequencies of the 20 standard residues (UniProt-like), same order as AMINO_ACIDS
+AA_FREQUENCIES = np.array([8.25, 1.38, 5.46, 6.72, 3.86, 7.07, 2.27, 5.91, 5.80, 9.65,
+                           2.41, 4.06, 4.74, 3.93, 5.53, 6.64, 5.35, 6.86, 1.10, 2.92])
+AA_FREQUENCIES = AA_FREQUENCIES / AA_FREQUENCIES.sum()
+# Characters that are not in aa_dictionary and are ignored by quickARSC
+INVALID_CHARS = np.frombuffer(b"X-.", dtype=np.uint8)
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+def _open_out(path):
+    return gzip.open(path, "wb", compresslevel=1) if path.endswith(".gz") else open(path, "wb")
+
+
+def _wrap(seq, width):
+    return b"\n".join(seq[i:i + width] for i in range(0, len(seq), width))
+
+
+def sequence_lengths(rng, n, dist="lognormal", mean=330, sd=180, minimum=30):
+    """Draw n sequence lengths: 'lognormal' (mean/sd), 'uniform' (mean +- sd) or 'fixed' (mean)."""
+    if dist == "fixed":
+        lengths = np.full(n, mean)
+    elif dist == "uniform":
+        lengths = rng.integers(max(minimum, mean - sd), mean + sd + 1, size=n)
+    elif dist == "lognormal":
+        sigma2 = np.log(1 + (sd / mean) ** 2)
+        lengths = rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), size=n)
+    else:
+        raise ValueError(f"unknown length distribution: {dist}")
+    return np.maximum(lengths.astype(np.int64), minimum)
+
+
+def _proteins(seed, sequences, length_dist, length_mean, length_sd, invalid_rate):
+    rng = np.random.default_rng(seed)
+    lengths = sequence_lengths(rng, sequences, length_dist, length_mean, length_sd)
+    residues = AMINO_ACIDS[rng.choice(len(AMINO_ACIDS), size=int(lengths.sum()), p=AA_FREQUENCIES)]
+    if invalid_rate > 0:
+        mask = rng.random(len(residues)) < invalid_rate
+        residues[mask] = INVALID_CHARS[rng.integers(0, len(INVALID_CHARS), size=int(mask.sum()))]
+    return lengths, residues.tobytes(), rng
+
+
+def generate_proteome(path, sequences=4000, length_dist="lognormal", length_mean=330, length_sd=180,
+                      invalid_rate=0.0, seed=0, line_width=60, shared_fraction=0.0, shared_seed=None):
+    """Write a synthetic protein FASTA (.gz suffix: gzip) and return its metadata.
+
+    invalid_rate: fraction of residues replaced by characters outside aa_dictionary.
+    shared_fraction: fraction of proteins taken from a common pool (drawn with shared_seed,
+    default seed + 1), so that files written with the same shared_seed share identical proteins.
+    """
+    lengths, data, rng = _proteins(seed, sequences, length_dist, length_mean, length_sd, invalid_rate)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    proteins = [data[offsets[i]:offsets[i + 1]] for i in range(sequences)]
+    if shared_fraction > 0:
+        pool_seed = seed + 1 if shared_seed is None else shared_seed
+        pool_lengths, pool_data, _ = _proteins(pool_seed, sequences, length_dist, length_mean, length_sd, invalid_rate)
+        pool_offsets = np.concatenate([[0], np.cumsum(pool_lengths)]).tolist()
+        for i in np.flatnonzero(rng.random(sequences) < shared_fraction).tolist():
+            proteins[i] = pool_data[pool_offsets[i]:pool_offsets[i + 1]]
+        lengths = np.array([len(p) for p in proteins], dtype=np.int64)
+
+    with _open_out(path) as out:
+        for i, protein in enumerate(proteins, 1):
+            out.write(b">synthetic_protein_%d # generated\n" % i)
+            out.write(_wrap(protein, line_width) + b"*\n")
+
+    return {"path": path, "kind": "proteome", "sequences": int(sequences), "residues": int(lengths.sum()),
+            "bytes": os.path.getsize(path), "seed": seed}
+
+
+def generate_genome(path, contigs=50, contig_length=100000, gc=0.5, seed=0, line_width=80):
+    """Write a synthetic nucleotide FASTA (.gz suffix: gzip) and return its metadata."""
+    rng = np.random.default_rng(seed)
+    p = np.array([(1 - gc) / 2, gc / 2, gc / 2, (1 - gc) / 2])
+    with _open_out(path) as out:
+        for i in range(1, contigs + 1):
+            seq = BASES[rng.choice(4, size=contig_length, p=p)].tobytes()
+            out.write(b">contig_%d\n" % i)
+            out.write(_wrap(seq, line_width) + b"\n")
+
+    return {"path": path, "kind": "genome", "contigs": int(contigs), "bases": int(contigs * contig_length),
+            "bytes": os.path.getsize(path), "seed": seed}
+
+
+def generate_proteome_dir(directory, files=20, gzip_files=False, seed=0, **kwargs):
+    """Write a directory of synthetic proteomes; seeds are seed, seed+1, ..."""
+    os.makedirs(directory, exist_ok=True)
+    suffix = ".faa.gz" if gzip_files else ".faa"
+    metas = [generate_proteome(os.path.join(directory, f"genome_{i:05d}{suffix}"), seed=seed + i, **kwargs)
+             for i in range(files)]
+    return {"path": directory, "kind": "proteome_dir", "files": files,
+            "residues": sum(m["residues"] for m in metas), "bytes": sum(m["bytes"] for m in metas)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic FASTA files for quickARSC benchmarks")
+    sub = parser.add_subparsers(dest="kind", required=True)
+
+    p = sub.add_parser("proteome", help="protein FASTA")
+    p.add_argument("output", help="Output path (.gz suffix: gzip)")
+    p.add_argument("--sequences", type=int, default=4000)
+    p.add_argument("--length-dist", choices=("lognormal", "uniform", "fixed"), default="lognormal")
+    p.add_argument("--length-mean", type=int, default=330)
+    p.add_argument("--length-sd", type=int, default=180)
+    p.add_argument("--invalid-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=0)
+
+    g = sub.add_parser("genome", help="nucleotide FASTA")
+    g.add_argument("output", help="Output path (.gz suffix: gzip)")
+    g.add_argument("--contigs", type=int, default=50)
+    g.add_argument("--contig-length", type=int, default=100000)
+    g.add_argument("--gc", type=float, default=0.5)
+    g.add_argument("--seed", type=int, default=0)
+
+    d = sub.add_parser("proteome-dir", help="directory of protein FASTA files")
+    d.add_argument("output", help="Output directory")
+    d.add_argument("--files", type=int, default=20)
+    d.add_argument("--gzip", action="store_true", help="Write .faa.gz files")
+    d.add_argument("--sequences", type=int, default=4000)
+    d.add_argument("--shared-fraction", type=float, default=0.0, help="Fraction of proteins shared by all files (a pangenome-like collection)")
+    d.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.kind == "proteome":
+        meta = generate_proteome(args.output, args.sequences, args.length_dist, args.length_mean,
+                                 args.length_sd, args.invalid_rate, args.seed)
+    elif args.kind == "genome":
+        meta = generate_genome(args.output, args.contigs, args.contig_length, args.gc, args.seed)
+    else:
+        meta = generate_proteome_dir(args.output, args.files, args.gzip, args.seed, sequences=args.sequences,
+                                     shared_fraction=args.shared_fraction, shared_seed=args.seed + args.files)
+    json.dump(meta, sys.stdout)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python3
+__author__ = 'Satoshi_Nishino'
+__email__ = 'satoshi-nishino@g.ecc.u-tokyo.ac.jp'
+
+
+"""
+This script was created to benchmark quickARSC throughput on synthetic data.
+
+Every scenario runs in a fresh child process so that peak RSS (from wait4) belongs to
+that scenario alone. Linux carries ru_maxrss over fork+exec, so this parent process
+stays small: it does not import ARSC or NumPy and generates data in a child as well.
+Results are written as JSON; pass --compare to print the ratio against an earlier
+result file.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--threads 1 2 4] [-o results.json] [--compare old.json] [--startup-budget 0.5] [--import-budget 0.15]
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+STUB_PRODIGAL_DIR = os.path.join(HERE, "stub_prodigal")
+GENERATE = os.path.join(HERE, "generate.py")
+
+SIZES = {
+    "quick": {"sequences": 2000, "files": 8, "dir_sequences": 500, "contigs": 5, "contig_length": 50000},
+    "full": {"sequences": 50000, "files": 200, "dir_sequences": 3000, "contigs": 50, "contig_length": 100000},
+}
+# Startup budget (s): median wall time of one CLI call on a small protein file
+STARTUP_BUDGET_S = 0.5
+# Import budget (s): median wall time of "import ARSC.main" (interpreter start included)
+IMPORT_BUDGET_S = 0.15
+STARTUP_REPEATS = 5
+# Modules that importing ARSC.main and a small -t 1 run must not load (NumPy alone took ~0.1 s)
+STARTUP_HEAVY_MODULES = ("numpy", "pyarrow", "Bio")
+_PRINT_HEAVY = f"print(json.dumps([m for m in {STARTUP_HEAVY_MODULES!r} if m in sys.modules]))"
+
+
+# --- Child side: run one in-process scenario and print its timings as JSON ---
+def _run_scenario(spec):
+    # ARSC imports NumPy on first use; load it before the clock starts, so that these scenarios
+    # time the counting alone (imports are measured by the startup[...] scenarios)
+    from ARSC.core import process_faa, preload_numpy
+    from ARSC.utils import process_faa_auto, process_fna_pipeline
+    preload_numpy()
+
+    func = spec["func"]
+    item = {"handle": spec["path"], "name": "bench"}
+    kwargs = {"per_sequence": spec.get("per_sequence", False), "backend": spec.get("backend", "bytes")}
+    wall, cpu = time.perf_counter(), time.process_time()
+    if func == "process_faa":
+        result = process_faa(spec["path"], name="bench", **kwargs)
+    elif func == "process_faa_auto":
+        result = process_faa_auto(item, **kwargs)
+    elif func == "process_fna_pipeline":
+        result = process_fna_pipeline(item, **kwargs)
+    else:
+        raise ValueError(f"unknown scenario function: {func}")
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    print(json.dumps({"wall_s": wall, "cpu_s": cpu}))
+
+
+# --- Parent side ---
+def _measure(cmd, env=None):
+    """Run cmd and return stdout, wall time and the peak RSS of that child (MB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+    out = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with status {proc.returncode}")
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return out.decode(), wall, peak
+
+
+def _env_with_stub():
+    env = dict(os.environ)
+    env["PATH"] = STUB_PRODIGAL_DIR + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = REPO + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def generate(kind, path, *options):
+    """Run generate.py in a child process and return its metadata."""
+    out = subprocess.run([sys.executable, GENERATE, kind, path, *map(str, options)],
+                         check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def function_scenario(name, spec, residues, env):
+    out, _, peak = _measure([sys.executable, os.path.abspath(__file__), "--scenario", json.dumps(spec)], env)
+    timing = json.loads(out.strip().splitlines()[-1])
+    return {"name": name, **spec, "residues": residues, "wall_s": timing["wall_s"], "cpu_s": timing["cpu_s"],
+            "residues_per_s": residues / timing["wall_s"], "peak_rss_mb": peak}
+
+
+def cli_scenarios(name, directory, meta, threads_list, env, extra=()):
+    rows = []
+    out_path = os.path.join(os.path.dirname(directory), f"{name}.tsv")
+    for threads in threads_list:
+        cmd = [sys.executable, "-m", "ARSC.main", directory, "-t", str(threads), "-o", out_path, *extra]
+        _, wall, peak = _measure(cmd, env)
+        rows.append({"name": name, "threads": threads, "args": list(extra), "files": meta["files"],
+                     "residues": meta["residues"], "wall_s": wall, "files_per_s": meta["files"] / wall,
+                     "residues_per_s": meta["residues"] / wall, "peak_rss_mb": peak})
+    base = rows[0]["wall_s"] * rows[0]["threads"]
+    for row in rows:
+        row["scaling_efficiency"] = base / (row["wall_s"] * row["threads"])
+    return rows
+
+
+def startup_scenarios(meta, env, budget, import_budget):
+    """Median wall time of importing ARSC.main and of a whole CLI call on one small file.
+
+    Both also report which of STARTUP_HEAVY_MODULES they loaded (last stdout line);
+    loading any of them counts as over budget.
+    """
+    rows = []
+    cli = f"sys.argv = ['arsc', {meta['path']!r}]; runpy.run_module('ARSC.main', run_name='__main__')"
+    commands = (("startup[import]", f"import json, sys, ARSC.main; {_PRINT_HEAVY}", 0, import_budget),
+                ("startup[cli -t 1]", f"import json, sys, runpy; {cli}; {_PRINT_HEAVY}", meta["residues"], budget))
+    for name, code, residues, limit in commands:
+        runs = [_measure([sys.executable, "-c", code], env) for _ in range(STARTUP_REPEATS)]
+        wall = sorted(r[1] for r in runs)[len(runs) // 2]
+        heavy = sorted(set().union(*(json.loads(r[0].strip().splitlines()[-1]) for r in runs)))
+        rows.append({"name": name, "residues": residues, "wall_s": wall, "residues_per_s": residues / wall,
+                     "peak_rss_mb": max(r[2] for r in runs), "budget_s": limit, "heavy_modules": heavy,
+                     "within_budget": wall <= limit and not heavy})
+    return rows
+
+
+def run(args):
+    size = SIZES["quick" if args.quick else "full"]
+    env = _env_with_stub()
+    workdir = tempfile.mkdtemp(prefix="arsc_bench_")
+    results = []
+    try:
+        proteome = ("--sequences", size["sequences"], "--seed", 1, "--invalid-rate", 0.001)
+        genome = ("--contigs", size["contigs"], "--contig-length", size["contig_length"], "--seed", 2)
+        faa = generate("proteome", os.path.join(workdir, "proteome.faa"), *proteome)
+        faa_gz = generate("proteome", os.path.join(workdir, "proteome.faa.gz"), *proteome)
+        fna = generate("genome", os.path.join(workdir, "genome.fna"), *genome)
+        fna_gz = generate("genome", os.path.join(workdir, "genome.fna.gz"), *genome)
+        small = generate("proteome", os.path.join(workdir, "small.faa"), "--sequences", 50, "--seed", 3)
+        pdir = generate("proteome-dir", os.path.join(workdir, "proteomes"),
+                        "--files", size["files"], "--sequences", size["dir_sequences"], "--seed", 100)
+        # Pangenome-like collection: 90% of the proteins are shared by all files
+        rdir = generate("proteome-dir", os.path.join(workdir, "redundant"), "--files", size["files"],
+                        "--sequences", size["dir_sequences"], "--shared-fraction", 0.9, "--seed", 200)
+        # Proteins predicted by the stub: one residue per codon
+        fna_residues = fna["bases"] // 3
+
+        results.extend(startup_scenarios(small, env, args.startup_budget, args.import_budget))
+        for backend in ("bytes", "biopython"):
+            for per_sequence in (False, True):
+                label = f"process_faa[{backend}{',per_sequence' if per_sequence else ''}]"
+                results.append(function_scenario(label, {"func": "process_faa", "path": faa["path"], "backend": backend,
+                                                         "per_sequence": per_sequence}, faa["residues"], env))
+        results.append(function_scenario("process_faa_auto[gz]", {"func": "process_faa_auto", "path": faa_gz["path"]},
+                                         faa_gz["residues"], env))
+        for meta, label in ((fna, "plain"), (fna_gz, "gz")):
+            results.append(function_scenario(f"process_fna_pipeline[{label}]", {"func": "process_fna_pipeline", "path": meta["path"]},
+                                             fna_residues, env))
+        results.extend(cli_scenarios("cli", pdir["path"], pdir, args.threads, env))
+        results.extend(cli_scenarios("cli[-p -a]", pdir["path"], pdir, args.threads, env, ("-p", "-a")))
+        results.extend(cli_scenarios("cli[-p,redundant]", rdir["path"], rdir, args.threads, env, ("-p",)))
+        results.extend(cli_scenarios("cli[-p --memo,redundant]", rdir["path"], rdir, args.threads, env, ("-p", "--memo")))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def report(results, previous=None):
+    prev = {(r["name"], r.get("threads")): r for r in (previous or [])}
+    print(f"{'scenario':<42} {'thr':>3} {'wall_s':>8} {'Mres/s':>8} {'files/s':>8} {'RSS_MB':>8} {'eff':>5} {'vs_prev':>8}")
+    for r in results:
+        old = prev.get((r["name"], r.get("threads")))
+        ratio = f"{old['wall_s'] / r['wall_s']:.2f}x" if old else ""
+        files = f"{r['files_per_s']:.1f}" if "files_per_s" in r else ""
+        eff = f"{r['scaling_efficiency']:.2f}" if "scaling_efficiency" in r else ""
+        if r.get("heavy_modules"):
+            ratio += f"  loads {', '.join(r['heavy_modules'])}"
+        elif not r.get("within_budget", True):
+            ratio += f"  over budget ({r['budget_s']:.2f} s)"
+        print(f"{r['name']:<42} {r.get('threads', ''):>3} {r['wall_s']:>8.3f} {r['residues_per_s'] / 1e6:>8.2f} "
+              f"{files:>8} {r['peak_rss_mb']:>8.1f} {eff:>5} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="quickARSC benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="Small inputs (a few seconds)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="Thread counts for CLI scenarios")
+    parser.add_argument("-o", "--output", help="JSON output (default: benchmarks/results/bench_<version>.json)")
+    parser.add_argument("--compare", help="Earlier JSON result file to compare against")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_S,
+                        help="Startup budget in seconds; the exit status is 1 when a startup scenario exceeds it")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_S,
+                        help="Budget of startup[import] in seconds; startup scenarios that load NumPy (or another "
+                             "heavy module) also set the exit status to 1")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        _run_scenario(json.loads(args.scenario))
+        return
+
+    results = run(args)
+    version = subprocess.run([sys.executable, "-c", "import ARSC; print(ARSC.__version__)"], check=True,
+                             stdout=subprocess.PIPE, env=_env_with_stub()).stdout.decode().strip()
+    previous = None
+    if args.compare:
+        with open(args.compare) as fh:
+            previous = json.load(fh)["results"]
+    report(results, previous)
+
+    output = args.output or os.path.join(HERE, "results", f"bench_{version}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump({"version": version, "python": platform.python_version(), "platform": platform.platform(),
+                   "cpu_count": os.cpu_count(), "quick": args.quick, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "results": results}, fh, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    if not all(r.get("within_budget", True) for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 // Path to the TSV file (relative)
 const TSV_PATH = './data/arsc_gtdb_r226rep.tsv';
+// Binary index built with `arsc index` (loaded first; the TSV is the fallback)
+const INDEX_PATH = './data/arsc_gtdb_r226rep.arscidx';
 
 // Hierarchy levels (top -> bottom)
 const LEVELS = ['domain','phylum','class','order','family','genus'];
@@ -38,8 +40,10 @@ let fastaFileInput = document.getElementById('fastaFile');
 let fastaNameSpan = document.getElementById('fastaName');
 const fastaContainer = document.getElementById('fastaFile') ? document.getElementById('fastaFile').closest('div') : null;
 const origFastaContainerHTML = fastaContainer ? fastaContainer.innerHTML : null;
-let parseWorker = null;
-let userSample = null; // stores last computed FASTA result { filename, N_ARSC, C_ARSC, S_ARSC }
+let parseWorkers = [];
+let userSamples = []; // computed FASTA results { filename, N_ARSC, C_ARSC, S_ARSC, AvgResMW, TotalLength, warning }
+const USER_SAMPLE_COLORS = ['red', '#1f77b4', '#2ca02c', '#9467bd', '#ff7f0e', '#8c564b', '#e377c2', '#17becf'];
+const MAX_PARSE_WORKERS = 4;
 
 function bindFastaElements() {
 	// re-query elements (useful after replacing container innerHTML)
@@ -55,12 +59,17 @@ function bindFastaElements() {
 }
 
 function showUserSampleInfo() {
-	if (!fastaContainer || !userSample) return;
-	let txt = `file: ${userSample.filename}; N-ARSC: ${userSample.N_ARSC.toFixed(5)}; C-ARSC: ${userSample.C_ARSC.toFixed(5)}; S-ARSC: ${userSample.S_ARSC.toFixed(5)}`;
-	let html = `<div style="font-size:0.95rem;color:#222;">${txt}</div>`;
-	if (userSample.warning) {
-		html += `<div style="color:#b33;margin-top:6px;font-size:0.85rem;">⚠ ${userSample.warning.message}</div>`;
-	}
+	if (!fastaContainer || !userSamples.length) return;
+	let html = '';
+	userSamples.forEach((s, i) => {
+		const color = USER_SAMPLE_COLORS[i % USER_SAMPLE_COLORS.length];
+		let txt = `file: ${s.filename}; N-ARSC: ${s.N_ARSC.toFixed(5)}; C-ARSC: ${s.C_ARSC.toFixed(5)}; S-ARSC: ${s.S_ARSC.toFixed(5)}`;
+		if (typeof s.AvgResMW === 'number') txt += `; AvgResMW: ${s.AvgResMW.toFixed(3)}; residues: ${s.TotalLength}`;
+		html += `<div style="font-size:0.95rem;color:#222;"><span style="color:${color};">■</span> ${txt}</div>`;
+		if (s.warning) {
+			html += `<div style="color:#b33;margin-top:6px;font-size:0.85rem;">⚠ ${s.warning.message}</div>`;
+		}
+	});
 	fastaContainer.innerHTML = html;
 }
 
@@ -96,109 +105,144 @@ function removeUserSampleOverlay() {
 	} catch (e) { console.warn(e); }
 }
 
-// add overlay (horizontal dashed line + annotation) for currently stored userSample
+// add overlays (horizontal line + annotation) for the stored userSamples
 function addUserSampleOverlay() {
-	if (!userSample) return;
+	if (!userSamples.length) return;
 	try {
 		const gd = document.getElementById('plot');
 		if (!gd) return;
 		const yFieldCur = (ySelect && ySelect.value) ? ySelect.value : 'N_ARSC';
-		const yValCur = (userSample && userSample[yFieldCur] !== undefined) ? userSample[yFieldCur] : userSample.N_ARSC;
+		const lines = [], anns = [];
+		userSamples.forEach((s, i) => {
+			const color = USER_SAMPLE_COLORS[i % USER_SAMPLE_COLORS.length];
+			const yValCur = (s[yFieldCur] !== undefined) ? s[yFieldCur] : s.N_ARSC;
+			lines.push({ type: 'line', xref: 'paper', x0: 0, x1: 1, yref: 'y', y0: yValCur, y1: yValCur, line: { color, width: 2 }, _userSample: true });
+			anns.push({ xref: 'paper', x: 0.99, xanchor: 'right', yref: 'y', y: yValCur, text: `${s.filename} — ${displayLabel(yFieldCur)}: ${yValCur.toFixed(5)}`, bgcolor: '#fff8', bordercolor: color, font: { color: '#800', size: 12 }, _userSample: true });
+		});
 		const existingShapes = (gd.layout && gd.layout.shapes) ? gd.layout.shapes.slice() : [];
-		const line = { type: 'line', xref: 'paper', x0: 0, x1: 1, yref: 'y', y0: yValCur, y1: yValCur, line: { color: 'red', width: 2 }, _userSample: true };
-		Plotly.relayout('plot', { shapes: existingShapes.concat([line]) });
 		const existingAnns = (gd.layout && gd.layout.annotations) ? gd.layout.annotations.slice() : [];
-		const ann = { xref: 'paper', x: 0.99, xanchor: 'right', yref: 'y', y: yValCur, text: `${userSample.filename} — ${displayLabel(yFieldCur)}: ${yValCur.toFixed(5)}`, bgcolor: '#fff8', bordercolor: '#ff3333', font: { color: '#800', size: 12 }, _userSample: true };
-		Plotly.relayout('plot', { annotations: existingAnns.concat([ann]) });
+		Plotly.relayout('plot', { shapes: existingShapes.concat(lines), annotations: existingAnns.concat(anns) });
 	} catch (e) { console.warn(e); }
 }
 
-// handle file selection
+function terminateParseWorkers() {
+	parseWorkers.forEach(w => { try { w.terminate(); } catch (e) {} });
+	parseWorkers = [];
+}
+
+// handle file selection: files are streamed (plain or gzip) by a small pool of workers
 function handleFastaFileChange(ev) {
-	const f = ev.target.files && ev.target.files[0];
-	if (!f) return;
+	const all = Array.from((ev.target.files) || []);
+	if (!all.length) return;
 
-	// validate extension early to avoid unnecessary parsing
+	// validate extensions early to avoid unnecessary parsing
 	const allowedExts = ['.fa', '.faa', '.fasta'];
-	const nameLower = (f.name || '').toLowerCase();
-	if (!allowedExts.some(ext => nameLower.endsWith(ext))) {
-		try { alert('Unsupported file type. Please upload a .fa, .faa or .fasta file.'); } catch (e) {}
+	const isAllowed = f => {
+		const nameLower = (f.name || '').toLowerCase().replace(/\.gz$/, '');
+		return allowedExts.some(ext => nameLower.endsWith(ext));
+	};
+	const files = all.filter(isAllowed);
+	const rejected = all.filter(f => !isAllowed(f));
+	if (rejected.length) {
+		try { alert(`Unsupported file type: ${rejected.map(f => f.name).join(', ')}. Please upload .fa, .faa or .fasta files (optionally .gz).`); } catch (e) {}
+	}
+	if (!files.length) {
 		// clear input so user can try again
 		if (fastaFileInput) { try { fastaFileInput.value = ''; } catch (e) {} }
 		if (fastaNameSpan) fastaNameSpan.textContent = '';
 		return;
 	}
-	if (fastaNameSpan) fastaNameSpan.textContent = `${f.name} (${(f.size/1024).toFixed(1)} KB)`;
-	const MAX_BYTES = 10 * 1024 * 1024; // 10MB
-	if (f.size > MAX_BYTES) {
-		const ok = confirm('File seems large (>10MB). Continue parsing in browser? Recommended: use smaller file. Continue?');
-		if (!ok) return;
+	const totalBytes = files.reduce((a, f) => a + f.size, 0);
+	if (fastaNameSpan) {
+		fastaNameSpan.textContent = files.length === 1 ? `${files[0].name} (${(files[0].size/1024).toFixed(1)} KB)` : `${files.length} files (${(totalBytes/1024).toFixed(1)} KB)`;
 	}
-	// read as text and spawn worker
-	const reader = new FileReader();
-	reader.onload = function(e) {
-		const text = e.target.result;
-		// start worker
-		if (parseWorker) {
-			parseWorker.terminate();
-			parseWorker = null;
+
+	terminateParseWorkers();
+	const results = new Array(files.length).fill(null);
+	const readBytes = new Array(files.length).fill(0);
+	let next = 0, finished = 0;
+	const showProgress = () => {
+		if (!loadingEl) return;
+		const pct = totalBytes ? Math.floor(100 * readBytes.reduce((a, b) => a + b, 0) / totalBytes) : 100;
+		loadingEl.textContent = files.length === 1 ? `Parsing FASTA... ${pct}%` : `Parsing FASTA... ${finished}/${files.length} files (${pct}%)`;
+	};
+	if (loadingEl) loadingEl.style.display = 'inline-block';
+	showProgress();
+
+	const finish = () => {
+		terminateParseWorkers();
+		if (loadingEl) loadingEl.style.display = 'none';
+		// keep the selection order
+		const samples = results.filter(r => r);
+		if (!samples.length) {
+			if (fastaFileInput) { try { fastaFileInput.value = ''; } catch (e) {} }
+			if (fastaNameSpan) fastaNameSpan.textContent = '';
+			return;
 		}
-		parseWorker = new Worker('js/arsc_worker.js');
-		if (loadingEl) { loadingEl.style.display = 'inline-block'; loadingEl.textContent = 'Parsing FASTA...'; }
-		parseWorker.onmessage = function(me) {
-			const m = me.data;
-			if (!m || !m.type) return;
-			if (m.type === 'result') {
-				if (loadingEl) loadingEl.style.display = 'none';
-				// Handle warnings from worker: strong check for nucleotide-like input
-				if (m.warning && m.warning.type === 'nucleotide_detected') {
-					// prompt user: proceed or cancel
-					let proceed = false;
-					try {
-						proceed = confirm(
-							"⚠️ Warning: Uploaded sequence looks like DNA/RNA (mostly A/T/G/C/U/N). Results may be incorrect.\n" +
-							"Do you want to continue? (OK = continue, Cancel = cancel)"
-						);
-					} catch (e) { proceed = false; }
-					if (!proceed) {
-						// user cancelled: stop processing and reset file input
-						if (loadingEl) loadingEl.style.display = 'none';
-						try { parseWorker.terminate(); } catch (e) {}
-						parseWorker = null;
-						if (fastaFileInput) { try { fastaFileInput.value = ''; } catch (e) {} }
-						if (fastaNameSpan) fastaNameSpan.textContent = '';
-						// leave userSample unchanged (do not store)
-						return;
-					}
-				}
-				// store the computed sample so it persists across plot redraws
-				userSample = {
+		// store the computed samples so they persist across plot redraws
+		userSamples = samples;
+		// replace the input UI with summary info
+		showUserSampleInfo();
+		// update the plot (drawPlot will re-apply overlays)
+		try { update(); } catch (err) { /* ignore */ }
+	};
+
+	const dispatch = worker => {
+		if (next >= files.length) return;
+		const id = next++;
+		worker.postMessage({ type: 'parse', id, file: files[id], filename: files[id].name });
+	};
+
+	const onMessage = function(me) {
+		const m = me.data;
+		if (!m || !m.type) return;
+		if (m.type === 'progress') {
+			readBytes[m.id] = m.bytes;
+			showProgress();
+			return;
+		}
+		if (m.type === 'result') {
+			let keep = true;
+			// Handle warnings from worker: strong check for nucleotide-like input
+			if (m.warning && m.warning.type === 'nucleotide_detected') {
+				// prompt user: keep this file or drop it
+				try {
+					keep = confirm(
+						`⚠️ Warning: ${m.filename} looks like DNA/RNA (mostly A/T/G/C/U/N). Results may be incorrect.\n` +
+						"Do you want to continue? (OK = continue, Cancel = skip this file)"
+					);
+				} catch (e) { keep = false; }
+			} else if (m.warning && m.warning.type === 'unknown_residues' && files.length === 1) {
+				// for non-nucleotide warnings (unknown residues), show a note (listed in the summary for several files)
+				try { alert(`Warning (${m.filename}): ${m.warning.message}`); } catch (e) {}
+			}
+			if (keep) {
+				results[m.id] = {
 					filename: m.filename || 'uploaded',
-					N_ARSC: typeof m.N_ARSC === 'number' ? m.N_ARSC : parseFloat(m.N_ARSC),
-					C_ARSC: typeof m.C_ARSC === 'number' ? m.C_ARSC : parseFloat(m.C_ARSC),
-					S_ARSC: typeof m.S_ARSC === 'number' ? m.S_ARSC : parseFloat(m.S_ARSC),
+					N_ARSC: m.N_ARSC, C_ARSC: m.C_ARSC, S_ARSC: m.S_ARSC,
+					AvgResMW: m.AvgResMW, TotalLength: m.TotalLength,
 					warning: m.warning || null
 				};
-				// for non-nucleotide warnings (unknown residues), show a note
-				if (m.warning && m.warning.type === 'unknown_residues') {
-					try { alert(`Warning: ${m.warning.message}`); } catch (e) {}
-				}
-				// replace the input UI with summary info
-				showUserSampleInfo();
-				// update the plot (drawPlot will re-apply overlays)
-				try { update(); } catch (err) { /* ignore */ }
-				// terminate worker
-				parseWorker.terminate(); parseWorker = null;
-			} else if (m.type === 'error') {
-				if (loadingEl) loadingEl.style.display = 'none';
-				alert('Error parsing FASTA: ' + m.message);
-				parseWorker.terminate(); parseWorker = null;
 			}
-		};
-		parseWorker.postMessage({ type: 'parse', text, filename: f.name });
+		} else if (m.type === 'error') {
+			alert(`Error parsing FASTA (${m.filename}): ${m.message}`);
+		} else {
+			return;
+		}
+		readBytes[m.id] = files[m.id].size;
+		finished++;
+		showProgress();
+		if (finished === files.length) finish();
+		else dispatch(this);
 	};
-	reader.onerror = function(err) { alert('Failed to read file: ' + err); };
-	reader.readAsText(f);
+
+	const poolSize = Math.min(files.length, navigator.hardwareConcurrency || 2, MAX_PARSE_WORKERS);
+	for (let i = 0; i < poolSize; i++) {
+		const worker = new Worker('js/arsc_worker.js');
+		worker.onmessage = onMessage;
+		parseWorkers.push(worker);
+		dispatch(worker);
+	}
 }
 
 // bind elements initially
@@ -216,6 +260,7 @@ if (markerSizeInput && markerSizeVal) {
 
 let rows = []; // parsed data
 let header = []; // TSV header
+let index = null; // binary index (rows in lineage order, taxa as row ranges), when loaded
 
 // Display label mapping for ARSC fields
 function displayLabel(field) {
@@ -254,6 +299,89 @@ function parseTSV(text) {
 	return { header, data };
 }
 
+// Load the binary index: typed-array views on one ArrayBuffer (layout: ARSC/webindex.py)
+async function loadIndex(path) {
+	const r = await fetch(path);
+	if (!r.ok) throw new Error('Failed to fetch index: ' + r.status);
+	let buf = await r.arrayBuffer();
+	const head = new Uint8Array(buf, 0, 2);
+	if (head[0] === 0x1f && head[1] === 0x8b) {
+		// gzip file served without Content-Encoding: decompress here
+		buf = await new Response(new Blob([buf]).stream().pipeThrough(new DecompressionStream('gzip'))).arrayBuffer();
+	}
+	const decoder = new TextDecoder();
+	if (decoder.decode(new Uint8Array(buf, 0, 8)) !== 'ARSCIDX1') throw new Error('Not an ARSC index: ' + path);
+	const headerLen = new DataView(buf).getUint32(8, true);
+	const meta = JSON.parse(decoder.decode(new Uint8Array(buf, 12, headerLen)));
+	const body = 12 + headerLen;
+	const types = { float32: Float32Array, float64: Float64Array, uint32: Uint32Array, uint16: Uint16Array, uint8: Uint8Array };
+	const view = s => new types[s.dtype](buf, body + s.offset, s.count);
+	const idx = { rows: meta.rows, header: meta.header, id: meta.id, columns: {}, strings: {}, ranks: {} };
+	meta.columns.forEach(c => { idx.columns[c.name] = view(c); });
+	meta.strings.forEach(s => {
+		const offsets = view(s.offsets);
+		const data = view(s.data);
+		idx.strings[s.name] = i => decoder.decode(data.subarray(offsets[i], offsets[i + 1]));
+	});
+	meta.ranks.forEach(rk => { idx.ranks[rk.name] = { values: rk.values, codes: view(rk.codes), starts: view(rk.starts) }; });
+	return idx;
+}
+
+// Rows backed by the index: each row holds its index and reads fields from the typed arrays on access
+function rowsFromIndex(idx) {
+	function IndexRow(i) { this.rowIndex = i; }
+	const define = (name, get) => Object.defineProperty(IndexRow.prototype, name, { get, enumerable: true });
+	Object.keys(idx.ranks).forEach(k => {
+		const rk = idx.ranks[k];
+		define(k, function () { return rk.values[rk.codes[this.rowIndex]]; });
+	});
+	Object.keys(idx.strings).forEach(k => {
+		const get = idx.strings[k];
+		define(k, function () { return get(this.rowIndex); });
+	});
+	Object.keys(idx.columns).forEach(k => {
+		let c = idx.columns[k];
+		if (c instanceof Float32Array) {
+			// float32 -> 7 significant digits (0.36432 rather than 0.36431998014450073)
+			const out = new Float64Array(c.length);
+			for (let i = 0; i < c.length; i++) {
+				const v = c[i];
+				if (v === 0 || !isFinite(v)) { out[i] = v; continue; }
+				const scale = 10 ** (6 - Math.floor(Math.log10(Math.abs(v))));
+				out[i] = Math.round(v * scale) / scale;
+			}
+			c = out;
+		}
+		define(k, function () { return c[this.rowIndex]; });
+	});
+	const data = new Array(idx.rows);
+	for (let i = 0; i < idx.rows; i++) data[i] = new IndexRow(i);
+	return data;
+}
+
+// Row ranges [start, end) matching taxonomy filters, by offset lookup (null if a level is not indexed)
+function indexRanges(filters) {
+	let ranges = [[0, index.rows]];
+	for (const level of LEVELS) {
+		const v = filters[level];
+		if (!v) continue;
+		const rk = index.ranks[level];
+		if (!rk) return null;
+		// the taxa of this level inside a range are consecutive codes; the same name can occur
+		// under several parents when a level in between is not filtered, so keep every match
+		const next = [];
+		for (const [start, end] of ranges) {
+			if (start >= end) continue;
+			for (let c = rk.codes[start]; c <= rk.codes[end - 1]; c++) {
+				if (rk.values[c] === v) next.push([rk.starts[c], rk.starts[c + 1]]);
+			}
+		}
+		ranges = next;
+		if (!ranges.length) break;
+	}
+	return ranges;
+}
+
 // Populate select options with unique sorted values
 function populateSelects(data) {
 	const fields = ['domain','phylum','class','order','family','genus'];
@@ -280,6 +408,11 @@ function getFilters() {
 			function filterData(rows, filters) {
 				const yField = ySelect && ySelect.value ? ySelect.value : 'N_ARSC';
 				const xField = 'GC(%)';
+				const ranges = index ? indexRanges(filters) : null;
+				if (ranges) {
+					// taxonomy filters already applied by the row ranges
+					return ranges.flatMap(([start, end]) => rows.slice(start, end)).filter(r => !isNaN(r[xField]) && !isNaN(r[yField]));
+				}
 				return rows.filter(r => {
 					for (const k in filters) {
 						if (!r[k] || r[k] !== filters[k]) return false;
@@ -359,8 +492,8 @@ function getFilters() {
 		// Re-attach click handler after plot recreation
 		setupPlotClickHandler();
 		
-		// if a user sample exists, re-apply its overlay after the main plot redraw
-		if (userSample) addUserSampleOverlay();
+		// if user samples exist, re-apply their overlays after the main plot redraw
+		if (userSamples.length) addUserSampleOverlay();
 	}// Show modal with copyable data
 function showDataModal(row, xField, yField) {
 	// Build formatted text content
@@ -546,6 +679,19 @@ function availableOptionsForLevel(level) {
 		const v = selects[a].value;
 		if (v) ancestorFilters[a] = v;
 	}
+	const ranges = index && index.ranks[level] ? indexRanges(ancestorFilters) : null;
+	if (ranges) {
+		// taxa of this level within the ancestors' rows: codes[start]..codes[end - 1] of each range
+		const rk = index.ranks[level];
+		const names = new Set();
+		for (const [start, end] of ranges) {
+			if (start >= end) continue;
+			for (let c = rk.codes[start]; c <= rk.codes[end - 1]; c++) {
+				if (rk.values[c]) names.add(rk.values[c]);
+			}
+		}
+		return Array.from(names).sort();
+	}
 	const set = new Set();
 	rows.forEach(r => {
 		let ok = true;
@@ -583,6 +729,21 @@ function refreshAllOptions() {
 	});
 }
 
+// First row whose level equals val and that has a parentLevel value
+function findRowWith(level, val, parentLevel) {
+	const rk = index && index.ranks[level];
+	if (rk) {
+		// rows of each taxon start at starts[code]
+		for (let c = 0; c < rk.values.length; c++) {
+			if (rk.values[c] !== val) continue;
+			const row = rows[rk.starts[c]];
+			if (row[parentLevel]) return row;
+		}
+		return undefined;
+	}
+	return rows.find(r => r[level] === val && r[parentLevel]);
+}
+
 // When a lower-level select is changed, set its parents automatically when possible
 function setParentsFromChild(chLevel) {
 	// Start from the changed child level and walk upwards setting parents
@@ -595,7 +756,7 @@ function setParentsFromChild(chLevel) {
 	for (let i = chIdx - 1; i >= 0; i--) {
 		const parentLevel = LEVELS[i];
 		// find a row where the current level's value matches curVal and a parent exists
-		const row = rows.find(r => r[curLevel] === curVal && r[parentLevel]);
+		const row = findRowWith(curLevel, curVal, parentLevel);
 		if (row) {
 			selects[parentLevel].value = row[parentLevel];
 			// move up: parent becomes the current level for next iteration
@@ -706,8 +867,10 @@ resetBtn.addEventListener('click', () => {
 	if (markerSizeVal) markerSizeVal.textContent = '8';
 	if (markerAlphaInput) markerAlphaInput.value = 1.0;
 	if (markerAlphaVal) markerAlphaVal.textContent = '1.00';
-	// clear stored user sample and input UI as part of reset
-	userSample = null;
+	// clear stored user samples, running parses and input UI as part of reset
+	terminateParseWorkers();
+	if (loadingEl) loadingEl.style.display = 'none';
+	userSamples = [];
 	removeUserSampleOverlay();
 	// restore the original upload UI and clear any displayed filename/text
 	restoreFastaContainer();
@@ -723,11 +886,17 @@ try {
 	if (loadingEl) loadingEl.style.display = 'inline-block';
 } catch (e) { /* ignore */ }
 
-fetch(TSV_PATH).then(r => {
-	if (!r.ok) throw new Error('Failed to fetch TSV: ' + r.status);
-	return r.text();
-}).then(text => {
-	const parsed = parseTSV(text);
+loadIndex(INDEX_PATH).then(idx => {
+	index = idx;
+	return { header: idx.header, data: rowsFromIndex(idx) };
+}).catch(err => {
+	// no index: parse the TSV
+	index = null;
+	return fetch(TSV_PATH).then(r => {
+		if (!r.ok) throw new Error('Failed to fetch TSV: ' + r.status);
+		return r.text();
+	}).then(parseTSV);
+}).then(parsed => {
 	header = parsed.header;
 	rows = parsed.data;
 	// initial population: set full option lists
@@ -1,126 +1,175 @@
-// Worker to parse FASTA text and compute N/C/S-ARSC per residue (fast version)
-// Receives: { type: 'parse', text: string, filename: string }
-// Posts messages: { type: 'result', filename, N_ARSC, C_ARSC, S_ARSC, warning? } or { type: 'error', message }
-
-// --- 高速化のためのルックアップテーブル（ASCII 0-127） ---
-const TABLE_N = new Int8Array(128).fill(-1);
-const TABLE_C = new Int8Array(128).fill(-1);
-const TABLE_S = new Int8Array(128).fill(-1);
-const TABLE_IS_NUC = new Int8Array(128).fill(0); // table to quickly test whether a character is a nucleotide (A,T,G,C,U,N)
-
+// Worker to stream a FASTA file (plain or gzip) and compute N/C/S-ARSC and AvgResMW as ARSC.core.process_faa does
+// Receives: { type: 'parse', id, file: File|Blob, filename } (or { type: 'parse', id, text, filename })
+// Posts messages:
+//   { type: 'progress', id, filename, bytes, total }
+//   { type: 'result', id, filename, N_ARSC, C_ARSC, S_ARSC, AvgResMW, TotalLength, records, warning? }
+//   { type: 'error', id, filename, message }
+
+// --- 高速化のためのルックアップテーブル（バイト値 0-255） ---
+// Residues in the order of ARSC.core.RESIDUES (aa_dictionary), with the same weights
+const RESIDUES = 'KRHDENQSTYAVLIPFMWGCUJBZ';
 const RESIDUE_DATA = {
-  A: { N:0, C:1, S:0 }, R: { N:3, C:4, S:0 }, N: { N:1, C:2, S:0 },
-  D: { N:0, C:2, S:0 }, C: { N:0, C:1, S:1 }, Q: { N:1, C:3, S:0 },
-  E: { N:0, C:3, S:0 }, G: { N:0, C:0, S:0 }, H: { N:2, C:4, S:0 },
-  I: { N:0, C:4, S:0 }, L: { N:0, C:4, S:0 }, K: { N:1, C:4, S:0 },
-  M: { N:0, C:3, S:1 }, F: { N:0, C:7, S:0 }, P: { N:0, C:3, S:0 },
-  S: { N:0, C:1, S:0 }, T: { N:0, C:2, S:0 }, W: { N:1, C:9, S:0 },
-  Y: { N:0, C:7, S:0 }, V: { N:0, C:3, S:0 }
+  K: { N:1, C:4, S:0, MW:146.1882 }, R: { N:3, C:4, S:0, MW:174.2017 }, H: { N:2, C:4, S:0, MW:155.1552 },
+  D: { N:0, C:2, S:0, MW:133.1032 }, E: { N:0, C:3, S:0, MW:147.1299 }, N: { N:1, C:2, S:0, MW:132.1184 },
+  Q: { N:1, C:3, S:0, MW:146.1451 }, S: { N:0, C:1, S:0, MW:105.0930 }, T: { N:0, C:2, S:0, MW:119.1197 },
+  Y: { N:0, C:7, S:0, MW:181.1894 }, A: { N:0, C:1, S:0, MW:89.0935 },  V: { N:0, C:3, S:0, MW:117.1469 },
+  L: { N:0, C:4, S:0, MW:131.1736 }, I: { N:0, C:4, S:0, MW:131.1736 }, P: { N:0, C:3, S:0, MW:115.1310 },
+  F: { N:0, C:7, S:0, MW:165.1900 }, M: { N:0, C:3, S:1, MW:149.2124 }, W: { N:1, C:9, S:0, MW:204.2262 },
+  G: { N:0, C:0, S:0, MW:75.0669 },  C: { N:0, C:1, S:1, MW:121.1590 }, U: { N:0, C:1, S:0, MW:168.07 },
+  J: { N:0, C:4, S:0, MW:131.1736 }, B: { N:0.5, C:2, S:0, MW:132.6108 }, Z: { N:0.5, C:3, S:0, MW:146.6375 }
 };
 
-// initialize tables for both upper and lower case ASCII
-for (const [aa, counts] of Object.entries(RESIDUE_DATA)) {
-  const up = aa.charCodeAt(0);
-  const lo = aa.toLowerCase().charCodeAt(0);
-  TABLE_N[up] = counts.N; TABLE_N[lo] = counts.N;
-  TABLE_C[up] = counts.C; TABLE_C[lo] = counts.C;
-  TABLE_S[up] = counts.S; TABLE_S[lo] = counts.S;
+// byte -> residue index (either case), DELETED for '*' and whitespace, UNKNOWN otherwise
+const UNKNOWN = -1, DELETED = -2;
+const RESIDUE_INDEX = new Int8Array(256).fill(UNKNOWN);
+for (let j = 0; j < RESIDUES.length; j++) {
+  RESIDUE_INDEX[RESIDUES.charCodeAt(j)] = j;
+  RESIDUE_INDEX[RESIDUES.toLowerCase().charCodeAt(j)] = j;
 }
+for (const ch of '* \t\r\n\v\f') RESIDUE_INDEX[ch.charCodeAt(0)] = DELETED;
+
+// nucleotide characters (A,T,G,C,U,N) for upper and lower case
+const TABLE_IS_NUC = new Uint8Array(256);
+for (const ch of 'ATGCUNatgcun') TABLE_IS_NUC[ch.charCodeAt(0)] = 1;
+
+// lines starting with these are comments (as in Biopython's "fasta-blast" parser)
+const IS_COMMENT = new Uint8Array(256);
+for (const ch of '#!;') IS_COMMENT[ch.charCodeAt(0)] = 1;
+
+// Streaming counter: feed Uint8Array chunks in order; header/comment/line state carries across chunks
+class FastaCounter {
+  constructor() {
+    this.counts = new Float64Array(RESIDUES.length);
+    this.order = [];            // residue indices by first appearance (MW is summed in this order)
+    this.total = 0;             // retained characters, unknown ones included (TotalLength)
+    this.records = 0;
+    this.unknown = new Uint8Array(256);
+    this.nucleotides = 0;       // A/T/G/C/U/N among retained characters (nucleotide warning)
+    this.lineStart = true;
+    this.skipLine = false;      // inside a header or comment line
+    this.preamble = true;       // before the first header: only comment lines are allowed
+  }
 
-// define nucleotide characters (A,T,G,C,U,N) for upper and lower case
-['A','T','G','C','U','N'].forEach(ch => {
-  const up = ch.charCodeAt(0);
-  const lo = ch.toLowerCase().charCodeAt(0);
-  TABLE_IS_NUC[up] = 1;
-  TABLE_IS_NUC[lo] = 1;
-});
-
-function parseFASTAandComputeFast(text) {
-  let totalResidues = 0;
-  let N_total = 0, C_total = 0, S_total = 0;
-  let unknownCount = 0;
-  // nucleotide detection counters
-  let validCharCount = 0; // count of header-excluded valid characters considered
-  let nucleotideMatchCount = 0; // count of characters matching A/T/G/C/U/N
-
-  // 不明な文字の種類を記録（ASCII範囲）
-  const unknownFlags = new Uint8Array(128);
-
-  const len = text.length;
-  let isHeader = false;
-
-  for (let i = 0; i < len; i++) {
-    const code = text.charCodeAt(i);
-
-    // 改行処理
-    if (code === 10 || code === 13) { isHeader = false; continue; }
-    if (isHeader) continue;
-    if (code === 62) { isHeader = true; continue; } // '>'
-
-    // ASCII 範囲外の文字コードは無視
-    if (code > 127) continue;
-    // 制御文字や空白、数字なども無視
-    if (code < 65) continue;
-
-    // count this as a valid (non-control, non-header) character for nucleotide detection
-    validCharCount++;
-    if (TABLE_IS_NUC[code] === 1) nucleotideMatchCount++;
-
-    const n = TABLE_N[code];
-    if (n !== -1) {
-      totalResidues++;
-      N_total += n;
-      C_total += TABLE_C[code];
-      S_total += TABLE_S[code];
-    } else {
-      // 定義されていない文字（かつ code >= 65）の場合、アルファベットのみを警告対象にする
-      if ((code >= 65 && code <= 90) || (code >= 97 && code <= 122)) {
-        unknownCount++;
-        unknownFlags[code] = 1;
+  update(bytes) {
+    const counts = this.counts, unknown = this.unknown;
+    let total = this.total, nucleotides = this.nucleotides;
+    let lineStart = this.lineStart, skipLine = this.skipLine;
+    for (let i = 0, len = bytes.length; i < len; i++) {
+      const b = bytes[i];
+      if (lineStart) {
+        lineStart = false;
+        if (b === 62) { skipLine = true; this.records++; this.preamble = false; continue; } // '>'
+        if (IS_COMMENT[b]) { skipLine = true; continue; }
+        if (this.preamble) { this.preambleError(bytes, i); }
+      }
+      if (b === 10) { lineStart = true; skipLine = false; continue; }
+      if (skipLine) continue;
+      const j = RESIDUE_INDEX[b];
+      if (j === DELETED) continue;
+      total++;
+      nucleotides += TABLE_IS_NUC[b];
+      if (j >= 0) {
+        if (counts[j] === 0) this.order.push(j);
+        counts[j]++;
+      } else {
+        // 大文字に揃えて記録（Python 側は大文字化してから判定する）
+        unknown[b >= 97 && b <= 122 ? b - 32 : b] = 1;
       }
     }
+    this.total = total;
+    this.nucleotides = nucleotides;
+    this.lineStart = lineStart;
+    this.skipLine = skipLine;
   }
 
-  if (totalResidues === 0) {
-    throw new Error('No valid residues found.');
+  preambleError(bytes, i) {
+    let end = i;
+    while (end < bytes.length && bytes[end] !== 10) end++;
+    const line = new TextDecoder().decode(bytes.subarray(i, end));
+    throw new Error(`Expected FASTA record starting with '>' character.\nGot: '${line}'`);
   }
 
-  let warning = null;
-  // nucleotide-detection: if >=98% of valid characters are A/T/G/C/U/N, treat as likely nucleotide sequence
-  if (validCharCount > 0) {
-    const ratio = nucleotideMatchCount / validCharCount;
-    if (ratio > 0.95) {
+  result() {
+    if (this.total === 0) throw new Error('No valid residues found.');
+    // same summation order as compute_ARSC_from_vector: N/C/S over RESIDUES, MW by first appearance
+    let N = 0, C = 0, S = 0, MW = 0;
+    for (let j = 0; j < RESIDUES.length; j++) {
+      const w = RESIDUE_DATA[RESIDUES[j]];
+      N += this.counts[j] * w.N;
+      C += this.counts[j] * w.C;
+      S += this.counts[j] * w.S;
+    }
+    for (const j of this.order) MW += this.counts[j] * RESIDUE_DATA[RESIDUES[j]].MW;
+
+    let warning = null;
+    // nucleotide-detection: if >95% of retained characters are A/T/G/C/U/N, treat as likely nucleotide sequence
+    if (this.nucleotides / this.total > 0.95) {
       warning = {
         type: 'nucleotide_detected',
         message: 'Caution: The input appears to be DNA/RNA (mostly A,T,G,C,U or N). This tool expects amino-acid sequences; results may be meaningless.'
       };
     }
+    const residues = this.counts.reduce((a, b) => a + b, 0);
+    if (!warning && residues < this.total) {
+      const foundChars = [];
+      for (let c = 0; c < 256; c++) if (this.unknown[c] === 1) foundChars.push(String.fromCharCode(c));
+      const count = this.total - residues;
+      warning = { type: 'unknown_residues', count, chars: foundChars, message: `Counted ${count} unknown character(s) in the length only: ${foundChars.join(', ')}` };
+    }
+    return {
+      N_ARSC: N / this.total,
+      C_ARSC: C / this.total,
+      S_ARSC: S / this.total,
+      AvgResMW: MW / this.total,
+      TotalLength: this.total,
+      records: this.records,
+      warning
+    };
   }
-  // if not flagged as nucleotide, fall back to unknown-residue warning
-  if (!warning && unknownCount > 0) {
-    const foundChars = [];
-    for (let c = 0; c < 128; c++) if (unknownFlags[c] === 1) foundChars.push(String.fromCharCode(c));
-    warning = { type: 'unknown_residues', count: unknownCount, chars: foundChars, message: `Excluded ${unknownCount} unknown residue(s): ${foundChars.join(', ')}` };
-  }
+}
 
-  return {
-    N_ARSC: N_total / totalResidues,
-    C_ARSC: C_total / totalResidues,
-    S_ARSC: S_total / totalResidues,
-    totalResidues,
-    warning
-  };
+async function isGzip(blob) {
+  const head = new Uint8Array(await blob.slice(0, 2).arrayBuffer());
+  return head.length === 2 && head[0] === 0x1f && head[1] === 0x8b;
+}
+
+// Stream the file in chunks (decompressing gzip), counting as bytes arrive
+async function countFile(msg) {
+  const file = msg.file || new Blob([msg.text || '']);
+  const total = file.size;
+  let read = 0, lastPost = 0;
+  // count compressed bytes before decompression for progress
+  let stream = file.stream().pipeThrough(new TransformStream({
+    transform(chunk, controller) {
+      read += chunk.length;
+      const now = Date.now();
+      if (now - lastPost > 100) {
+        lastPost = now;
+        postMessage({ type: 'progress', id: msg.id, filename: msg.filename, bytes: read, total });
+      }
+      controller.enqueue(chunk);
+    }
+  }));
+  if (await isGzip(file)) stream = stream.pipeThrough(new DecompressionStream('gzip'));
+
+  const counter = new FastaCounter();
+  const reader = stream.getReader();
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    counter.update(value);
+  }
+  postMessage({ type: 'progress', id: msg.id, filename: msg.filename, bytes: total, total });
+  return counter.result();
 }
 
 onmessage = function(ev) {
   const msg = ev.data;
   if (!msg || msg.type !== 'parse') return;
-  try {
-    const text = msg.text || '';
-    const res = parseFASTAandComputeFast(text);
-    // Use underscore keys to match main thread expectations (N_ARSC, C_ARSC, S_ARSC)
-    postMessage({ type: 'result', filename: msg.filename || 'uploaded', N_ARSC: res.N_ARSC, C_ARSC: res.C_ARSC, S_ARSC: res.S_ARSC, warning: res.warning });
-  } catch (err) {
-    postMessage({ type: 'error', message: err.message || String(err) });
-  }
+  const filename = msg.filename || (msg.file && msg.file.name) || 'uploaded';
+  countFile(Object.assign({}, msg, { filename })).then(res => {
+    postMessage(Object.assign({ type: 'result', id: msg.id, filename }, res));
+  }).catch(err => {
+    postMessage({ type: 'error', id: msg.id, filename, message: err.message || String(err) });
+  });
 };
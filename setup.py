@@ -7,7 +7,12 @@ setup(
     name="arsc",
     version="0.5.1",
     packages=find_packages(),
-    install_requires=["biopython>=1.79"],
+    install_requires=["biopython>=1.79", "numpy"],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "zstd": ["zstandard"],
+        "brotli": ["brotli"],
+    },
     long_description=long_description,
     long_description_content_type="text/markdown",
     entry_points={
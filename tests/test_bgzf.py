@@ -0,0 +1,51 @@
+import gzip
+import struct
+import zlib
+
+import pytest
+
+from ARSC.core import merge_faa_partials, process_faa
+from ARSC.utils import BGZF_MAGIC, is_bgzf, process_faa_range, split_fasta_ranges
+
+RECORDS = b"".join(b">seq%d\n%s\n" % (i, b"MKRHDENQSTYAVLIPFWGC"[i % 7:] * (3 + i % 5)) for i in range(200))
+
+
+def bgzf_block(data, extra=b""):
+    """One BGZF block; extra: FEXTRA subfields written before 'BC'."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    xlen = len(extra) + 6
+    bsize = 12 + xlen + len(cdata) + 8 - 1
+    header = BGZF_MAGIC + b"\0\0\0\0\0\xff" + struct.pack("<H", xlen) + extra + b"BC" + struct.pack("<HH", 2, bsize)
+    return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def write_bgzf(path, data, extra=b"", block_size=700):
+    blocks = [bgzf_block(data[i:i + block_size], extra) for i in range(0, len(data), block_size)]
+    path.write_bytes(b"".join(blocks) + bgzf_block(b"", extra))
+
+
+@pytest.mark.parametrize("extra", [b"", b"XY" + struct.pack("<H", 3) + b"abc"])
+def test_split_bgzf_matches_plain(tmp_path, extra):
+    path = tmp_path / "split.faa.gz"
+    write_bgzf(path, RECORDS, extra)
+    assert gzip.decompress(path.read_bytes()) == RECORDS
+    assert is_bgzf(str(path))
+
+    ranges = split_fasta_ranges(str(path), 1500)
+    assert len(ranges) > 2
+    partials = [process_faa_range({"handle": str(path), "name": "split", "range": r, "part": (i, len(ranges)), "bgzf": True})
+                for i, r in enumerate(ranges)]
+    merged = merge_faa_partials("split", partials)
+
+    plain = tmp_path / "split.faa"
+    plain.write_bytes(RECORDS)
+    expected = process_faa(str(plain))
+    assert merged["residue_counts"] == expected["residue_counts"]
+    assert merged["total_aa_length"] == expected["total_aa_length"]
+
+
+def test_plain_gzip_is_not_bgzf(tmp_path):
+    path = tmp_path / "plain.faa.gz"
+    path.write_bytes(gzip.compress(RECORDS))
+    assert not is_bgzf(str(path))
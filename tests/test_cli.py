@@ -0,0 +1,126 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from ARSC.core import SequenceTable, process_faa
+from ARSC.memo import SequenceMemo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA = os.path.join(ROOT, "test_data")
+
+# Repeated sequences (memo hits), whitespace, unknown characters and stop codons
+FASTA = {
+    "repeats.faa": b">a\nMKRHDE\nNQST\n>b\nMKRHDENQST\n>c\nmkrhde\n>d\nMK\tX*\n>e\nMKRHDE\nNQST\n",
+    "whitespace.faa": b">a desc\tx\nMK V\t\nk\x0bR\x0c\n\tHH \r\n>b\n\x0cMK*\t\n",
+}
+
+
+@pytest.fixture
+def genomes(tmp_path):
+    directory = tmp_path / "genomes"
+    directory.mkdir()
+    for name, data in FASTA.items():
+        (directory / name).write_bytes(data)
+    for name in ("test1.faa", "genome_a.faa", "genome_b.faa.gz"):
+        shutil.copy(os.path.join(TEST_DATA, name), directory / name)
+    return directory
+
+
+def arsc(tmp_path, *args):
+    """Run the command line tool; return the TSV it writes and its stderr."""
+    output = tmp_path / "out.tsv"
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    process = subprocess.run([sys.executable, "-m", "ARSC.main", *map(str, args), "--ordered", "-o", str(output)],
+                             cwd=str(tmp_path), env=env, capture_output=True, text=True)
+    assert process.returncode == 0, process.stderr
+    return output.read_text(), process.stderr
+
+
+@pytest.mark.parametrize("options", [[], ["-p"], ["-a"], ["-p", "-a", "--raw-counts", "--ignored-column"]])
+def test_engines_write_the_same_table(tmp_path, genomes, options):
+    pytest.importorskip("Bio")
+    fast, _ = arsc(tmp_path, genomes, "--backend", "bytes", *options)
+    slow, _ = arsc(tmp_path, genomes, "--backend", "biopython", *options)
+    assert fast == slow
+    assert len(fast.splitlines()) > len(FASTA) + 3
+
+
+def test_per_sequence_rows(tmp_path, genomes):
+    table, _ = arsc(tmp_path, genomes / "repeats.faa", "-p", "-a", "--raw-counts")
+    header, *rows = [line.split("\t") for line in table.splitlines()]
+    assert header[:7] == ["query", "sequence_id", "N_ARSC", "C_ARSC", "S_ARSC", "AvgResMW", "length"]
+    assert [row[1] for row in rows] == [f"repeats_{i}" for i in range(1, 6)]
+    assert [int(row[6]) for row in rows] == [10, 10, 6, 4, 10]
+    assert rows[0][2:] == rows[1][2:] == rows[4][2:]
+
+
+def test_sequence_table_select_and_concat(tmp_path, genomes):
+    whole = process_faa(str(genomes / "repeats.faa"), per_sequence=True)["sequences"]
+    assert len(whole) == 5
+    assert whole.sequence_ids() == [f"repeats_{i}" for i in range(1, 6)]
+    assert whole.lengths.tolist() == [10, 10, 6, 4, 10]
+    assert whole.select(whole.lengths >= 10).sequence_ids() == ["repeats_1", "repeats_2", "repeats_5"]
+
+    # two ranges of the file, numbered from 1 each, are renumbered in file order
+    records = FASTA["repeats.faa"].split(b">")[1:]
+    parts = []
+    for k, chunk in enumerate((records[:2], records[2:])):
+        path = tmp_path / f"part{k}.faa"
+        path.write_bytes(b"".join(b">" + r for r in chunk))
+        parts.append(process_faa(str(path), per_sequence=True)["sequences"])
+    joined = SequenceTable.concat("repeats", parts)
+    assert joined.sequence_ids() == whole.sequence_ids()
+    assert joined.lengths.tolist() == whole.lengths.tolist()
+    assert joined.counts.tolist() == whole.counts.tolist()
+    np.testing.assert_array_equal(joined.metrics, whole.metrics)
+
+    # with rows dropped by a length filter, records gives the size of each range
+    filtered = [part.select(part.lengths >= 10) for part in parts]
+    joined = SequenceTable.concat("repeats", filtered, records=[2, 3])
+    assert joined.sequence_ids() == ["repeats_1", "repeats_2", "repeats_5"]
+
+
+def test_cache_serves_unchanged_files(tmp_path, genomes):
+    cache_dir = tmp_path / "cache"
+    first, _ = arsc(tmp_path, genomes, "-a", "--cache-dir", cache_dir)
+    second, log = arsc(tmp_path, genomes, "-a", "--cache-dir", cache_dir)
+    assert second == first
+    assert f"Loaded {len(os.listdir(genomes))} results from cache." in log
+    assert second == arsc(tmp_path, genomes, "-a")[0]
+
+    # a changed file is recomputed
+    changed = genomes / "repeats.faa"
+    changed.write_bytes(b">a\nWWWW\n")
+    os.utime(changed, ns=(1, 1))
+    third, log = arsc(tmp_path, genomes, "-a", "--cache-dir", cache_dir)
+    assert f"Loaded {len(os.listdir(genomes)) - 1} results from cache." in log
+    assert third == arsc(tmp_path, genomes, "-a")[0]
+    assert third != first
+
+
+def test_memo_matches_plain_run(tmp_path, genomes):
+    plain, _ = arsc(tmp_path, genomes, "-p", "-a", "--raw-counts", "--ignored-column")
+    memo, log = arsc(tmp_path, genomes, "-p", "-a", "--raw-counts", "--ignored-column", "--memo")
+    assert memo == plain
+    assert "Sequence memo:" in log
+    db = tmp_path / "memo.sqlite"
+    for _ in range(2):
+        stored, log = arsc(tmp_path, genomes, "-p", "-a", "--raw-counts", "--ignored-column", "--memo-db", db)
+        assert stored == plain
+    assert "(100.0% hit rate" in log
+
+
+def test_memo_reuses_repeated_sequences(genomes):
+    memo = SequenceMemo(max_entries=16)
+    path = str(genomes / "repeats.faa")
+    with_memo = process_faa(path, per_sequence=True, memo=memo)
+    without = process_faa(path, per_sequence=True)
+    # a and e are the same sequence; b is the same once the line break is removed
+    assert memo.counts() == (2, 3)
+    assert with_memo["sequences"].counts.tolist() == without["sequences"].counts.tolist()
+    np.testing.assert_array_equal(with_memo["sequences"].metrics, without["sequences"].metrics)
+    assert with_memo["ignored"] == without["ignored"]
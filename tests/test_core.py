@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ARSC.core import process_faa
+
+pytest.importorskip("Bio")
+
+# Whitespace, unknown characters, lower case, stop codons, comments and empty records
+FASTA = {
+    "tab": b">a\nMK\tV\n",
+    "whitespace": b">a desc\tx\nMK V\t\nk\x0bR\x0c\n\tHH \r\n>b\n\x0cMK*\t\n>c\nMK\t*\nGG\x1c\n",
+    "crlf": b">a\r\nMKRH\r\nDE*\r\n>b\r\nmkrh\r\n",
+    "unknown": b">a\nMKXXBZUJ\nO1?.\n>b\nxxxx\n>c\n\n>d\nWC\n",
+    "comments": b"#top\n>a\nMK\n;note\nRH\n>b\nAC\n!x\n",
+}
+
+
+def write(tmp_path, name):
+    path = tmp_path / f"{name}.faa"
+    path.write_bytes(FASTA[name])
+    return str(path)
+
+
+@pytest.mark.parametrize("name", sorted(FASTA))
+def test_bytes_engine_matches_biopython(tmp_path, name):
+    path = write(tmp_path, name)
+    fast = process_faa(path, backend="bytes")
+    slow = process_faa(path, backend="biopython")
+    assert "error" not in fast and "error" not in slow
+    for key in ("total_aa_length", "residue_counts", "aa_composition", "ignored"):
+        assert fast[key] == slow[key], key
+    for key in ("N_ARSC", "C_ARSC", "S_ARSC", "MW_ARSC"):
+        assert fast[key] == pytest.approx(slow[key], rel=1e-12), key
+
+
+@pytest.mark.parametrize("name", sorted(FASTA))
+def test_bytes_engine_matches_biopython_per_sequence(tmp_path, name):
+    path = write(tmp_path, name)
+    fast = process_faa(path, per_sequence=True, backend="bytes")
+    slow = process_faa(path, per_sequence=True, backend="biopython")
+    assert fast["ignored"] == slow["ignored"]
+    assert fast["ignored_sequences"] == slow["ignored_sequences"]
+    a, b = fast["sequences"], slow["sequences"]
+    assert a.sequence_ids() == b.sequence_ids()
+    assert a.lengths.tolist() == b.lengths.tolist()
+    assert a.counts.tolist() == b.counts.tolist()
+    np.testing.assert_allclose(a.metrics, b.metrics, rtol=1e-12)
+
+
+def test_tab_counts_as_unknown(tmp_path):
+    result = process_faa(write(tmp_path, "tab"))
+    assert result["total_aa_length"] == 4
+    assert result["N_ARSC"] == pytest.approx(0.25)
+    assert result["ignored"] == {"\t": 1}
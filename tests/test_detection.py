@@ -0,0 +1,24 @@
+import io
+
+from ARSC.utils import _read_detection_sample, detect_nucleotide_bytes
+
+
+def test_header_letters_do_not_count_toward_sample():
+    data = b"".join(b">contig_%d %s\n%s\n" % (i, b"annotation " * 40, b"ACGT" * 15) for i in range(200))
+    sample = _read_detection_sample(io.BytesIO(data), sample_chars=1000, block_size=256)
+    sequence = b"".join(line for line in sample.split(b"\n") if not line.startswith(b">"))
+    assert len(sequence) >= 2000
+    assert detect_nucleotide_bytes(sample, 1000, 0.95)
+
+
+def test_header_split_across_blocks():
+    # a header longer than one block, then an unwrapped sequence longer than one block
+    data = b">" + b"x" * 1000 + b"\n" + b"M" * 3000 + b"\n>b\nK\n"
+    sample = _read_detection_sample(io.BytesIO(data), sample_chars=1000, block_size=64)
+    assert sample.count(b"M") >= 2000
+    assert data.startswith(sample)
+
+
+def test_short_file_is_read_whole():
+    data = b">a\nMKRH\n>b\nACGT\n"
+    assert _read_detection_sample(io.BytesIO(data), block_size=4) == data
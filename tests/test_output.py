@@ -0,0 +1,95 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from ARSC.core import RESIDUES, aa_dictionary, process_faa
+from ARSC.main import format_columns, format_header
+from ARSC.output import ColumnarWriter, column_dtype
+
+AA_KEYS = sorted(aa_dictionary)
+
+
+def output_args(**options):
+    defaults = {"groups": None, "windows": None, "nucleotide": False, "per_sequence": False, "aa_composition": False,
+                "raw_counts": False, "ignored_column": False, "decimal_places": 6}
+    return SimpleNamespace(**{**defaults, **options})
+
+
+def grouped_result():
+    residue_counts = np.zeros((2, len(RESIDUES)), dtype=np.int64)
+    residue_counts[0, RESIDUES.index("M")] = 3
+    residue_counts[1, RESIDUES.index("K")] = 5
+    return {"genome": "g", "groups": {"names": ["contig_1", "contig_2"],
+                                      "base_counts": np.array([[10, 10, 5, 5], [0, 0, 0, 0]], dtype=np.int64),
+                                      "residue_counts": residue_counts, "total_aa": np.array([4, 5], dtype=np.int64)}}
+
+
+@pytest.mark.parametrize("by", ["contig", "bin"])
+def test_grouped_columns_match_schema_types(by):
+    args = output_args(groups={"by": by}, nucleotide=True, aa_composition=True, raw_counts=True)
+    columns = format_columns(grouped_result(), args, AA_KEYS)
+    assert list(columns) == format_header(args, AA_KEYS)
+    for name, column in columns.items():
+        assert np.dtype(column_dtype(name)).kind == column.dtype.kind, name
+
+
+@pytest.mark.parametrize("fmt", ["npz", "parquet", "arrow"])
+def test_columnar_writer_grouped(tmp_path, fmt):
+    if fmt != "npz":
+        pytest.importorskip("pyarrow")
+    args = output_args(groups={"by": "contig"}, nucleotide=True, raw_counts=True)
+    path = str(tmp_path / f"groups.{fmt}")
+    writer = ColumnarWriter(path, fmt, format_header(args, AA_KEYS))
+    writer.write(format_columns(grouped_result(), args, AA_KEYS))
+    writer.close()
+    if fmt == "npz":
+        with np.load(path) as data:
+            contigs, total = data["contig"].tolist(), data["TotalLength"].tolist()
+    else:
+        import pyarrow.feather
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path) if fmt == "parquet" else pyarrow.feather.read_table(path)
+        contigs, total = table.column("contig").to_pylist(), table.column("TotalLength").to_pylist()
+    assert contigs == ["contig_1", "contig_2"]
+    assert total == [4, 5]
+
+
+@pytest.mark.parametrize("per_sequence", [False, True])
+def test_count_columns_match_schema_types(tmp_path, per_sequence):
+    path = tmp_path / "x.faa"
+    path.write_bytes(b">a\nMKXX\n>b\nRH\n")
+    args = output_args(per_sequence=per_sequence, aa_composition=True, raw_counts=True, ignored_column=True)
+    columns = format_columns(process_faa(str(path), per_sequence=per_sequence), args, AA_KEYS)
+    assert list(columns) == format_header(args, AA_KEYS)
+    for name, column in columns.items():
+        assert np.dtype(column_dtype(name)).kind == column.dtype.kind, name
+    assert columns["ignored"].tolist() == ([2, 0] if per_sequence else [2])
+
+
+def test_npz_batches_stream_to_disk(tmp_path):
+    # batch_rows=2: several spilled batches, with query strings of different widths
+    path = str(tmp_path / "batches.npz")
+    writer = ColumnarWriter(path, "npz", ["query", "length", "N_ARSC"], batch_rows=2)
+    batches = [{"query": np.array(["g" * (k + 1)] * (k + 1)), "length": np.arange(k + 1, dtype=np.int64),
+                "N_ARSC": np.full(k + 1, k / 10)} for k in range(5)]
+    for batch in batches:
+        writer.write(batch)
+    writer.close()
+    with np.load(path) as data:
+        assert sorted(data.files) == ["N_ARSC", "length", "query"]
+        for name in ("query", "length", "N_ARSC"):
+            expected = np.concatenate([batch[name] for batch in batches])
+            assert data[name].dtype == expected.dtype
+            assert data[name].tolist() == expected.tolist()
+    assert sorted(os.listdir(tmp_path)) == ["batches.npz"]
+
+
+def test_npz_empty(tmp_path):
+    path = str(tmp_path / "empty.npz")
+    writer = ColumnarWriter(path, "npz", ["query", "length"])
+    writer.close()
+    with np.load(path) as data:
+        assert data["query"].dtype.kind == "U" and len(data["query"]) == 0
+        assert data["length"].dtype == np.int64
@@ -0,0 +1,99 @@
+import os
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ARSC.serve import ARSCRequestHandler, Job, TCPHTTPServer, WorkerService, make_task, request_args
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_data")
+
+
+def run_server(service, spool_dir):
+    httpd = TCPHTTPServer(("127.0.0.1", 0), ARSCRequestHandler)
+    httpd.service = service
+    httpd.spool_dir = spool_dir
+    httpd.max_body = 16 * 1024 * 1024
+    httpd.quiet = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    service = WorkerService(threads=1)
+    httpd = run_server(service, str(tmp_path_factory.mktemp("spool")))
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def post_json(url, body):
+    request = urllib.request.Request(url + "/arsc", data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def stats(url):
+    with urllib.request.urlopen(url + "/stats") as response:
+        return json.load(response)
+
+
+@pytest.mark.parametrize("body", [
+    {"options": "abc"},
+    {"options": ["per_sequence"]},
+    {"paths": os.path.join(TEST_DATA, "test1.faa")},
+    {"paths": [1]},
+    {"fasta": ">a\nMK\n"},
+    {"fasta": [">a\nMK\n"]},
+])
+def test_malformed_json_request_is_rejected(server, body):
+    before = stats(server)["bad_requests"]
+    status, response = post_json(server, body)
+    assert status == 400
+    assert "error" in response
+    assert stats(server)["bad_requests"] == before + 1
+
+
+def test_paths_request(server):
+    status, response = post_json(server, {"paths": [os.path.join(TEST_DATA, "test1.faa")], "options": {"decimal_places": 3}})
+    assert status == 200
+    assert [row["query"] for row in response["rows"]] == ["test1"]
+    assert response["errors"] == []
+
+
+def test_lost_job_times_out(tmp_path):
+    # a killed worker never calls back: the request must end with 503 instead of waiting forever
+    service = WorkerService(threads=1, job_timeout=0.2)
+    service._submit_batch = lambda batch: None
+    httpd = run_server(service, str(tmp_path))
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        status, response = post_json(url, {"paths": [os.path.join(TEST_DATA, "test1.faa")]})
+        assert status == 503
+        assert "error" in response
+        assert stats(url)["timed_out"] == 1
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.close()
+
+
+def test_pool_failure_finishes_job():
+    # map_async on a closed pool raises: the job still ends, with the error per file
+    service = WorkerService(threads=1)
+    service.pool.close()
+    job = Job([make_task({"handle": os.path.join(TEST_DATA, "test1.faa"), "name": "test1"}, request_args({}))])
+    try:
+        service.submit(job)
+        assert job.done.wait(10)
+        assert "error" in job.results[0]
+    finally:
+        service.close()